@@ -0,0 +1,176 @@
+"""
+合成コーパス（synthetic_corpus.py）で各ステージの処理時間と規模に対する伸びを計測し、JSON に記録する。
+
+使い方:
+    python benchmarks/bench_pipeline.py [--scales 1,10,100] [--repeat 3] [--out benchmarks/results/HEAD.json]
+    python benchmarks/bench_pipeline.py --scales 1,10 --compare benchmarks/results/before.json
+
+計測対象（各計測の前にメモ化キャッシュをクリアする）:
+    normalize_row            生の行 → 7列（prepare_unit_price_from_raw）
+    read_unit_price_csv      7列CSVの読み込みとセルのクリーニング
+    normalize_unit_price_rows 大分類/工種の分割・表メタ抽出・除外行の判定
+    match                    道路工事アイテムとの照合（match_and_write、既定 both/85）
+    build_final_df           最終CSVの作成
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import pandas as pd  # noqa: E402
+import rapidfuzz  # noqa: E402
+
+import build_final_from_unit_price  # noqa: E402
+import prepare_unit_price_from_raw  # noqa: E402
+import text_normalize  # noqa: E402
+from map_road_items_to_unit_prices import UnitIndex, match_and_write, prepare_road_df, prepare_unit_df  # noqa: E402
+from preprocess_unit_price import normalize_unit_price_rows, read_unit_price_csv  # noqa: E402
+from synthetic_corpus import generate_road_rows, generate_unit_price_rows, write_csv  # noqa: E402
+
+STAGES = ["normalize_row", "read_unit_price_csv", "normalize_unit_price_rows", "match", "build_final_df"]
+DEFAULT_DICT = os.path.join(ROOT, "src", "keyword_map.csv")
+
+
+def clear_caches() -> None:
+    for f in (
+        text_normalize.clean_cell,
+        text_normalize.clean_preserve_spaces,
+        text_normalize.normalize_unit,
+        text_normalize.normalize_text,
+        prepare_unit_price_from_raw.clean_category_text,
+        prepare_unit_price_from_raw.clean_table_text,
+        build_final_from_unit_price._classifier_for,
+    ):
+        f.cache_clear()
+
+
+def best_of(repeat: int, fn: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        clear_caches()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_scale(scale: float, stages: List[str], repeat: int, workdir: Path, args: argparse.Namespace) -> List[dict]:
+    """1つの規模でコーパスを生成し、各ステージを計測する。"""
+    raw_rows = generate_unit_price_rows(scale, args.seed)
+    road_rows = generate_road_rows(scale, args.seed)
+    # 後段の入力（7列CSV・正規化済みCSV・道路側CSV）を用意する
+    cleaned = prepare_unit_price_from_raw.clean_rows(raw_rows)
+    up_csv = workdir / "unit_price_table_data.csv"
+    prepare_unit_price_from_raw.write_rows(cleaned, str(up_csv))
+    road_csv = workdir / "road_items.csv"
+    write_csv(road_rows, str(road_csv))
+    raw_df = read_unit_price_csv(str(up_csv))
+    norm_df = normalize_unit_price_rows(raw_df)
+    norm_csv = workdir / "unit_price_normalized.csv"
+    norm_df.to_csv(norm_csv, index=False, encoding="utf-8")
+
+    def run_match() -> None:
+        road_df = prepare_road_df(pd.read_csv(road_csv, encoding="utf-8"), str(road_csv))
+        unit = UnitIndex(prepare_unit_df(pd.read_csv(norm_csv, encoding="utf-8")))
+        # 出力ファイル名の表示は抑止
+        with contextlib.redirect_stdout(io.StringIO()):
+            match_and_write(road_df, unit, workdir, [args.threshold], [args.cat_filter], workers=args.workers)
+
+    cases: Dict[str, tuple] = {
+        "normalize_row": (len(raw_rows), lambda: [prepare_unit_price_from_raw.normalize_row(r) for r in raw_rows]),
+        "read_unit_price_csv": (len(cleaned), lambda: read_unit_price_csv(str(up_csv))),
+        "normalize_unit_price_rows": (len(raw_df), lambda: normalize_unit_price_rows(raw_df)),
+        "match": (len(road_rows) - 1, run_match),
+        "build_final_df": (len(norm_df), lambda: build_final_from_unit_price.build_final_df(str(norm_csv), args.dict)),
+    }
+    results = []
+    for stage in stages:
+        rows, fn = cases[stage]
+        seconds = best_of(repeat, fn)
+        results.append(
+            {"scale": scale, "stage": stage, "rows": rows, "seconds": round(seconds, 6), "rows_per_sec": round(rows / seconds, 1) if seconds else None}
+        )
+        print(f"{scale:>7g}x {stage:<27}{rows:>10}{seconds:>11.4f}{rows / seconds if seconds else 0:>14.0f}", flush=True)
+    return results
+
+
+def print_comparison(results: List[dict], baseline_path: str) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {(r["scale"], r["stage"]): r["seconds"] for r in baseline["results"]}
+    print(f"\n比較: {baseline_path} (commit={baseline.get('commit')})")
+    print(f"{'scale':>8} {'stage':<27}{'before[s]':>11}{'after[s]':>11}{'ratio':>8}")
+    for r in results:
+        old = before.get((r["scale"], r["stage"]))
+        if old:
+            print(f"{r['scale']:>7g}x {r['stage']:<27}{old:>11.4f}{r['seconds']:>11.4f}{r['seconds'] / old:>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="合成コーパスによるステージ別ベンチマーク")
+    parser.add_argument("--scales", default="1,10,100", help="コーパスの倍率（カンマ区切り、例: 1,10,100,1000）")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"計測するステージ（カンマ区切り: {', '.join(STAGES)}）")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の繰り返し回数（最良値を記録）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=int, default=85, help="照合のしきい値")
+    parser.add_argument("--cat_filter", default="both", help="照合のカテゴリフィルタ")
+    parser.add_argument("--workers", type=int, default=-1, help="スコア行列計算の並列数")
+    parser.add_argument("--dict", default=DEFAULT_DICT, help="keyword_map.csv のパス")
+    parser.add_argument("--out", default=None, help="結果JSONの出力先（既定: benchmarks/results/<commit>.json）")
+    parser.add_argument("--compare", default=None, help="比較対象の結果JSON（倍率ごとの処理時間の比を表示）")
+    args = parser.parse_args()
+
+    scales = [float(s) for s in args.scales.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"--stages の値が不正です: {', '.join(unknown)}")
+
+    commit = git_commit()
+    print(f"{'scale':>8} {'stage':<27}{'rows':>10}{'best[s]':>11}{'rows/s':>14}")
+    results: List[dict] = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmp:
+            results.extend(bench_scale(scale, stages, args.repeat, Path(tmp), args))
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    record = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "rapidfuzz": rapidfuzz.__version__,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "match": {"threshold": args.threshold, "cat_filter": args.cat_filter},
+        "results": results,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    print(f"Wrote: {out}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+text_normalize の正規化関数と、置き換え前の実装（文字ごとの unicodedata.name 呼び出し）の速度比較。
+
+使い方:
+    python benchmarks/bench_text_normalize.py [--csv data/unit_price_table_data.csv] [--repeat 5]
+
+cold はメモ化キャッシュを毎回クリアした計測、warm はキャッシュ済みの計測。
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+import unicodedata
+from typing import Callable, List, Optional
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import pandas as pd  # noqa: E402
+
+import text_normalize  # noqa: E402
+
+
+# ---- 置き換え前の実装（比較用にそのまま保持） ----
+
+def legacy_to_halfwidth(text: str) -> str:
+    result_chars: List[str] = []
+    for ch in text:
+        try:
+            name = unicodedata.name(ch)
+            if "FULLWIDTH" in name:
+                result_chars.append(unicodedata.normalize("NFKC", ch))
+            else:
+                result_chars.append(ch)
+        except Exception:
+            result_chars.append(ch)
+    return "".join(result_chars)
+
+
+def legacy_clean_cell(text: Optional[str]) -> str:
+    if text is None:
+        return ""
+    if not isinstance(text, str):
+        text = str(text)
+    text = text.replace("\r", " ").replace("\n", " ").strip()
+    text = re.sub(r"\s+", " ", text)
+    text = text.strip('\'"')
+    return legacy_to_halfwidth(text)
+
+
+def legacy_normalize_unit(unit: str) -> str:
+    unit = legacy_clean_cell(unit)
+    unit = re.sub(r"^\s*空\s*(?=(m²|m2|m³|m3)\b)", "", unit)
+    unit = unit.replace("m2", "m²").replace("m^2", "m²")
+    unit = unit.replace("m3", "m³").replace("m^3", "m³")
+    unit = unit.replace("㎡", "m²").replace("㎥", "m³")
+    return unit
+
+
+def legacy_normalize_text(value: object) -> str:
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value)).strip()
+    return re.sub(r"\s+", " ", text)
+
+
+# ---- 計測 ----
+
+def _best_of(repeat: int, fn: Callable[[], object], before: Optional[Callable[[], None]] = None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _clear_caches() -> None:
+    for f in (text_normalize.clean_cell, text_normalize.normalize_unit, text_normalize.normalize_text):
+        f.cache_clear()
+
+
+def load_cells(csv_path: str) -> List[str]:
+    cells: List[str] = []
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.reader(f):
+            cells.extend(row)
+    return cells
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="テキスト正規化のマイクロベンチマーク")
+    parser.add_argument("--csv", default=os.path.join(ROOT, "data", "unit_price_table_data.csv"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cells = load_cells(args.csv)
+    series = pd.Series(cells, dtype=object)
+    print(f"cells={len(cells)} distinct={len(set(cells))} ({args.csv})")
+
+    cases = [
+        ("to_halfwidth", legacy_to_halfwidth, text_normalize.to_halfwidth),
+        ("clean_cell", legacy_clean_cell, text_normalize.clean_cell),
+        ("normalize_unit", legacy_normalize_unit, text_normalize.normalize_unit),
+        ("normalize_text", legacy_normalize_text, text_normalize.normalize_text),
+    ]
+    print(f"{'function':<26}{'legacy[s]':>11}{'cold[s]':>11}{'warm[s]':>11}{'speedup':>10}")
+    for name, legacy, fast in cases:
+        # 結果が一致することを確認してから計測する
+        assert [legacy(c) for c in cells] == [fast(c) for c in cells], name
+        t_legacy = _best_of(args.repeat, lambda: [legacy(c) for c in cells])
+        t_cold = _best_of(args.repeat, lambda: [fast(c) for c in cells], _clear_caches)
+        t_warm = _best_of(args.repeat, lambda: [fast(c) for c in cells])
+        print(f"{name:<26}{t_legacy:>11.4f}{t_cold:>11.4f}{t_warm:>11.4f}{t_legacy / t_cold:>9.1f}x")
+
+    # pandas Series 経路（Series.apply と異なり値ごとの評価の比較）
+    t_legacy = _best_of(args.repeat, lambda: series.apply(legacy_clean_cell))
+    t_cold = _best_of(
+        args.repeat, lambda: text_normalize.normalize_series(series, text_normalize.clean_cell), _clear_caches
+    )
+    t_warm = _best_of(args.repeat, lambda: text_normalize.normalize_series(series, text_normalize.clean_cell))
+    print(f"{'normalize_series(clean)':<26}{t_legacy:>11.4f}{t_cold:>11.4f}{t_warm:>11.4f}{t_legacy / t_cold:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
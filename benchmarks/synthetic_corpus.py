@@ -0,0 +1,214 @@
+"""
+ベンチマーク用の合成コーパス（単価表の生CSV・道路工事アイテムCSV）を生成する。
+
+実データ（data/unit_price_table_data_raw.csv）の形を模して、次の表記を含める:
+- 見出し番号（'3章 共通工', '①-2 断面修復工', '単価表(1)', '(4)' 等）と全角表記（'３章　共通工', '１００ｍ２当り'）
+- 表タイトル末尾の作業単位（'100m²当り', '1台1回当り', '10m³当たり', '1回当り' 等）と <...> の注記
+- 表ヘッダ行（名称/規格/単位/数量/摘要）、計行、機械運転の表、列数の不揃いな行
+
+使い方:
+    python benchmarks/synthetic_corpus.py --scale 10 --outdir data/tmp/synthetic
+
+scale=1 は現在の unit_price_table_data.csv と同程度の行数（BASE_ROWS 行）。
+同じ seed・scale からは同じ内容を生成する。
+"""
+import argparse
+import csv
+import os
+import random
+from typing import List, Tuple
+
+# scale=1 の行数（現在の unit_price_table_data.csv と同程度）
+BASE_ROWS = 4400
+# scale=1 の道路工事アイテム数
+BASE_ROAD_ITEMS = 48
+
+# (大分類, [工種...]) の語彙
+CATEGORIES: List[Tuple[str, List[str]]] = [
+    ("共通工", ["構造物補修工", "断面修復工 (左官工法)", "薬液注入工", "骨材再生工(自走式)", "法面工", "排水構造物工"]),
+    ("土工", ["掘削工", "路体盛土工", "路床盛土工", "安定処理工(自走式土質改良工)", "整地工"]),
+    ("基礎工", ["場所打杭工", "鋼管・既製コンクリート杭打工", "打撃工法", "中掘工法", "深礎工"]),
+    ("仮設工", ["鋼矢板(H形鋼) 工", "工事用道路工", "土留・仮締切工", "路面覆工", "油圧圧入引抜工"]),
+    ("道路維持修繕", ["路面切削工", "切削オーバーレイ工", "道路打換え工", "アスファルト注入工", "区画線工"]),
+    ("舗装工", ["アスファルト舗装工", "コンクリート舗装工", "路盤工", "排水性舗装工"]),
+    ("トンネル工", ["トンネル工 (NATM) 【発破工法】", "小断面トンネル工 (NATM)", "仮設備工(防音扉工)"]),
+    ("橋梁", ["プレビーム桁架設工", "ポストテンション場所打ホロースラブ橋工", "支承工", "落橋防止装置工"]),
+    ("共同溝工", ["共同溝工(1) (構造物単位)", "共同溝工(2)", "ボックスカルバート工"]),
+]
+
+# 表タイトルの本体
+TABLE_SUBJECTS = [
+    "コンクリート殻積込・運搬", "鋼管杭杭頭処理溶接工", "二重管ダブルパッカー工法一次注入", "横桁取付工",
+    "本締め工", "削孔", "覆工面積", "クレーンによる鋼矢板及びH形鋼引抜き", "防音扉設置・撤去",
+    "自走式破砕機設置(撤去)", "やぐらの設置・撤去", "スライドセントル組立・解体", "H形鋼支保工",
+    "切削オーバーレイ", "鋼管内掘削工", "型枠工", "鉄筋工", "敷鉄板設置・撤去", "土のう積", "仮設舗装",
+]
+
+# 作業単位（'N 単位 当り' のパターン）
+UNIT_SUFFIXES = [
+    "100m²当り", "10m³当り", "100m2当り", "10m当り", "1本当り", "10本当り", "1基当り", "1箇所当り",
+    "10枚[本]当り", "100穴当り", "1m (トンネル延長) 当り", "1組当り", "10箇所当り", "100m²当たり",
+    "1台1回当り", "1基1回当り", "1回当り", "1,000m²当り",
+]
+
+# 表の明細行（名称, 規格, 単位, 数量, 摘要）
+LABOR = ["土木一般世話役", "特殊作業員", "普通作業員", "橋りょう世話役", "橋りょう特殊工", "トンネル世話役", "型わく工", "鉄筋工"]
+MACHINES = [
+    ("タイヤローラ運転", "普通型・低騒音型。排出ガス対策型(第2次基準値) 運転質量8~20t", "日", "表5.5 機械賃料"),
+    ("ラフテレーンクレーン", "油圧伸縮ジブ型・排出ガス対策型(第1次基準値) 25t吊", "日", "表12.1 機械賃料"),
+    ("トラッククレーン運転", "油圧伸縮ジブ型 4.9t吊", "日", "表3.2 機械賃料"),
+    ("薬液注入ポンプ運転", "吐出量0~20ℓ/min×2 圧力9.8MPa", "日", "表3.2 機械損料"),
+    ("バックホウ運転", "クローラ型 山積0.8m³(平積0.6m³)", "h", "機械損料"),
+]
+MATERIALS = [("中詰材料", "", "m³"), ("生コンクリート", "18-8-40", "m³"), ("諸雑費", "", "式"), ("アスファルト混合物", "密粒度", "t")]
+
+HEADER = ["名称", "規格", "単位", "数量", "摘要"]
+
+CIRCLED = "①②③④⑤⑥⑦⑧⑨"
+# 半角英数字・空白 → 全角（全角表記の混入を模す）
+_TO_FULLWIDTH = {ord(c): ord(c) + 0xFEE0 for c in "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz()"}
+_TO_FULLWIDTH[ord(" ")] = ord("　")
+
+
+def to_fullwidth(text: str) -> str:
+    return text.translate(_TO_FULLWIDTH)
+
+
+def _category_cell(rng: random.Random, chapter: int, daibunrui: str, koshu: str) -> str:
+    # 例: '3章 共通工 構造物補修工 ①-2 断面修復工 (左官工法)', '13章 道路維持修繕④ 道路打換え工'
+    r = rng.random()
+    if r < 0.35:
+        head = f"{CIRCLED[rng.randrange(9)]}-{rng.randint(1, 4)} "
+    elif r < 0.55:
+        head = f"{CIRCLED[rng.randrange(9)]} "
+    else:
+        head = ""
+    sep = "" if rng.random() < 0.1 else " "
+    text = f"{chapter}章{sep}{daibunrui}{sep}{head}{koshu}"
+    if rng.random() < 0.08:
+        text = to_fullwidth(text)
+    return text
+
+
+def _table_cell(rng: random.Random, number: int, subject: str, suffix: str) -> str:
+    # 例: '単価表(1) 切削オーバーレイ100m²当り単価表', '(5)横桁取付工10箇所当単価表'
+    prefix = "単価表" if rng.random() < 0.4 else ""
+    note = f"<{rng.choice(['掘削', '吹付け', 'ロックボルト'])}, {rng.choice(['金網', '鋼製支保工'])}> " if rng.random() < 0.05 else ""
+    gap = " " if rng.random() < 0.5 else ""
+    text = f"{prefix}({number}){gap}{subject}{note}{suffix}単価表"
+    if rng.random() < 0.08:
+        text = to_fullwidth(text)
+    return text
+
+
+def _variant(rng: random.Random, n_variants: int, fmt: str) -> str:
+    # 0 は変種なし（元の語彙のまま）
+    k = rng.randrange(n_variants)
+    return fmt.format(k) if k else ""
+
+
+def _detail_rows(rng: random.Random, machine_table: bool, n_variants: int) -> List[List[str]]:
+    rows: List[List[str]] = []
+    if machine_table:
+        for name, spec, unit, note in rng.sample(MACHINES, rng.randint(1, 3)):
+            name += _variant(rng, n_variants, " {}型")
+            rows.append([name, spec, "機-33", f"運転労務数量 1.00 燃料消費量 {rng.randint(50, 250)}", note])
+        return rows
+    for name in rng.sample(LABOR, rng.randint(2, 4)):
+        rows.append([name, "", "人", f"$1/N\\times {rng.randint(1, 9)}$", f"表{rng.randint(1, 9)}.{rng.randint(1, 9)}"])
+    for name, spec, unit, note in rng.sample(MACHINES, rng.randint(0, 2)):
+        name += _variant(rng, n_variants, " {}型")
+        rows.append([name, spec, unit, f"{rng.randint(1, 99) / 10:g}", note])
+    for name, spec, unit in rng.sample(MATERIALS, rng.randint(0, 2)):
+        rows.append([name, spec, unit, "", f"式{rng.randint(1, 9)}.{rng.randint(1, 4)}"])
+    return rows
+
+
+def _ragged(rng: random.Random, row: List[str]) -> List[str]:
+    # 列数の不揃い（末尾の空セル、摘要の分割）を混ぜる
+    r = rng.random()
+    if r < 0.1:
+        return row + [""] * rng.randint(1, 7)
+    if r < 0.15:
+        return row[:-1] + row[-1].split(".", 1)
+    return row
+
+
+def generate_unit_price_rows(scale: float, seed: int = 0) -> List[List[str]]:
+    """
+    単価表の生CSV（unit_price_table_data_raw.csv 相当）の行を生成する。
+    行数は約 BASE_ROWS × scale。工種・表タイトルの異なり数も規模に応じて増える。
+    """
+    rng = random.Random(seed)
+    target = int(BASE_ROWS * scale)
+    # 異なり数を規模に比例して増やすための変種番号（'(その3)' 等）。scale=1 で実データと同程度の異なり数
+    variants = max(1, int(scale * 4))
+    subject_variants = max(1, int(scale * 20))
+    rows: List[List[str]] = []
+    while len(rows) < target:
+        chapter = rng.randint(1, 20)
+        daibunrui, koshu_list = rng.choice(CATEGORIES)
+        koshu = rng.choice(koshu_list)
+        v = rng.randrange(variants)
+        if v:
+            koshu = f"{koshu}(その{v})"
+        category = _category_cell(rng, chapter, daibunrui, koshu)
+        for number in range(1, rng.randint(2, 8)):
+            machine_table = rng.random() < 0.1
+            if machine_table:
+                table = f"単価表({number})機械運転単価表"
+            else:
+                subject = rng.choice(TABLE_SUBJECTS) + _variant(rng, subject_variants, "(その{})")
+                table = _table_cell(rng, number, subject, rng.choice(UNIT_SUFFIXES))
+            rows.append([category, table] + HEADER)
+            for detail in _detail_rows(rng, machine_table, subject_variants):
+                rows.append(_ragged(rng, [category, table] + detail))
+            if not machine_table:
+                rows.append([category, table, "計", "", "", "", ""])
+    return rows[:target]
+
+
+def generate_road_rows(scale: float, seed: int = 0) -> List[List[str]]:
+    """道路工事アイテムCSV（カテゴリ名, サブカテゴリ名, アイテム名 を含む15列）の行を生成する（ヘッダ含む）。"""
+    rng = random.Random(seed + 1)
+    header = [
+        "カテゴリ名", "サブカテゴリ名", "アイテム名",
+        "所要日数作業単位_数量", "所要日数作業単位_単位", "基本所要日数名", "基本所要日数",
+        "歩掛作業単位_数量", "歩掛作業単位_単位", "基本歩掛名", "歩掛カテゴリ", "項目名", "歩掛数量", "歩掛単位", "説明",
+    ]
+    rows = [header]
+    n_items = int(BASE_ROAD_ITEMS * scale)
+    while len(rows) - 1 < n_items:
+        daibunrui, koshu_list = rng.choice(CATEGORIES)
+        koshu = rng.choice(koshu_list).split(" ")[0]
+        for i in range(rng.randint(1, 5)):
+            item = rng.choice(TABLE_SUBJECTS)
+            if rng.random() < 0.3:
+                item += rng.choice(["(ICT対応含む)", "(人力)", "(機械)"])
+            # 見出しセルは表形式の段組どおり先頭行のみ（照合側で前方埋め）
+            rows.append([daibunrui if i == 0 else "", koshu if i == 0 else "", item] + [""] * 12)
+    return rows[: n_items + 1]
+
+
+def write_csv(rows: List[List[str]], path: str, quote_all: bool = False) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f, quoting=csv.QUOTE_ALL if quote_all else csv.QUOTE_MINIMAL).writerows(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成コーパスを生成します。")
+    parser.add_argument("--scale", type=float, default=1, help="現在のコーパスに対する倍率（1, 10, 100, 1000 など）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--outdir", default=".", help="出力先（unit_price_table_data_raw.csv / road_items.csv）")
+    args = parser.parse_args()
+
+    unit_rows = generate_unit_price_rows(args.scale, args.seed)
+    road_rows = generate_road_rows(args.scale, args.seed)
+    write_csv(unit_rows, os.path.join(args.outdir, "unit_price_table_data_raw.csv"), quote_all=True)
+    write_csv(road_rows, os.path.join(args.outdir, "road_items.csv"))
+    print(f"unit_price rows={len(unit_rows)} road items={len(road_rows) - 1} -> {args.outdir}")
+
+
+if __name__ == "__main__":
+    main()
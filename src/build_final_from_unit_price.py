@@ -1,15 +1,28 @@
+import argparse
 import os
 import re
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
 
+import numpy as np
 import pandas as pd
 
+import metrics
+import preprocess_unit_price
+import table_io
+import table_refs
+import text_normalize
+import unit_tables
 from preprocess_unit_price import (
-    load_and_normalize_unit_price,
-    normalize_table_data_for_aux,
+    load_normalized_unit_price,
     clean_cell,
     normalize_unit,
 )
+from stage_cache import Stage, run_stage
+from table_io import table_format, write_table
+from table_refs import TableDataIndex, resolve_table_refs
+from text_normalize import normalize_series
+from unit_tables import UnitTables
 
 
 def load_category_dict(dict_csv_path: str) -> List[Dict[str, str]]:
@@ -22,111 +35,216 @@ def load_category_dict(dict_csv_path: str) -> List[Dict[str, str]]:
     return rows
 
 
+# 辞書で決まらない場合のヒューリスティック（上から順に優先）
+HEURISTIC_RULES: List[Tuple[str, str]] = [
+    (r"運転\Z", "機械"),
+    ("|".join(map(re.escape, ["フィニッシャ", "カッタ", "クレーン", "スプレッダ", "レベラ", "ジャンボ", "ショベル", "バックホウ", "ローラ"])), "機械"),
+    ("|".join(map(re.escape, ["コンクリート", "接着剤", "鉄筋", "鉄網", "目地材", "砕石", "砂利", "スペーサー", "アスファルト"])), "資材"),
+    ("|".join(map(re.escape, ["作業員", "世話役", "工"])), "労務"),
+]
+
+# 結合できない（後方参照/途中のインラインフラグ等を含む）パターンの検出
+_UNCOMBINABLE = re.compile(r"\\[1-9]|\(\?P=|\(\?[aiLmsux]+\)")
+
+
+class CategoryClassifier:
+    """
+    名称 → 歩掛カテゴリ の分類器。
+
+    keyword_map.csv の category 規則（正規表現として不正なら部分一致）とヒューリスティックを
+    優先順の1本の正規表現にまとめ、先頭から「規則 i のパターンが文字列中のどこかに現れるか」を
+    先読みで順に判定する（最初に一致した規則を採用）。結果は名称ごとにメモ化する。
+    """
+
+    def __init__(self, dict_rows: List[Dict[str, str]]):
+        rules: List[Tuple[str, str]] = []
+        for row in dict_rows:
+            if row["type"] != "category" or not row["pattern"]:
+                continue
+            pat = row["pattern"]
+            try:
+                re.compile(pat)
+            except re.error:
+                pat = re.escape(pat)
+            rules.append((pat, row["value"]))
+        # 先頭 n_dict 件が辞書の規則、以降がヒューリスティック
+        self.n_dict = len(rules)
+        rules.extend(HEURISTIC_RULES)
+        self.values = [value for _, value in rules]
+
+        self._combined: Optional[Pattern[str]] = None
+        self._patterns: List[Pattern[str]] = []
+        if not any(_UNCOMBINABLE.search(pat) for pat, _ in rules):
+            try:
+                self._combined = re.compile(
+                    "^(?:" + "|".join(f"(?=.*?(?:{pat}))(?P<r{i}>)" for i, (pat, _) in enumerate(rules)) + ")"
+                )
+            except re.error:
+                self._combined = None
+        if self._combined is None:
+            self._patterns = [re.compile(pat) for pat, _ in rules]
+        self._memo: Dict[str, str] = {}
+
+    def _match(self, n: str) -> int:
+        # 最初に一致した規則の番号（一致なしは -1）
+        if self._combined is not None:
+            m = self._combined.match(n)
+            return -1 if m is None else int(m.lastgroup[1:])
+        for i, pat in enumerate(self._patterns):
+            if pat.search(n):
+                return i
+        return -1
+
+    def classify(self, name: str) -> str:
+        n = clean_cell(name)
+        category = self._memo.get(n)
+        if category is None:
+            i = self._match(n)
+            category = self.values[i] if i >= 0 else ""
+            self._memo[n] = category
+            metrics.count(
+                "derive_category.dictionary" if 0 <= i < self.n_dict else "derive_category.heuristic" if i >= 0 else "derive_category.unmatched"
+            )
+        return category
+
+
+@lru_cache(maxsize=8)
+def _classifier_for(rules: Tuple[Tuple[str, str, str], ...]) -> CategoryClassifier:
+    return CategoryClassifier([{"type": t, "pattern": p, "value": v} for t, p, v in rules])
+
+
 def derive_category(name: str, dict_rows: List[Dict[str, str]]) -> str:
-    n = clean_cell(name)
-    # 1) explicit category dictionary (substring/regex-like check)
-    for row in dict_rows:
-        if row["type"] != "category":
-            continue
-        pat = row["pattern"]
-        if not pat:
-            continue
-        try:
-            if re.search(pat, n):
-                return row["value"]
-        except re.error:
-            if pat in n:
-                return row["value"]
-    # 2) heuristic fallback
-    if n.endswith("運転") or any(k in n for k in ["フィニッシャ", "カッタ", "クレーン", "スプレッダ", "レベラ", "ジャンボ", "ショベル", "バックホウ", "ローラ"]):
-        return "機械"
-    if any(k in n for k in ["コンクリート", "接着剤", "鉄筋", "鉄網", "目地材", "砕石", "砂利", "スペーサー", "アスファルト"]):
-        return "資材"
-    if any(k in n for k in ["作業員", "世話役", "工"]):
-        return "労務"
-    return ""
-
-
-def build_final_df(unit_price_csv: str, table_data_csv: str, dict_csv: str) -> pd.DataFrame:
-    # Load normalized unit price data
-    up_df = load_and_normalize_unit_price(unit_price_csv)
-    # Optional auxiliary data (currently unused but kept for future merger/validation)
-    _aux = normalize_table_data_for_aux(table_data_csv)
-
-    # Load category dictionary
+    # 1) explicit category dictionary (regex; 不正な正規表現は部分一致) → 2) heuristic fallback
+    key = tuple((r["type"], r["pattern"], r["value"]) for r in dict_rows)
+    return _classifier_for(key).classify(name)
+
+
+# 最終CSVの作成に使う unit_price_normalized の列（これ以外は読み込まない）
+SOURCE_COLUMNS = ["大分類名", "工種名", "細別名", "歩掛作業単位_数量", "歩掛作業単位_単位", "名称", "数量", "単位", "摘要"]
+# 表参照の解決に使う列
+REF_SOURCE_COLUMNS = ["大分類名", "工種名", "摘要"]
+
+
+def build_final_df(unit_price_normalized_csv: str, dict_csv: str, table_data_csv: Optional[str] = None) -> pd.DataFrame:
     dict_rows = load_category_dict(dict_csv)
+    if table_format(unit_price_normalized_csv) == "tables":
+        # 表モデル（.npz）は行単位の DataFrame を作らず、文字列プールの番号のまま変換する
+        tables = UnitTables.load(unit_price_normalized_csv)
+        final_df = tables_to_final_schema(tables, dict_rows)
+        ref_source = tables.to_frame(REF_SOURCE_COLUMNS) if table_data_csv else None
+    else:
+        # Load normalized unit price data（preprocess の出力。手直し済みの内容をそのまま使う）
+        up_df = load_normalized_unit_price(unit_price_normalized_csv, SOURCE_COLUMNS)
+        final_df = map_to_final_schema(up_df, dict_rows)
+        ref_source = up_df.reset_index(drop=True)
+    if table_data_csv:
+        # 摘要中の表参照（表3.2 等）を table_data.csv の表に解決して列を追加
+        with metrics.timer("build.table_refs"):
+            index = TableDataIndex.from_csv(table_data_csv)
+            refs = resolve_table_refs(ref_source, index)
+        metrics.count("build.table_refs_unresolved", int((refs["参照表_未解決"] != "").sum()))
+        final_df = pd.concat([final_df, refs], axis=1)
+    return final_df
 
-    # Map to target schema
-    final_rows: List[Dict[str, str]] = []
-    for _, r in up_df.iterrows():
-        name = r.get("名称", "")
-        unit_ = normalize_unit(r.get("単位", ""))
-        qty = clean_cell(r.get("数量", ""))
-        category = derive_category(name, dict_rows)
+
+def final_schema(classifier: CategoryClassifier) -> List[Tuple[str, Optional[str], Optional[Callable[[str], str]]]]:
+    """
+    最終CSVの列ごとの (列名, unit_price_normalized の列, 変換) の一覧（列順）。
+    unit_price_normalized の列が None の列は空欄、変換が None の列は値をそのまま使う。
+    """
+    return [
+        # 置き換え: 大分類名/工種名/細別名 → カテゴリ名/サブカテゴリ名/アイテム名
+        ("カテゴリ名", "大分類名", None),
+        ("サブカテゴリ名", "工種名", None),
+        ("アイテム名", "細別名", None),
         # 所要日数作業単位_* は空欄（要望）、歩掛作業単位_* はUP側の値を使用
-        work_qty = clean_cell(r.get("歩掛作業単位_数量", ""))
-        work_unit = normalize_unit(r.get("歩掛作業単位_単位", ""))
-
-        final_rows.append(
-            {
-                # 置き換え: 大分類名/工種名/細別名 → カテゴリ名/サブカテゴリ名/アイテム名
-                "カテゴリ名": r.get("大分類名", ""),
-                "サブカテゴリ名": r.get("工種名", ""),
-                "アイテム名": r.get("細別名", ""),
-                "所要日数作業単位_数量": "",
-                "所要日数作業単位_単位": "",
-                "基本所要日数名": "",
-                "基本所要日数": "",
-                "歩掛作業単位_数量": work_qty,
-                "歩掛作業単位_単位": work_unit,
-                "基本歩掛名": "",
-                "歩掛カテゴリ": category,
-                "項目名": name,
-                "歩掛数量": qty,
-                "歩掛単位": unit_,
-                # 追加: 説明 ← 摘要
-                "説明": r.get("摘要", ""),
-            }
-        )
-
-    final_df = pd.DataFrame(final_rows)
-    # Column order as specified
-    col_order = [
-        "カテゴリ名",
-        "サブカテゴリ名",
-        "アイテム名",
-        "所要日数作業単位_数量",
-        "所要日数作業単位_単位",
-        "基本所要日数名",
-        "基本所要日数",
-        "歩掛作業単位_数量",
-        "歩掛作業単位_単位",
-        "基本歩掛名",
-        "歩掛カテゴリ",
-        "項目名",
-        "歩掛数量",
-        "歩掛単位",
-        "説明",
+        ("所要日数作業単位_数量", None, None),
+        ("所要日数作業単位_単位", None, None),
+        ("基本所要日数名", None, None),
+        ("基本所要日数", None, None),
+        ("歩掛作業単位_数量", "歩掛作業単位_数量", clean_cell),
+        ("歩掛作業単位_単位", "歩掛作業単位_単位", normalize_unit),
+        ("基本歩掛名", None, None),
+        ("歩掛カテゴリ", "名称", classifier.classify),
+        ("項目名", "名称", None),
+        ("歩掛数量", "数量", clean_cell),
+        ("歩掛単位", "単位", normalize_unit),
+        # 追加: 説明 ← 摘要
+        ("説明", "摘要", None),
     ]
-    final_df = final_df[col_order]
-    return final_df
+
+
+def map_to_final_schema(up_df: pd.DataFrame, dict_rows: List[Dict[str, str]]) -> pd.DataFrame:
+    # Map to target schema（列単位で変換、各変換は異なり値ごとに1回だけ評価）
+    blank = pd.Series("", index=up_df.index, dtype=object)
+    final_df = pd.DataFrame(
+        {
+            name: blank if src is None else up_df[src] if func is None else normalize_series(up_df[src], func)
+            for name, src, func in final_schema(CategoryClassifier(dict_rows))
+        }
+    )
+    return final_df.reset_index(drop=True)
+
+
+def tables_to_final_schema(tables: UnitTables, dict_rows: List[Dict[str, str]]) -> pd.DataFrame:
+    """map_to_final_schema と同じ変換を表モデルへ適用する（各変換は文字列プールの異なり値ごとに1回だけ評価）。"""
+    blank = np.full(len(tables), "", dtype=object)
+    pool = np.empty(len(tables.strings), dtype=object)
+    pool[:] = tables.strings
+    columns: Dict[str, np.ndarray] = {}
+    for name, src, func in final_schema(CategoryClassifier(dict_rows)):
+        if src is None:
+            columns[name] = blank
+        elif func is None:
+            columns[name] = pool[tables.codes[:, tables.column_index[src]]]
+        else:
+            columns[name] = tables.map_column(src, func)
+    return pd.DataFrame(columns)
 
 
 def main():
     base_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.normpath(os.path.join(base_dir, "..", "data"))
-    output_dir = os.path.join(data_dir, "output")
-    os.makedirs(output_dir, exist_ok=True)
-
-    unit_price_csv = os.path.join(data_dir, "unit_price_table_data.csv")
-    table_data_csv = os.path.join(data_dir, "table_data.csv")
-    dict_csv = os.path.join(base_dir, "keyword_map.csv")  # placed under src
-
-    final_df = build_final_df(unit_price_csv, table_data_csv, dict_csv)
-    out_csv = os.path.join(output_dir, "final_mapping.csv")
-    final_df.to_csv(out_csv, index=False, encoding="utf-8")
-    print(f"Wrote: {out_csv} (rows={len(final_df)})")
 
+    parser = argparse.ArgumentParser(description="正規化済み単価データから最終CSVを作成します。")
+    parser.add_argument(
+        "--unit",
+        default=os.path.join(data_dir, "normalized", "unit_price_normalized.csv"),
+        help="unit_price_normalized のパス（.csv / .parquet / .feather / .npz）",
+    )
+    # placed under src
+    parser.add_argument("--dict", default=os.path.join(base_dir, "keyword_map.csv"), help="keyword_map.csv のパス")
+    parser.add_argument(
+        "--table-refs",
+        action="store_true",
+        help="摘要中の表参照（表3.2 等）を table_data.csv で解決し、参照表/参照表_内容/参照表_未解決 の列を追加する",
+    )
+    parser.add_argument("--table-data", default=os.path.join(data_dir, "table_data.csv"), help="--table-refs で使う table_data.csv のパス")
+    parser.add_argument("--out", default=os.path.join(data_dir, "output", "final_mapping.csv"), help="出力ファイル（拡張子 .parquet / .feather で列指向形式、pyarrow が必要）")
+    parser.add_argument("--force", action="store_true", help="入力・コードに変更が無くても再実行する")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    table_data = args.table_data if args.table_refs else None
+
+    def run() -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with metrics.timer("build.build_final_df"):
+            final_df = build_final_df(args.unit, args.dict, table_data)
+        with metrics.timer("build.write"):
+            write_table(final_df, args.out)
+        metrics.count("build.rows_out", len(final_df))
+        print(f"Wrote: {args.out} (rows={len(final_df)})")
+
+    stage = Stage(
+        "build",
+        [args.unit, args.dict] + ([table_data] if table_data else []),
+        [args.out],
+        [os.path.abspath(__file__), preprocess_unit_price.__file__, text_normalize.__file__, table_io.__file__, unit_tables.__file__, table_refs.__file__],
+        {"table_refs": args.table_refs},
+    )
+    with metrics.session(args.metrics_out, args.profile_out):
+        run_stage(stage, run, force=args.force)
 
 if __name__ == "__main__":
     main()
@@ -1,75 +1,155 @@
+import argparse
 import csv
-import io
+import glob
+import os
 import sys
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from stage_cache import Stage, run_stage
+
+# スクリプトの場所を基準に既定のパスを構築
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.normpath(os.path.join(script_dir, "..", "data"))
+DEFAULT_INPUT_GLOB = os.path.join(DATA_DIR, "tmp", "gemini_tables_chunk_*.csv")
+TABLE_OUT = os.path.join(DATA_DIR, "table_data_raw.csv")
+UNIT_PRICE_OUT = os.path.join(DATA_DIR, "unit_price_table_data_raw.csv")
+
+
+def classify_row(row: List[str]) -> Optional[str]:
+    """
+    1行を「表」「単価表」のいずれかに分類する（該当しなければ None）。
+    2番目の要素（インデックス1）が表の名前や単価表のタイトル。
+    """
+    if len(row) > 1:
+        header = row[1]
+        if "単価表" in header:
+            return "単価表"
+        if "表" in header:
+            return "表"
+    return None
+
+
+def iter_csv_rows(file_path: str) -> Iterator[List[str]]:
+    """
+    CSV形式のファイルを1行ずつ読み込む（先頭のBOMは除去）。
+    """
+    with open(file_path, "r", newline="", encoding="utf-8-sig") as f:
+        # 既存のデータ形式に合わせてクォート文字を指定
+        yield from csv.reader(f, delimiter=",", quotechar='"')
+
+
+def expand_inputs(patterns: Iterable[str]) -> List[str]:
+    """
+    ファイルパス/グロブパターンを展開し、パターンごとに名前順で並べた重複の無いリストを返す。
+    """
+    paths: List[str] = []
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for p in matched:
+            if p not in paths:
+                paths.append(p)
+    return paths
+
+
+def classify_paths(paths: Iterable[str], emit: Callable[[str, List[str]], None]) -> List[Tuple[str, Dict[str, int]]]:
+    """
+    入力ファイルを順に1行ずつ分類し、「表」「単価表」の行を emit(種別, 行) へ渡す（分類できない行は捨てる）。
+    戻り値はファイルごとの行数（読込/表/単価表）。
+    """
+    counts: List[Tuple[str, Dict[str, int]]] = []
+    for path in paths:
+        c = {"rows": 0, "表": 0, "単価表": 0}
+        with metrics.timer("classify.file"):
+            for row in iter_csv_rows(path):
+                c["rows"] += 1
+                kind = classify_row(row)
+                if kind is not None:
+                    emit(kind, row)
+                    c[kind] += 1
+        counts.append((path, c))
+        metrics.count("classify.rows", c["rows"])
+        metrics.count("classify.表", c["表"])
+        metrics.count("classify.単価表", c["単価表"])
+        metrics.count("classify.unclassified", c["rows"] - c["表"] - c["単価表"])
+    return counts
+
+
+def classify_to_lists(paths: Iterable[str]) -> Tuple[Dict[str, List[List[str]]], List[Tuple[str, Dict[str, int]]]]:
+    """入力ファイルの行を「表」「単価表」のリストへ分類する（メモリ上で受け渡す場合用）。戻り値は (行, ファイルごとの行数)。"""
+    classified: Dict[str, List[List[str]]] = {"表": [], "単価表": []}
+    counts = classify_paths(paths, lambda kind, row: classified[kind].append(row))
+    return classified, counts
+
+
+def classify_files(paths: Iterable[str], table_out: str, unit_price_out: str) -> List[Tuple[str, Dict[str, int]]]:
+    """
+    入力ファイルを順に1行ずつ分類し、「表」「単価表」の出力CSVへ逐次書き出す（1パス・定数メモリ）。
+    元の形式（ダブルクォーテーションで全て囲む）を維持する。
+    戻り値はファイルごとの行数（読込/表/単価表）。
+    """
+    with open(table_out, "w", newline="", encoding="utf-8") as f_table, \
+            open(unit_price_out, "w", newline="", encoding="utf-8") as f_unit:
+        writers = {
+            "表": csv.writer(f_table, delimiter=",", quotechar='"', quoting=csv.QUOTE_ALL),
+            "単価表": csv.writer(f_unit, delimiter=",", quotechar='"', quoting=csv.QUOTE_ALL),
+        }
+        return classify_paths(paths, lambda kind, row: writers[kind].writerow(row))
+
 
 def classify_data_from_file(file_path):
     """
     テキストファイルからデータを読み込み、「表」と「単価表」の行に分類する。
     """
-    classified_data = {
-        "表": [],
-        "単価表": []
-    }
-    
     try:
-        # ファイルを開いて読み込む
-        with open(file_path, 'r', newline='', encoding='utf-8') as f:
-            # csv.readerを使用して、カンマ区切り（CSV形式）として行を読み込む
-            # 既存のデータ形式に合わせてクォート文字を指定
-            reader = csv.reader(f, delimiter=',', quotechar='"')
-            
-            for row in reader: # rowはファイル全体ではなく、行ごとの処理が必要
-                # データの行ごとに処理
-                if len(row) > 1:
-                    # 2番目の要素（インデックス1）が表の名前や単価表のタイトル
-                    header = row[1]
-                    
-                    if "単価表" in header:
-                        classified_data["単価表"].append(row)
-                    elif "表" in header:
-                        classified_data["表"].append(row)
-        
+        classified_data, _ = classify_to_lists([file_path])
         return classified_data
-        
+
     except FileNotFoundError:
         return {"error": f"エラー: ファイルが見つかりません。ファイルパスを確認してください: {file_path}"}
     except Exception as e:
         return {"error": f"処理中にエラーが発生しました: {e}"}
 
-def write_to_csv(file_name, data):
-    """
-    データを指定されたファイル名でCSV形式で書き出す。
-    元の形式（ダブルクォーテーションで全て囲む）を維持する。
-    """
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Gemini抽出CSVを「表」「単価表」に分類してCSVへ出力します。")
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[DEFAULT_INPUT_GLOB],
+        help="入力ファイルまたはグロブ（既定: data/tmp/gemini_tables_chunk_*.csv）。結合済みの .txt も指定可",
+    )
+    parser.add_argument("--table-out", default=TABLE_OUT, help="「表」の出力CSV")
+    parser.add_argument("--unit-price-out", default=UNIT_PRICE_OUT, help="「単価表」の出力CSV")
+    parser.add_argument("--force", action="store_true", help="入力・コードに変更が無くても再実行する")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    paths = expand_inputs(args.inputs)
+    missing = [p for p in paths if not os.path.isfile(p)]
+    if not paths or missing:
+        target = ", ".join(missing) if missing else ", ".join(args.inputs)
+        print(f"❌ エラー: 入力ファイルが見つかりません。ファイルパスを確認してください: {target}")
+        return 1
+
+    def run() -> None:
+        counts = classify_files(paths, args.table_out, args.unit_price_out)
+        for path, c in counts:
+            print(f"{os.path.basename(path)}: rows={c['rows']} 表={c['表']} 単価表={c['単価表']}")
+        total_table = sum(c["表"] for _, c in counts)
+        total_unit = sum(c["単価表"] for _, c in counts)
+        print(f"✅ ファイル出力完了: {args.table_out} に {total_table} 行のデータを出力しました。")
+        print(f"✅ ファイル出力完了: {args.unit_price_out} に {total_unit} 行のデータを出力しました。")
+
+    stage = Stage("classify", paths, [args.table_out, args.unit_price_out], [os.path.abspath(__file__)])
     try:
-        # 新しいファイルを作成して書き込む
-        with open(file_name, 'w', newline='', encoding='utf-8') as f:
-            # csv.writerを設定
-            writer = csv.writer(f, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
-            
-            # データを書き出し
-            writer.writerows(data)
-        
-        print(f"✅ ファイル出力完了: {file_name} に {len(data)} 行のデータを出力しました。")
-        return True
+        with metrics.session(args.metrics_out, args.profile_out):
+            run_stage(stage, run, force=args.force)
     except Exception as e:
-        print(f"❌ ファイル書き込みエラー ({file_name}): {e}")
-        return False
+        print(f"❌ 処理中にエラーが発生しました: {e}")
+        return 1
+    return 0
 
-# 実行
-import os
-# スクリプトの場所を基準に絶対パスを構築
-script_dir = os.path.dirname(os.path.abspath(__file__))
-file_name = os.path.join(script_dir, '../data/第２編土木工事標準歩掛.txt')
-result = classify_data_from_file(file_name)
-
-if "error" in result:
-    print(result["error"])
-else:
-    # 1. 「表」のデータをCSVに出力
-    table_file = os.path.join(script_dir, "../data/table_data_raw.csv")
-    write_to_csv(table_file, result["表"])
-    
-    # 2. 「単価表」のデータをCSVに出力
-    unit_price_file = os.path.join(script_dir, "../data/unit_price_table_data_raw.csv")
-    write_to_csv(unit_price_file, result["単価表"])
\ No newline at end of file
+
+if __name__ == "__main__":
+    sys.exit(main())
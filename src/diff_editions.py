@@ -0,0 +1,254 @@
+import argparse
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+import metrics
+import preprocess_unit_price
+import table_io
+import text_normalize
+import unit_tables
+from preprocess_unit_price import load_normalized_unit_price
+from stage_cache import Stage, run_stage
+from table_io import write_table
+from text_normalize import normalize_text
+
+
+# 行の対応付けに使う列（同じキーが複数ある場合は出現順の番号も加える）
+KEY_COLUMNS = ["大分類名", "工種名", "細別名", "名称", "規格"]
+# 既定で比較する列
+DEFAULT_COMPARE = ["数量", "単位", "歩掛作業単位_数量", "歩掛作業単位_単位"]
+# final_mapping.csv の列 → unit_price_normalized の列
+FINAL_TO_NORMALIZED = {
+    "カテゴリ名": "大分類名",
+    "サブカテゴリ名": "工種名",
+    "アイテム名": "細別名",
+    "項目名": "名称",
+    "歩掛数量": "数量",
+    "歩掛単位": "単位",
+    "説明": "摘要",
+}
+STATUSES = ["modified", "renamed", "added", "removed"]
+
+
+def load_edition(path: str, compare: Sequence[str]) -> pd.DataFrame:
+    """
+    unit_price_normalized（CSV / Parquet / Feather / .npz）または final_mapping.csv を読み込み、
+    KEY_COLUMNS + compare の列（文字列。無い列は空欄）と出現順の番号 _occ を持つ DataFrame にする。
+    """
+    df = load_normalized_unit_price(path)
+    if "大分類名" not in df.columns and "カテゴリ名" in df.columns:
+        df = df.rename(columns=FINAL_TO_NORMALIZED)
+    missing = [c for c in ["大分類名", "工種名", "細別名", "名称"] if c not in df.columns]
+    if missing:
+        raise ValueError(f"{path}: キーの列が見つかりません: {', '.join(missing)}")
+    out = df.reindex(columns=list(dict.fromkeys(KEY_COLUMNS + list(compare)))).astype(object)
+    out = out.where(out.notna(), "").astype(str)
+    out["_row"] = np.arange(len(out))
+    out["_occ"] = out.groupby(KEY_COLUMNS, sort=False).cumcount()
+    out["_hash"] = pd.util.hash_pandas_object(out[list(compare)], index=False).to_numpy()
+    return out
+
+
+def hash_join(
+    old: pd.DataFrame, new: pd.DataFrame, on: Sequence[str]
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    on の列で旧/新をハッシュ結合し、(対応した組, 旧のみ, 新のみ) を返す。
+    対応した組の列は旧側に _old、新側に _new の接尾辞を付ける。
+    """
+    merged = old.merge(new, on=list(on), how="outer", suffixes=("_old", "_new"), indicator=True)
+    both = merged[merged["_merge"] == "both"]
+    old_only = old.loc[old["_row"].isin(merged.loc[merged["_merge"] == "left_only", "_row_old"])]
+    new_only = new.loc[new["_row"].isin(merged.loc[merged["_merge"] == "right_only", "_row_new"])]
+    return both, old_only, new_only
+
+
+def rename_map(old: pd.DataFrame, new: pd.DataFrame, threshold: int) -> Dict[Tuple[str, str, str], str]:
+    """
+    対応の付かなかった行の細別名を、同じ (大分類名, 工種名) の中でファジー照合して旧 → 新 の対応を作る。
+    スコアの高い組から1対1に決める（WRatio、threshold 以上のみ）。
+    """
+    renames: Dict[Tuple[str, str, str], str] = {}
+    old_items = old.groupby(["大分類名", "工種名"], sort=False)["細別名"].unique()
+    new_items = new.groupby(["大分類名", "工種名"], sort=False)["細別名"].unique()
+    for group, olds in old_items.items():
+        if group not in new_items.index:
+            continue
+        news = [n for n in new_items[group] if n not in set(olds)]
+        olds = [o for o in olds if o not in set(new_items[group])]
+        if not olds or not news:
+            continue
+        scores = process.cdist(
+            [normalize_text(o) for o in olds],
+            [normalize_text(n) for n in news],
+            scorer=fuzz.WRatio,
+            score_cutoff=threshold,
+            dtype=np.uint8,
+        )
+        used_old, used_new = set(), set()
+        for i, j in sorted(zip(*np.nonzero(scores)), key=lambda ij: (-int(scores[ij]), ij)):
+            if i in used_old or j in used_new:
+                continue
+            used_old.add(i)
+            used_new.add(j)
+            renames[(group[0], group[1], olds[i])] = news[j]
+    return renames
+
+
+def _pairs(both: pd.DataFrame, status: str, compare: Sequence[str]) -> pd.DataFrame:
+    # 対応した組を出力の形にする（キー列は新側の値、旧側の値は 旧_ の列）
+    out = pd.DataFrame({"status": status}, index=both.index)
+    for col in KEY_COLUMNS:
+        out[col] = both[f"{col}_new"] if f"{col}_new" in both.columns else both[col]
+    out["旧細別名"] = both["細別名_old"] if "細別名_old" in both.columns else ""
+    out["旧規格"] = both["規格_old"] if "規格_old" in both.columns else ""
+    changed = [both[f"{c}_old"] != both[f"{c}_new"] for c in compare if c not in KEY_COLUMNS]
+    for col in compare:
+        if col in KEY_COLUMNS:
+            continue
+        out[f"旧_{col}"] = both[f"{col}_old"]
+        out[f"新_{col}"] = both[f"{col}_new"]
+    names = [c for c in compare if c not in KEY_COLUMNS]
+    if "規格_old" in both.columns:
+        changed.append(both["規格_old"] != both["規格_new"])
+        names.append("規格")
+    if "細別名_old" in both.columns:
+        changed.append(both["細別名_old"] != both["細別名_new"])
+        names.append("細別名")
+    flags = np.column_stack(changed) if changed else np.zeros((len(both), 0), dtype=bool)
+    out["変更列"] = [",".join(n for n, f in zip(names, row) if f) for row in flags.tolist()]
+    out["_old_row"] = both["_row_old"].to_numpy()
+    out["_new_row"] = both["_row_new"].to_numpy()
+    return out
+
+
+def _singles(rows: pd.DataFrame, status: str, compare: Sequence[str]) -> pd.DataFrame:
+    out = pd.DataFrame({"status": status}, index=rows.index)
+    for col in KEY_COLUMNS:
+        out[col] = rows[col]
+    prefix = "旧_" if status == "removed" else "新_"
+    for col in compare:
+        if col not in KEY_COLUMNS:
+            out[f"{prefix}{col}"] = rows[col]
+    out["_old_row" if status == "removed" else "_new_row"] = rows["_row"].to_numpy()
+    return out
+
+
+def diff_editions(
+    old: pd.DataFrame,
+    new: pd.DataFrame,
+    compare: Sequence[str] = DEFAULT_COMPARE,
+    rename_threshold: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    旧版/新版（load_edition の結果）の差分を求める。
+
+    1) (KEY_COLUMNS, 出現順) でハッシュ結合し、内容ハッシュ（compare の列）が異なる組を modified とする。
+    2) 残った行を規格を除いたキーで結合し直し、規格だけが変わった行も modified とする。
+    3) rename_threshold を指定すると、残った行の細別名を同じ工種内でファジー照合して読み替え、再度結合した組を renamed とする。
+    最後まで対応の付かない行は removed（旧のみ）/ added（新のみ）。行の比較はすべてハッシュ結合で、総当たりはしない。
+    """
+    compare = list(compare)
+    frames: List[pd.DataFrame] = []
+
+    with metrics.timer("diff.join"):
+        both, old_rest, new_rest = hash_join(old, new, KEY_COLUMNS + ["_occ"])
+    frames.append(_pairs(both[both["_hash_old"] != both["_hash_new"]], "modified", compare))
+    metrics.count("diff.unchanged", int((both["_hash_old"] == both["_hash_new"]).sum()))
+
+    # 規格のみ変更された行（規格を除いたキーの中で、出現順を振り直して結合）
+    loose = [c for c in KEY_COLUMNS if c != "規格"]
+    old_rest = old_rest.assign(_occ=old_rest.groupby(loose, sort=False).cumcount())
+    new_rest = new_rest.assign(_occ=new_rest.groupby(loose, sort=False).cumcount())
+    both, old_rest, new_rest = hash_join(old_rest, new_rest, loose + ["_occ"])
+    frames.append(_pairs(both, "modified", compare))
+
+    if rename_threshold is not None and len(old_rest) and len(new_rest):
+        with metrics.timer("diff.rekey"):
+            renames = rename_map(old_rest, new_rest, rename_threshold)
+            keys = list(zip(old_rest["大分類名"], old_rest["工種名"], old_rest["細別名"]))
+            rekeyed = old_rest.assign(_細別名=[renames.get(k, k[2]) for k in keys])
+            new_keyed = new_rest.assign(_細別名=new_rest["細別名"])
+            on = ["大分類名", "工種名", "_細別名", "名称"]
+            rekeyed = rekeyed.assign(_occ=rekeyed.groupby(on, sort=False).cumcount())
+            new_keyed = new_keyed.assign(_occ=new_keyed.groupby(on, sort=False).cumcount())
+            both, old_rest, new_rest = hash_join(
+                rekeyed[rekeyed["_細別名"] != rekeyed["細別名"]], new_keyed, on + ["_occ"]
+            )
+            # 読み替えの無かった旧側の行は結合の対象外にしたため戻す
+            old_rest = pd.concat([old_rest, rekeyed[rekeyed["_細別名"] == rekeyed["細別名"]]])
+        metrics.count("diff.renamed_items", len(renames))
+        frames.append(_pairs(both, "renamed", compare))
+
+    frames.append(_singles(new_rest, "added", compare))
+    frames.append(_singles(old_rest, "removed", compare))
+
+    result = pd.concat([f for f in frames if len(f)] or [frames[-1]], ignore_index=True)
+    result = result.reindex(columns=list(frames[0].columns))
+    # 並びは status の順、その中は新版（removed は旧版）の行順
+    order = result["_new_row"].fillna(result["_old_row"])
+    result = (
+        result.assign(_status=result["status"].map(STATUSES.index), _order=order)
+        .sort_values(["_status", "_order"], kind="stable")
+        .drop(columns=["_status", "_order", "_old_row", "_new_row"])
+        .fillna("")
+        .reset_index(drop=True)
+    )
+    for status in STATUSES:
+        metrics.count(f"diff.{status}", int((result["status"] == status).sum()))
+    return result
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.normpath(os.path.join(base_dir, "..", "data"))
+
+    parser = argparse.ArgumentParser(description="2つの版の unit_price_normalized（または final_mapping）の差分を出力します。")
+    parser.add_argument("old", help="旧版の unit_price_normalized / final_mapping のパス（.csv / .parquet / .feather / .npz）")
+    parser.add_argument("new", help="新版の unit_price_normalized / final_mapping のパス")
+    parser.add_argument("--out", default=os.path.join(data_dir, "output", "edition_diff.csv"), help="差分の出力先（拡張子 .parquet / .feather で列指向形式）")
+    parser.add_argument(
+        "--compare",
+        default=",".join(DEFAULT_COMPARE),
+        help="内容を比較する列（カンマ区切り。規格はキーの一部として常に比較）",
+    )
+    parser.add_argument(
+        "--rename-threshold",
+        type=int,
+        default=None,
+        help="指定すると、対応の付かない行の細別名を同じ工種内でファジー照合（0-100）し、名称変更として対応付ける",
+    )
+    parser.add_argument("--force", action="store_true", help="入力・コードに変更が無くても再実行する")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    compare = [c.strip() for c in args.compare.split(",") if c.strip()]
+
+    def run() -> None:
+        with metrics.timer("diff.load"):
+            old, new = load_edition(args.old, compare), load_edition(args.new, compare)
+        result = diff_editions(old, new, compare, args.rename_threshold)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        write_table(result, args.out)
+        counts = result["status"].value_counts()
+        print(f"Old: {args.old} (rows={len(old)})")
+        print(f"New: {args.new} (rows={len(new)})")
+        print("  " + " ".join(f"{s}={int(counts.get(s, 0))}" for s in STATUSES))
+        print(f"Wrote: {args.out} (rows={len(result)})")
+
+    stage = Stage(
+        "diff",
+        [args.old, args.new],
+        [args.out],
+        [os.path.abspath(__file__), preprocess_unit_price.__file__, text_normalize.__file__, table_io.__file__, unit_tables.__file__],
+        {"compare": compare, "rename_threshold": args.rename_threshold},
+    )
+    with metrics.session(args.metrics_out, args.profile_out):
+        run_stage(stage, run, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
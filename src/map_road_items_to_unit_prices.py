@@ -1,23 +1,55 @@
 import argparse
-import re
-import unicodedata
+import heapq
 from pathlib import Path
-from typing import List, Tuple, Set
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
+import rapidfuzz
+from rapidfuzz import fuzz, process
 
+import metrics
+import ngram_index
+import road_sources
+import score_cache
+import table_io
+import text_normalize
+import unit_tables
+from ngram_index import NgramIndex
+from road_sources import expand_road_inputs, iter_road_sheets, road_sheet_labels
+from score_cache import DEFAULT_MAX_ENTRIES, ScoreCache
+from stage_cache import Stage, run_stage
+from table_io import FORMAT_EXTENSIONS, TableWriter, empty_to_na, read_table, table_format, write_table
+from text_normalize import normalize_series, normalize_text
+from unit_tables import UnitTables
 
-# 文字列を比較用に正規化（NFKC化 → 前後空白除去 → 連続空白の圧縮）
-def normalize_text(value: object) -> str:
-    if value is None:
-        return ""
-    text = str(value)
-    text = unicodedata.normalize("NFKC", text)
-    text = text.strip()
-    # 空白類を単一スペースに統一
-    text = re.sub(r"\s+", " ", text)
-    return text
+
+# 候補CSVの列順
+CANDIDATE_COLUMNS = [
+    "カテゴリ名", "サブカテゴリ名", "アイテム名",
+    "大分類名", "工種名", "細別名",
+    "名称", "規格", "単位", "数量", "摘要",
+    "match_on", "match_score",
+]
+
+# 未一致の判定に使う道路側の列（この組ごとに一致/未一致を判定）
+ROAD_KEYS = ["カテゴリ名", "サブカテゴリ名", "アイテム名"]
+
+# 照合に使う単価側の列（これ以外は読み込まない）
+UNIT_COLUMNS = ["大分類名", "工種名", "細別名", "名称", "規格", "単位", "数量", "摘要"]
+
+# カテゴリフィルタ規則（none はフィルタ無しで全行が対象）
+CAT_FILTERS = ["both", "either", "borkind", "none"]
+# cat_filter=none で、アイテム名ごとに n-gram で絞り込む細別名/名称の語数（0 は全語と照合）
+DEFAULT_SHORTLIST = 50
+
+# 出力ファイル名の接頭辞（道路側が1シートの場合。複数シートではシートのラベルを使う）
+DEFAULT_PREFIX = "道路工事"
+# 複数シート照合時のシート別件数の集計表
+SHEETS_SUMMARY = "road_sheets_summary.csv"
+
+# スコアキャッシュのキーに含めるスコアラID（rapidfuzz の版が変われば別キー）
+SCORER_ID = f"WRatio/rapidfuzz-{rapidfuzz.__version__}"
 
 
 def best_score(item_norm: str, row_norm_shobetsu: str, row_norm_meishou: str) -> Tuple[int, str]:
@@ -32,6 +64,428 @@ def best_score(item_norm: str, row_norm_shobetsu: str, row_norm_meishou: str) ->
     return int(s2), "名称"
 
 
+def build_score_matrix(queries: Sequence[str], choices: Sequence[str], threshold: int, workers: int = -1) -> np.ndarray:
+    """
+    重複排除済みのアイテム名 × 照合対象名の WRatio スコア行列を一括計算する。
+    しきい値未満は 0 とする（best_score と同じく float64 で保持し、int 変換の結果を揃える）。
+    """
+    return process.cdist(
+        list(queries),
+        list(choices),
+        scorer=fuzz.WRatio,
+        score_cutoff=threshold,
+        dtype=np.float64,
+        workers=workers,
+    )
+
+
+def compute_scores(
+    queries: Sequence[str],
+    choices: Sequence[str],
+    threshold: int,
+    workers: int = -1,
+    cache: Optional[ScoreCache] = None,
+) -> np.ndarray:
+    """
+    スコア行列を返す。キャッシュ指定時はしきい値で切り捨てない生スコアを保存・再利用する。
+    """
+    if cache is None:
+        return build_score_matrix(queries, choices, threshold, workers)
+    return cache.score_matrix(queries, choices, SCORER_ID, lambda q, c: build_score_matrix(q, c, 0, workers))
+
+
+class CategoryIndex:
+    """
+    単価側「工種名」「大分類名」の部分文字列検索インデックス。
+
+    各列の重複排除済みの値に対して語（カテゴリ名/サブカテゴリ名）の包含判定を一度だけ行い、
+    語ごとの行ビットセット（bool 配列）と (カテゴリ, サブカテゴリ, 規則) ごとの行番号をメモ化する。
+    包含判定は正規表現ではなく文字列の部分一致で行う（'(' 等のメタ文字も文字として扱う）。
+    """
+
+    def __init__(self, unit_df: pd.DataFrame):
+        self.n_rows = len(unit_df)
+        self._columns: Dict[str, Tuple[np.ndarray, pd.Index]] = {}
+        for col in ["norm_工種名", "norm_大分類名"]:
+            codes, uniques = pd.factorize(unit_df[col])
+            self._columns[col] = (codes, uniques)
+        self._term_cache: Dict[Tuple[str, str], np.ndarray] = {}
+        self._pair_cache: Dict[Tuple[str, str, str], np.ndarray] = {}
+
+    def rows_containing(self, col: str, term: str) -> np.ndarray:
+        """指定列の値が term を含む行のビットセットを返す。"""
+        key = (col, term)
+        bits = self._term_cache.get(key)
+        if bits is None:
+            codes, uniques = self._columns[col]
+            hit_values = np.fromiter((term in v for v in uniques), dtype=bool, count=len(uniques))
+            bits = np.zeros(self.n_rows, dtype=bool)
+            valid = codes >= 0
+            bits[valid] = hit_values[codes[valid]]
+            self._term_cache[key] = bits
+        return bits
+
+    def mask(self, cat: str, sub: str, rule: str) -> np.ndarray:
+        """カテゴリフィルタ条件（both/either/borkind/none）に一致する行のビットセットを返す。"""
+        empty = np.zeros(self.n_rows, dtype=bool)
+        if rule == "both":
+            # 工種名が「カテゴリ名」かつ「サブカテゴリ名」を両方含む
+            if not cat or not sub:
+                return empty
+            return self.rows_containing("norm_工種名", cat) & self.rows_containing("norm_工種名", sub)
+        if rule == "either":
+            # 工種名が（カテゴリ or サブカテゴリ）のいずれかを含む
+            for t in [cat, sub]:
+                if t:
+                    empty = empty | self.rows_containing("norm_工種名", t)
+            return empty
+        if rule == "none":
+            # フィルタ無し（全行）
+            return ~empty
+        # borkind: 大分類名がカテゴリを含む OR 工種名がサブカテゴリを含む
+        if cat:
+            empty = empty | self.rows_containing("norm_大分類名", cat)
+        if sub:
+            empty = empty | self.rows_containing("norm_工種名", sub)
+        return empty
+
+    def rows(self, cat: str, sub: str, rule: str) -> np.ndarray:
+        """条件に一致する行番号（昇順）を返す。(カテゴリ, サブカテゴリ, 規則) ごとにメモ化。"""
+        key = (cat, sub, rule)
+        idx = self._pair_cache.get(key)
+        if idx is None:
+            idx = np.flatnonzero(self.mask(cat, sub, rule))
+            self._pair_cache[key] = idx
+        return idx
+
+
+class UnitIndex:
+    """
+    正規化済みの単価側と、照合に使う語彙・インデックス（複数シートの照合で共有し、一度だけ構築する）。
+
+    「細別名」「名称」の重複排除済み語彙と各行のコード、カテゴリフィルタ用の CategoryIndex、
+    --top-k 用の単価表（大分類名, 工種名, 細別名）のコードを保持する。
+    table_codes を渡した場合（.npz の表モデルに保存済みの表番号）は計算せずにそれを使う。
+    """
+
+    def __init__(self, unit_df: pd.DataFrame, table_codes: Optional[np.ndarray] = None):
+        self.df = unit_df
+        self.shobetsu_codes, self.shobetsu_vocab = pd.factorize(unit_df["norm_細別名"])
+        self.meishou_codes, self.meishou_vocab = pd.factorize(unit_df["norm_名称"])
+        self.categories = CategoryIndex(unit_df)
+        self._table_codes = table_codes
+        self._ngram: Optional[Tuple[NgramIndex, NgramIndex]] = None
+        self._row_groups: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def table_codes(self) -> np.ndarray:
+        """単価表（大分類名, 工種名, 細別名 の組）ごとのコード（初回参照時に計算）。"""
+        if self._table_codes is None:
+            self._table_codes, _ = pd.factorize(
+                pd.MultiIndex.from_arrays([self.df["norm_大分類名"], self.df["norm_工種名"], self.df["norm_細別名"]])
+            )
+        return self._table_codes
+
+    @property
+    def ngram(self) -> Tuple[NgramIndex, NgramIndex]:
+        """細別名・名称の語彙の n-gram インデックス（初回参照時に構築）。"""
+        if self._ngram is None:
+            self._ngram = (NgramIndex(list(self.shobetsu_vocab)), NgramIndex(list(self.meishou_vocab)))
+        return self._ngram
+
+    def rows_with(self, col: str, vocab_ids: np.ndarray) -> np.ndarray:
+        """列（"細別名"/"名称"）の値が語彙番号 vocab_ids のいずれかである行番号を返す（順不同）。"""
+        groups = self._row_groups.get(col)
+        if groups is None:
+            codes = self.shobetsu_codes if col == "細別名" else self.meishou_codes
+            order = np.argsort(codes, kind="stable")
+            starts = np.searchsorted(codes[order], np.arange(codes.max(initial=-1) + 2))
+            groups = self._row_groups[col] = (order, starts)
+        order, starts = groups
+        if len(vocab_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([order[starts[v]:starts[v + 1]] for v in vocab_ids])
+
+
+class ScoreMatrices(NamedTuple):
+    """重複排除済み語彙のスコア行列と、各行から語彙への対応（factorize のコード）。"""
+
+    item_codes: np.ndarray
+    shobetsu_codes: np.ndarray
+    meishou_codes: np.ndarray
+    shobetsu: np.ndarray
+    meishou: np.ndarray
+
+
+class ShortlistScores(NamedTuple):
+    """
+    cat_filter=none 用。道路側アイテム名の語ごとに、n-gram で絞り込んだ単価側の行番号（昇順）と
+    その行の細別名/名称のスコア（絞り込みから外れた語は 0）。
+    """
+
+    item_codes: np.ndarray
+    rows: List[np.ndarray]
+    shobetsu: List[np.ndarray]
+    meishou: List[np.ndarray]
+
+
+class Matches(NamedTuple):
+    """候補の (道路側の行位置, 単価側の行位置, スコア, 照合対象) 配列（道路側・単価側の行順）。"""
+
+    road_pos: np.ndarray
+    unit_pos: np.ndarray
+    score: np.ndarray
+    match_on: np.ndarray
+
+    def above(self, threshold: int) -> "Matches":
+        """スコアがしきい値以上の候補のみを返す（順序は保持）。"""
+        keep = self.score >= threshold
+        return Matches(self.road_pos[keep], self.unit_pos[keep], self.score[keep], self.match_on[keep])
+
+
+def compute_score_matrices(
+    road_df: pd.DataFrame,
+    unit: UnitIndex,
+    threshold: int,
+    workers: int = -1,
+    cache: Optional[ScoreCache] = None,
+) -> ScoreMatrices:
+    """
+    道路側アイテム名を重複排除し、単価側「細別名」「名称」の語彙（UnitIndex）とのスコア行列を一括計算する。
+    """
+    item_codes, item_vocab = pd.factorize(road_df["norm_アイテム名"])
+    metrics.count("match.pairs_scored", len(item_vocab) * (len(unit.shobetsu_vocab) + len(unit.meishou_vocab)))
+    return ScoreMatrices(
+        item_codes,
+        unit.shobetsu_codes,
+        unit.meishou_codes,
+        compute_scores(item_vocab, unit.shobetsu_vocab, threshold, workers, cache),
+        compute_scores(item_vocab, unit.meishou_vocab, threshold, workers, cache),
+    )
+
+
+def _shortlist_scores(query: str, index: NgramIndex, vocab: pd.Index, k: int, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    # 絞り込んだ語彙のうちしきい値以上の語の番号（昇順）と、その WRatio スコア
+    ids = index.shortlist(query, k)
+    if len(ids) == 0:
+        return ids, np.zeros(0, dtype=np.float64)
+    scores = build_score_matrix([query], vocab[ids], threshold, workers=1)[0]
+    keep = scores >= threshold
+    return ids[keep], scores[keep]
+
+
+def _lookup(codes: np.ndarray, ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    # 各行のコードが ids（昇順）に含まれればそのスコア、含まれなければ 0
+    out = np.zeros(len(codes), dtype=np.float64)
+    if len(ids):
+        at = np.searchsorted(ids, codes).clip(max=len(ids) - 1)
+        hit = ids[at] == codes
+        out[hit] = scores[at[hit]]
+    return out
+
+
+def compute_shortlist_scores(road_df: pd.DataFrame, unit: UnitIndex, threshold: int, k: int) -> ShortlistScores:
+    """
+    cat_filter=none（全行が対象）の照合で、全語とのスコア行列の代わりに使う。
+    アイテム名の語ごとに細別名・名称の語彙を n-gram インデックスで上位 k 語ずつに絞り込み、
+    その語だけを WRatio で採点する。絞り込みから外れた組はしきい値未満（0）として扱う。
+    """
+    item_codes, item_vocab = pd.factorize(road_df["norm_アイテム名"])
+    shobetsu_index, meishou_index = unit.ngram
+    rows: List[np.ndarray] = []
+    s1s: List[np.ndarray] = []
+    s2s: List[np.ndarray] = []
+    scored = 0
+    for query in item_vocab:
+        ids1, v1 = _shortlist_scores(query, shobetsu_index, unit.shobetsu_vocab, k, threshold)
+        ids2, v2 = _shortlist_scores(query, meishou_index, unit.meishou_vocab, k, threshold)
+        scored += len(ids1) + len(ids2)
+        idx = np.unique(np.concatenate([unit.rows_with("細別名", ids1), unit.rows_with("名称", ids2)]))
+        rows.append(idx)
+        s1s.append(_lookup(unit.shobetsu_codes[idx], ids1, v1))
+        s2s.append(_lookup(unit.meishou_codes[idx], ids2, v2))
+    metrics.count("match.pairs_scored", scored)
+    return ShortlistScores(item_codes, rows, s1s, s2s)
+
+
+def item_scores(
+    cat_index: CategoryIndex,
+    rule: str,
+    sm: Union[ScoreMatrices, ShortlistScores],
+    pos: int,
+    cat: str,
+    sub: str,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """道路側の1行について、照合対象の単価側の行番号と、その行の細別名/名称のスコアを返す。"""
+    if isinstance(sm, ShortlistScores):
+        code = sm.item_codes[pos]
+        return sm.rows[code], sm.shobetsu[code], sm.meishou[code]
+    # カテゴリフィルタ条件に応じて単価側を絞り込む
+    idx = cat_index.rows(cat, sub, rule)
+    return idx, sm.shobetsu[sm.item_codes[pos], sm.shobetsu_codes[idx]], sm.meishou[sm.item_codes[pos], sm.meishou_codes[idx]]
+
+
+def count_filtered_pairs(rule: str, considered: int, in_filter: int, n_rows: int) -> None:
+    # カテゴリフィルタで照合対象に残った組と除かれた組の数
+    metrics.count(f"match.{rule}.pairs_in_filter", in_filter)
+    metrics.count(f"match.{rule}.pairs_pruned", considered * n_rows - in_filter)
+
+
+def collect_matches(
+    road_df: pd.DataFrame,
+    cat_index: "CategoryIndex",
+    rule: str,
+    sm: Union[ScoreMatrices, ShortlistScores],
+    threshold: int,
+) -> Matches:
+    """
+    道路側アイテムごとにカテゴリフィルタで単価側を絞り込み、しきい値以上の候補を集める。
+    スコアは best_score と同じく「細別名」を優先（同点は細別名）し、整数へ切り捨てる。
+    """
+    road_pos: List[np.ndarray] = []
+    unit_pos: List[np.ndarray] = []
+    scores: List[np.ndarray] = []
+    match_ons: List[np.ndarray] = []
+
+    cats = road_df["norm_カテゴリ名"].tolist()
+    subs = road_df["norm_サブカテゴリ名"].tolist()
+    items = road_df["norm_アイテム名"].tolist()
+    considered = 0
+    in_filter = 0
+    for pos, (cat, sub, item) in enumerate(zip(cats, subs, items)):
+        if not item:
+            continue
+
+        idx, s1, s2 = item_scores(cat_index, rule, sm, pos, cat, sub)
+        considered += 1
+        in_filter += idx.size
+        if idx.size == 0:
+            continue
+
+        on_shobetsu = s1 >= s2
+        score = np.where(on_shobetsu, s1, s2).astype(int)
+        keep = score >= threshold
+        if not keep.any():
+            continue
+        road_pos.append(np.full(int(keep.sum()), pos))
+        unit_pos.append(idx[keep])
+        scores.append(score[keep])
+        match_ons.append(np.where(on_shobetsu[keep], "細別名", "名称"))
+
+    count_filtered_pairs(rule, considered, in_filter, cat_index.n_rows)
+    if not road_pos:
+        empty = np.zeros(0, dtype=int)
+        return Matches(empty, empty, empty, np.zeros(0, dtype=object))
+    return Matches(np.concatenate(road_pos), np.concatenate(unit_pos), np.concatenate(scores), np.concatenate(match_ons))
+
+
+def collect_top_k(
+    road_df: pd.DataFrame,
+    unit: UnitIndex,
+    rule: str,
+    sm: Union[ScoreMatrices, ShortlistScores],
+    threshold: int,
+    k: int,
+    expand_rows: bool = False,
+) -> Matches:
+    """
+    道路側アイテムごとに、スコア上位 k 件の単価表（大分類名, 工種名, 細別名 の組）を選ぶ。
+
+    単価表のスコアは表内の行スコア（細別名/名称の高い方）の最大値とし、ヒープで上位 k 件を選択する。
+    同点は単価側で先に現れる表を優先する。出力は表ごとに最高スコアの行を代表として1行、
+    expand_rows=True の場合は選ばれた表のフィルタ内の全行を、表のスコア・照合対象を付けて出力する。
+    """
+    cat_index = unit.categories
+    table_codes = unit.table_codes
+    road_pos: List[np.ndarray] = []
+    unit_pos: List[np.ndarray] = []
+    scores: List[np.ndarray] = []
+    match_ons: List[np.ndarray] = []
+
+    cats = road_df["norm_カテゴリ名"].tolist()
+    subs = road_df["norm_サブカテゴリ名"].tolist()
+    items = road_df["norm_アイテム名"].tolist()
+    considered = 0
+    in_filter = 0
+    for pos, (cat, sub, item) in enumerate(zip(cats, subs, items)):
+        if not item:
+            continue
+        idx, s1, s2 = item_scores(cat_index, rule, sm, pos, cat, sub)
+        considered += 1
+        in_filter += idx.size
+        if idx.size == 0:
+            continue
+
+        on_shobetsu = s1 >= s2
+        score = np.where(on_shobetsu, s1, s2).astype(int)
+
+        # 表ごとの最高スコアと、それを最初に達成した行（代表行）
+        tables, first, inv = np.unique(table_codes[idx], return_index=True, return_inverse=True)
+        best = np.full(len(tables), -1)
+        np.maximum.at(best, inv, score)
+        top = heapq.nlargest(
+            k,
+            (j for j in range(len(tables)) if best[j] >= threshold),
+            key=lambda j: (best[j], -first[j]),
+        )
+        for j in top:
+            members = np.flatnonzero(inv == j)
+            rep = members[np.argmax(score[members] == best[j])]
+            on = "細別名" if on_shobetsu[rep] else "名称"
+            rows = members if expand_rows else np.array([rep])
+            road_pos.append(np.full(len(rows), pos))
+            unit_pos.append(idx[rows])
+            scores.append(np.full(len(rows), best[j]))
+            match_ons.append(np.full(len(rows), on, dtype=object))
+
+    count_filtered_pairs(rule, considered, in_filter, cat_index.n_rows)
+    if not road_pos:
+        empty = np.zeros(0, dtype=int)
+        return Matches(empty, empty, empty, np.zeros(0, dtype=object))
+    return Matches(np.concatenate(road_pos), np.concatenate(unit_pos), np.concatenate(scores), np.concatenate(match_ons))
+
+
+def assemble_candidates(road_df: pd.DataFrame, unit_df: pd.DataFrame, matches: Matches) -> pd.DataFrame:
+    """
+    候補配列から候補表を組み立てる。候補が無ければヘッダのみの空表を返す。
+    """
+    if len(matches.road_pos) == 0:
+        return pd.DataFrame(columns=CANDIDATE_COLUMNS)
+    road_part = road_df[["カテゴリ名", "サブカテゴリ名", "アイテム名"]].iloc[matches.road_pos].reset_index(drop=True)
+    unit_part = unit_df.reindex(columns=UNIT_COLUMNS, fill_value="").iloc[matches.unit_pos].reset_index(drop=True)
+    out = pd.concat([road_part, unit_part], axis=1)
+    out["match_on"] = matches.match_on
+    out["match_score"] = matches.score
+    return out[CANDIDATE_COLUMNS]
+
+
+def road_keys(road_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    道路側の各行の（カテゴリ, サブカテゴリ, アイテム名）の組の番号（初出順）と、各組が最初に現れる行位置を返す。
+    """
+    codes = road_df.groupby(ROAD_KEYS, sort=False, dropna=False).ngroup().to_numpy()
+    _, first_rows = np.unique(codes, return_index=True)
+    return codes, first_rows
+
+
+def find_unmatched(road_df: pd.DataFrame, first_rows: np.ndarray, matched: np.ndarray) -> pd.DataFrame:
+    """
+    候補に一度も現れなかった（カテゴリ, サブカテゴリ, アイテム名）の組を、組の番号ごとの一致フラグで抽出する
+    （road_df[ROAD_KEYS].drop_duplicates() と同じ順序・同じ行）。
+    """
+    return road_df[ROAD_KEYS].iloc[first_rows[~matched]]
+
+
+def parse_list(value: str, cast=str) -> list:
+    """カンマ区切りの引数を重複を除いたリストに変換する（順序は保持）。"""
+    out = []
+    for tok in value.split(","):
+        tok = tok.strip()
+        if tok and cast(tok) not in out:
+            out.append(cast(tok))
+    return out
+
+
 def forward_fill_categories(df: pd.DataFrame) -> pd.DataFrame:
     # 「カテゴリ名」「サブカテゴリ名」の見出しセルを前方埋め（表形式の段組想定）
     cols = ["カテゴリ名", "サブカテゴリ名"]
@@ -52,143 +506,330 @@ def build_defaults_from_script() -> Tuple[Path, Path, Path]:
     return road_csv, unit_csv, out_dir
 
 
+def prepare_road_df(road_df: pd.DataFrame, source: str = "") -> pd.DataFrame:
+    """
+    道路側：カテゴリ見出しの前方埋め → アイテム名の空行を除外 → 比較用の正規化カラムを追加
+    """
+    road_df = forward_fill_categories(road_df)
+    if "アイテム名" in road_df.columns:
+        road_df = road_df[~road_df["アイテム名"].isna() & (road_df["アイテム名"].astype(str).str.strip() != "")]
+    else:
+        raise ValueError("入力CSVに 'アイテム名' 列が見つかりません: " + source)
+
+    road_df = road_df.copy()
+    road_df["norm_カテゴリ名"] = normalize_series(road_df["カテゴリ名"], normalize_text)
+    road_df["norm_サブカテゴリ名"] = normalize_series(road_df["サブカテゴリ名"], normalize_text)
+    road_df["norm_アイテム名"] = normalize_series(road_df["アイテム名"], normalize_text)
+    return road_df
+
+
+def prepare_unit_df(unit_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    単価側：必要なカラムを検証し、比較用の正規化カラムを追加
+    """
+    for col in ["大分類名", "工種名", "細別名", "名称"]:
+        if col not in unit_df.columns:
+            raise ValueError(f"unit_price_normalized.csv に必要な列が見つかりません: {col}")
+
+    unit_df = unit_df.copy()
+    unit_df["norm_大分類名"] = normalize_series(unit_df["大分類名"], normalize_text)
+    unit_df["norm_工種名"] = normalize_series(unit_df["工種名"], normalize_text)
+    unit_df["norm_細別名"] = normalize_series(unit_df["細別名"], normalize_text)
+    unit_df["norm_名称"] = normalize_series(unit_df["名称"], normalize_text)
+    return unit_df
+
+
+def load_unit_index(path: Path) -> UnitIndex:
+    """
+    unit_price_normalized（.csv / .parquet / .feather / .npz）の照合に使う列を読み込み、UnitIndex を構築する。
+    .npz（表モデル）は保存済みの表番号をそのまま --top-k の単価表のコードに使う。
+    """
+    if table_format(path) == "tables":
+        tables = UnitTables.load(path)
+        unit_df = empty_to_na(tables.to_frame(UNIT_COLUMNS))
+        return UnitIndex(prepare_unit_df(unit_df), tables.table_codes)
+    unit_df = read_table(path, UNIT_COLUMNS)
+    if table_format(path) != "csv":
+        # CSV を読んだ場合と同じく空欄は欠損値として扱う
+        unit_df = empty_to_na(unit_df)
+    return UnitIndex(prepare_unit_df(unit_df))
+
+
+def output_paths(
+    outdir: Path, thresholds: List[int], cat_filters: List[str], fmt: str = "csv", prefix: str = DEFAULT_PREFIX
+) -> List[Path]:
+    """
+    出力ファイルのパス一覧（設定ごとに候補・未一致、スイープ時は最後に集計表）。
+    候補・未一致は fmt の形式、集計表は常に CSV。ファイル名は prefix で始まる。
+    """
+    sweep = len(thresholds) > 1 or len(cat_filters) > 1
+    ext = FORMAT_EXTENSIONS[fmt]
+    paths: List[Path] = []
+    for rule in cat_filters:
+        for threshold in thresholds:
+            # スイープ時は設定ごとに接尾辞を付与
+            suffix = f"_{rule}_{threshold}" if sweep else ""
+            paths.append(outdir / f"{prefix}_unit_price_candidates{suffix}{ext}")
+            paths.append(outdir / f"{prefix}_unmatched{suffix}{ext}")
+    if sweep:
+        paths.append(outdir / f"{prefix}_sweep_summary.csv")
+    return paths
+
+
+def match_and_write(
+    road_df: pd.DataFrame,
+    unit: UnitIndex,
+    outdir: Path,
+    thresholds: List[int],
+    cat_filters: List[str],
+    top_k: Optional[int] = None,
+    expand_rows: bool = False,
+    workers: int = -1,
+    cache: Optional[ScoreCache] = None,
+    fmt: str = "csv",
+    prefix: str = DEFAULT_PREFIX,
+    shortlist: int = DEFAULT_SHORTLIST,
+    chunk_size: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    正規化済みの道路側を単価側（UnitIndex）と照合し、設定（カテゴリフィルタ × しきい値）ごとに
+    候補/未一致を fmt の形式で書き出す。設定ごとの件数の集計表を返す（スイープ時は CSV にも書き出す）。
+    cache は閉じないため、複数シートで共有できる。
+    cat_filter=none は shortlist > 0 なら n-gram で絞り込んだ語のみを採点する（0 なら全語と照合）。
+
+    chunk_size を指定すると道路側を chunk_size 行ずつ照合し、候補をその都度追記する
+    （スコア行列と候補の保持はチャンク分のみ。出力は一括の場合と同じ）。
+    """
+    use_shortlist = "none" in cat_filters and shortlist > 0
+    need_matrices = any(rule != "none" or not use_shortlist for rule in cat_filters)
+    cat_index = unit.categories
+    unit_df = unit.df
+    key_codes, first_rows = road_keys(road_df)
+
+    sweep = len(thresholds) > 1 or len(cat_filters) > 1
+    paths = iter(output_paths(outdir, thresholds, cat_filters, fmt, prefix))
+    settings = [(rule, threshold) for rule in cat_filters for threshold in thresholds]
+    out_paths = {setting: (next(paths), next(paths)) for setting in settings}
+    writers = {setting: TableWriter(out_paths[setting][0], CANDIDATE_COLUMNS) for setting in settings}
+    matched = {setting: np.zeros(len(first_rows), dtype=bool) for setting in settings}
+
+    step = chunk_size or max(len(road_df), 1)
+    try:
+        for start in range(0, len(road_df), step):
+            chunk = road_df.iloc[start:start + step]
+            # スコア行列はチャンクごとに全設定で最小のしきい値で一度だけ計算する（絞り込みを使う none のみなら不要）
+            if need_matrices:
+                with metrics.timer("match.score_matrices"):
+                    sm = compute_score_matrices(chunk, unit, min(thresholds), workers, cache)
+            if use_shortlist:
+                with metrics.timer("match.shortlist"):
+                    ss = compute_shortlist_scores(chunk, unit, min(thresholds), shortlist)
+            for rule in cat_filters:
+                scores = ss if rule == "none" and use_shortlist else sm
+                with metrics.timer("match.collect"):
+                    if top_k:
+                        matches = collect_top_k(chunk, unit, rule, scores, min(thresholds), top_k, expand_rows)
+                    else:
+                        matches = collect_matches(chunk, cat_index, rule, scores, min(thresholds))
+                for threshold in thresholds:
+                    kept = matches.above(threshold)
+                    matched[(rule, threshold)][key_codes[start + kept.road_pos]] = True
+                    if len(kept.road_pos):
+                        with metrics.timer("match.write"):
+                            writers[(rule, threshold)].write(assemble_candidates(chunk, unit_df, kept))
+            metrics.count("match.chunks")
+    finally:
+        # 候補の書き出しを閉じる（候補が無ければヘッダのみ）
+        for writer in writers.values():
+            writer.close()
+
+    summary_rows: List[dict] = []
+    for rule, threshold in settings:
+        out_candidates, out_unmatched = out_paths[(rule, threshold)]
+        unmatched_df = find_unmatched(road_df, first_rows, matched[(rule, threshold)])
+        n_candidates = writers[(rule, threshold)].rows
+        with metrics.timer("match.write"):
+            # 未一致の書き出し
+            write_table(unmatched_df, out_unmatched)
+        metrics.count(f"match.{rule}_{threshold}.candidates", n_candidates)
+        metrics.count(f"match.{rule}_{threshold}.unmatched_items", len(unmatched_df))
+
+        print(f"Wrote candidates: {out_candidates}")
+        print(f"Wrote unmatched:  {out_unmatched}")
+        summary_rows.append(
+            {
+                "cat_filter": rule,
+                "threshold": threshold,
+                "candidates": n_candidates,
+                "matched_items": len(first_rows) - len(unmatched_df),
+                "unmatched_items": len(unmatched_df),
+            }
+        )
+
+    summary_df = pd.DataFrame(summary_rows)
+    if sweep:
+        out_summary = next(paths)
+        summary_df.to_csv(out_summary, index=False, encoding="utf-8")
+        print(summary_df.to_string(index=False))
+        print(f"Wrote summary:    {out_summary}")
+    return summary_df
+
+
 def main():
     default_road, default_unit, default_outdir = build_defaults_from_script()
 
     # コマンドライン引数（説明は日本語で記載）
     parser = argparse.ArgumentParser(description="道路工事アイテムを単価データへファジー照合し、候補一覧を作成します。")
-    parser.add_argument("--road", type=Path, default=default_road, help="道路工事.xlsx - Sheet1.csv のパス")
-    parser.add_argument("--unit", type=Path, default=default_unit, help="unit_price_normalized.csv のパス")
+    parser.add_argument(
+        "--road",
+        type=Path,
+        nargs="+",
+        default=[default_road],
+        help="道路工事アイテム表のパス（.csv / .xlsx / それらを含むディレクトリ。複数指定可）",
+    )
+    parser.add_argument(
+        "--sheet",
+        action="append",
+        default=None,
+        help=".xlsx のうち照合するシート名（複数回指定可。既定は「アイテム名」列を持つ全シート）",
+    )
+    parser.add_argument("--unit", type=Path, default=default_unit, help="unit_price_normalized のパス（.csv / .parquet / .feather / .npz）")
     parser.add_argument("--outdir", type=Path, default=default_outdir, help="出力ディレクトリ（候補/未一致CSV）")
-    parser.add_argument("--threshold", type=int, default=85, help="ファジー一致のしきい値（0-100）")
+    parser.add_argument(
+        "--format",
+        choices=list(FORMAT_EXTENSIONS),
+        default="csv",
+        help="候補/未一致の保存形式（parquet/feather は pyarrow が必要）",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=str,
+        default="85",
+        help="ファジー一致のしきい値（0-100）。カンマ区切りで複数指定するとスイープ（例: 75,80,85,90）",
+    )
     parser.add_argument(
         "--cat_filter",
         type=str,
         default="both",
-        choices=["both", "either", "borkind"],
-        help="Filter rows by category rule: both=工種名にカテゴリ/サブカテゴリの両方を含む, either=どちらか一方を含む, borkind=大分類名にカテゴリ or 工種名にサブカテゴリを含む",
+        help="Filter rows by category rule: both=工種名にカテゴリ/サブカテゴリの両方を含む, either=どちらか一方を含む, borkind=大分類名にカテゴリ or 工種名にサブカテゴリを含む, "
+        "none=フィルタ無し（全行が対象）（カンマ区切りで複数指定するとスイープ）",
+    )
+    parser.add_argument(
+        "--shortlist",
+        type=int,
+        default=DEFAULT_SHORTLIST,
+        help="--cat_filter none で、アイテム名ごとに文字 n-gram で絞り込む細別名/名称の語数（0 で全語と照合）",
     )
+    parser.add_argument("--top-k", type=int, default=None, help="アイテムごとにスコア上位 k 件の単価表（大分類名/工種名/細別名）のみを出力")
+    parser.add_argument("--expand-rows", action="store_true", help="--top-k 指定時、選ばれた単価表の全行を出力（既定は表ごとに代表1行）")
+    parser.add_argument("--cache-dir", type=Path, default=None, help="スコアキャッシュ（SQLite）の保存先。指定時は未計算の組のみ照合")
+    parser.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES, help="スコアキャッシュの最大保持件数（超過分は古い順に削除）")
+    parser.add_argument("--workers", type=int, default=-1, help="スコア行列計算の並列数（-1 で全コア）")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="道路側をこの行数ずつ照合し、候補を順に追記する（メモリ使用量をチャンク分に抑える。出力は同じ）",
+    )
+    parser.add_argument("--force", action="store_true", help="入力・コード・パラメータに変更が無くても再実行する")
+    metrics.add_arguments(parser)
 
     args = parser.parse_args()
+    try:
+        thresholds = parse_list(args.threshold, int)
+    except ValueError:
+        parser.error(f"--threshold は整数（カンマ区切り可）で指定してください: {args.threshold}")
+    cat_filters = parse_list(args.cat_filter)
+    for rule in cat_filters:
+        if rule not in CAT_FILTERS:
+            parser.error(f"--cat_filter の値が不正です: {rule}（{', '.join(CAT_FILTERS)}）")
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error("--chunk-size は1以上で指定してください")
+    if args.shortlist < 0:
+        parser.error("--shortlist は0以上で指定してください")
+    if args.top_k is not None and args.top_k < 1:
+        parser.error("--top-k は1以上で指定してください")
+    if not thresholds or not cat_filters:
+        parser.error("--threshold / --cat_filter が空です")
 
-    outdir: Path = args.outdir
-    outdir.mkdir(parents=True, exist_ok=True)
-
-    # データ読み込み
-    road_df = pd.read_csv(args.road, encoding="utf-8")
-    unit_df = pd.read_csv(args.unit, encoding="utf-8")
-
-    # 道路側：カテゴリ見出しの前方埋め → アイテム名の空行を除外
-    road_df = forward_fill_categories(road_df)
-    if "アイテム名" in road_df.columns:
-        road_df = road_df[~road_df["アイテム名"].isna() & (road_df["アイテム名"].astype(str).str.strip() != "")]
-    else:
-        raise ValueError("入力CSVに 'アイテム名' 列が見つかりません: " + str(args.road))
-
-    # 比較用の正規化カラムを追加
-    road_df["norm_カテゴリ名"] = road_df["カテゴリ名"].map(normalize_text)
-    road_df["norm_サブカテゴリ名"] = road_df["サブカテゴリ名"].map(normalize_text)
-    road_df["norm_アイテム名"] = road_df["アイテム名"].map(normalize_text)
-
-    # 単価側に必要なカラムが存在するか検証
-    for col in ["大分類名", "工種名", "細別名", "名称"]:
-        if col not in unit_df.columns:
-            raise ValueError(f"unit_price_normalized.csv に必要な列が見つかりません: {col}")
-
-    # 単価側の比較用正規化カラム
-    unit_df["norm_大分類名"] = unit_df["大分類名"].map(normalize_text)
-    unit_df["norm_工種名"] = unit_df["工種名"].map(normalize_text)
-    unit_df["norm_細別名"] = unit_df["細別名"].map(normalize_text)
-    unit_df["norm_名称"] = unit_df["名称"].map(normalize_text)
-
-    candidates_records: List[dict] = []
+    road_files = expand_road_inputs(args.road)
+    labels = road_sheet_labels(road_files, args.sheet)
+    if not labels:
+        parser.error("--road に照合対象のシート（「アイテム名」列を含む）が見つかりません")
+    if len(set(labels)) != len(labels):
+        parser.error(f"シートのラベルが重複しています: {', '.join(labels)}")
+    multi = len(labels) > 1
 
-    # 道路側アイテムごとに候補検索
-    for _, item_row in road_df.iterrows():
-        cat = item_row.get("norm_カテゴリ名", "")
-        sub = item_row.get("norm_サブカテゴリ名", "")
-        item = item_row.get("norm_アイテム名", "")
+    def prefix_of(label: str) -> str:
+        # 1シートのみなら従来の出力ファイル名、複数シートではシートごとのラベルを接頭辞にする
+        return label if multi else DEFAULT_PREFIX
 
-        if not item:
-            continue
-
-        # カテゴリフィルタ条件に応じて単価側を絞り込む
-        if args.cat_filter == "both":
-            # 工種名が「カテゴリ名」かつ「サブカテゴリ名」を両方含む
-            if not cat or not sub:
-                filtered = unit_df.iloc[0:0]
-            else:
-                mask = unit_df["norm_工種名"].str.contains(cat, na=False) & unit_df["norm_工種名"].str.contains(sub, na=False)
-                filtered = unit_df[mask]
-        elif args.cat_filter == "either":
-            # 工種名が（カテゴリ or サブカテゴリ）のいずれかを含む
-            terms = [t for t in [cat, sub] if t]
-            if not terms:
-                filtered = unit_df.iloc[0:0]
-            else:
-                mask = False
-                for t in terms:
-                    mask = mask | unit_df["norm_工種名"].str.contains(t, na=False)
-                filtered = unit_df[mask]
-        else:  # borkind: 大分類名がカテゴリを含む OR 工種名がサブカテゴリを含む
-            mask = False
-            if cat:
-                mask = mask | unit_df["norm_大分類名"].str.contains(cat, na=False)
-            if sub:
-                mask = mask | unit_df["norm_工種名"].str.contains(sub, na=False)
-            filtered = unit_df[mask]
-
-        # ファジー一致スコアを計算し、しきい値以上のみを候補として採用
-        for _, urow in filtered.iterrows():
-            score, match_on = best_score(item, urow.get("norm_細別名", ""), urow.get("norm_名称", ""))
-            if score >= args.threshold:
-                rec = {
-                    "カテゴリ名": item_row.get("カテゴリ名", ""),
-                    "サブカテゴリ名": item_row.get("サブカテゴリ名", ""),
-                    "アイテム名": item_row.get("アイテム名", ""),
-                    "大分類名": urow.get("大分類名", ""),
-                    "工種名": urow.get("工種名", ""),
-                    "細別名": urow.get("細別名", ""),
-                    "名称": urow.get("名称", ""),
-                    "規格": urow.get("規格", ""),
-                    "単位": urow.get("単位", ""),
-                    "数量": urow.get("数量", ""),
-                    "摘要": urow.get("摘要", ""),
-                    "match_on": match_on,
-                    "match_score": score,
-                }
-                candidates_records.append(rec)
-
-    # 未一致リスト：候補に一度も現れなかった（カテゴリ, サブカテゴリ, アイテム名）の組を集合差で抽出
-    base_unmatched = road_df[["カテゴリ名", "サブカテゴリ名", "アイテム名"]].drop_duplicates()
-    if candidates_records:
-        matched_keys: Set[Tuple[str, str, str]] = set((r["カテゴリ名"], r["サブカテゴリ名"], r["アイテム名"]) for r in candidates_records)
-        mask_unmatched = ~base_unmatched.apply(lambda r: (r["カテゴリ名"], r["サブカテゴリ名"], r["アイテム名"]) in matched_keys, axis=1)
-        unmatched_df = base_unmatched[mask_unmatched]
-    else:
-        unmatched_df = base_unmatched
-
-    # 出力先のパス
-    out_candidates = args.outdir / "道路工事_unit_price_candidates.csv"
-    out_unmatched = args.outdir / "道路工事_unmatched.csv"
+    outdir: Path = args.outdir
+    outputs = [
+        str(path)
+        for label in labels
+        for path in output_paths(outdir, thresholds, cat_filters, args.format, prefix_of(label))
+    ]
+    if multi:
+        outputs.append(str(outdir / SHEETS_SUMMARY))
+    stage = Stage(
+        "map",
+        road_files + [str(args.unit)],
+        outputs,
+        [
+            str(Path(__file__).resolve()),
+            road_sources.__file__,
+            ngram_index.__file__,
+            score_cache.__file__,
+            text_normalize.__file__,
+            table_io.__file__,
+            unit_tables.__file__,
+        ],
+        {
+            "threshold": thresholds,
+            "cat_filter": cat_filters,
+            "top_k": args.top_k,
+            "expand_rows": args.expand_rows,
+            "sheet": args.sheet,
+            "shortlist": args.shortlist if "none" in cat_filters else None,
+        },
+    )
 
-    # 候補CSVの書き出し（候補が無ければヘッダのみ）
-    if candidates_records:
-        pd.DataFrame.from_records(candidates_records).to_csv(out_candidates, index=False, encoding="utf-8")
-    else:
-        pd.DataFrame(columns=[
-            "カテゴリ名", "サブカテゴリ名", "アイテム名",
-            "大分類名", "工種名", "細別名",
-            "名称", "規格", "単位", "数量", "摘要",
-            "match_on", "match_score",
-        ]).to_csv(out_candidates, index=False, encoding="utf-8")
+    def run() -> None:
+        outdir.mkdir(parents=True, exist_ok=True)
+        # 単価側の読み込み・正規化・インデックス構築は全シートで一度だけ
+        with metrics.timer("match.unit_index"):
+            unit = load_unit_index(args.unit)
+        cache = ScoreCache(args.cache_dir, args.cache_max_entries) if args.cache_dir else None
 
-    # 未一致CSVの書き出し
-    unmatched_df.to_csv(out_unmatched, index=False, encoding="utf-8")
+        summaries: List[pd.DataFrame] = []
+        # 道路側は1シートずつ読み込んで照合する
+        for sheet in iter_road_sheets(road_files, args.sheet):
+            if multi:
+                print(f"== {sheet.label} ({sheet.path}{' / ' + sheet.sheet if sheet.sheet else ''})")
+            road_df = prepare_road_df(sheet.frame, sheet.label)
+            summary_df = match_and_write(
+                road_df, unit, outdir, thresholds, cat_filters,
+                top_k=args.top_k, expand_rows=args.expand_rows, workers=args.workers, cache=cache, fmt=args.format,
+                prefix=prefix_of(sheet.label), shortlist=args.shortlist, chunk_size=args.chunk_size,
+            )
+            summaries.append(summary_df.assign(sheet=sheet.label))
+            metrics.count("match.sheets")
 
-    print(f"Wrote candidates: {out_candidates}")
-    print(f"Wrote unmatched:  {out_unmatched}")
+        if cache is not None:
+            print(f"Score cache: hits={cache.hits} misses={cache.misses} ({cache.path})")
+            metrics.count("match.cache_hits", cache.hits)
+            metrics.count("match.cache_misses", cache.misses)
+            cache.close()
+        if multi:
+            sheets_df = pd.concat(summaries, ignore_index=True)
+            sheets_df = sheets_df[["sheet"] + [c for c in sheets_df.columns if c != "sheet"]]
+            out_sheets = outdir / SHEETS_SUMMARY
+            sheets_df.to_csv(out_sheets, index=False, encoding="utf-8")
+            print(f"Wrote sheets:     {out_sheets}")
 
+    with metrics.session(args.metrics_out, args.profile_out):
+        run_stage(stage, run, force=args.force)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from map_road_items_to_unit_prices import (
+    CAT_FILTERS,
+    UNIT_COLUMNS,
+    ScoreMatrices,
+    UnitIndex,
+    build_defaults_from_script,
+    build_score_matrix,
+    collect_top_k,
+    load_unit_index,
+)
+from text_normalize import normalize_text
+
+
+# 1問い合わせで返す表の上限
+MAX_TOP_K = 100
+
+
+def _truthy(value: object) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+class MatchService:
+    """
+    unit_price_normalized を一度だけ読み込み、UnitIndex を保持して1件ずつの照合に答える。
+
+    問い合わせのたびにファイルの (サイズ, 更新時刻) を確認し、変化していれば読み直して差し替える。
+    読み直しに失敗した場合（書き込み途中など）は直前の索引で答え続ける。
+    """
+
+    def __init__(self, unit_path: Path, threshold: int = 60, top_k: int = 5, cat_filter: str = "both"):
+        self.unit_path = Path(unit_path)
+        self.threshold = threshold
+        self.top_k = top_k
+        self.cat_filter = cat_filter
+        self._lock = threading.Lock()
+        # 読み直しは1スレッドのみ（待っていたスレッドは読み直し後の索引を使う）
+        self._reload_lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self.unit: Optional[UnitIndex] = None
+        self._records: list = []
+        self.loaded_at = 0.0
+        self.reloads = 0
+        self.reload()
+
+    def _file_stamp(self) -> Tuple[int, int]:
+        st = os.stat(self.unit_path)
+        return st.st_size, st.st_mtime_ns
+
+    def reload(self) -> None:
+        """単価側を読み込み、UnitIndex を構築して差し替える。"""
+        stamp = self._file_stamp()
+        t0 = time.perf_counter()
+        unit = load_unit_index(self.unit_path)
+        # 応答用の行（欠損は null）を読み込み時に作っておき、問い合わせでは行番号で参照する
+        out = unit.df.reindex(columns=UNIT_COLUMNS).astype(object)
+        records = out.where(out.notna(), None).to_dict("records")
+        with self._lock:
+            self.unit, self._records, self._stamp = unit, records, stamp
+            self.loaded_at = time.time()
+            self.reloads += 1
+        print(f"Loaded: {self.unit_path} (rows={len(unit.df)}, {time.perf_counter() - t0:.2f}s)", file=sys.stderr)
+
+    def _stamp_changed(self) -> bool:
+        try:
+            return self._file_stamp() != self._stamp
+        except OSError:
+            return False
+
+    def current(self) -> Tuple[UnitIndex, list]:
+        """最新の UnitIndex と応答用の行を返す（ファイルが変わっていれば読み直す）。"""
+        if self._stamp_changed():
+            with self._reload_lock:
+                # 待っている間に他のスレッドが読み直していれば何もしない
+                if self._stamp_changed():
+                    try:
+                        self.reload()
+                    except Exception as e:  # noqa: BLE001 - 読み直しの失敗では停止しない
+                        print(f"Reload failed, keeping previous index: {e}", file=sys.stderr)
+                        # 同じ状態のファイルで読み直しを繰り返さない（置き換え中で見えない場合は次の問い合わせで再確認）
+                        try:
+                            self._stamp = self._file_stamp()
+                        except OSError:
+                            pass
+        with self._lock:
+            return self.unit, self._records
+
+    def status(self) -> Dict[str, object]:
+        unit, _ = self.current()
+        return {
+            "unit": str(self.unit_path),
+            "rows": len(unit.df),
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+        }
+
+    def query(self, params: Dict[str, object]) -> Dict[str, object]:
+        """
+        1件のアイテム名をスコア上位 top_k 件の単価表（表ごとに代表1行、expand_rows で全行）と照合する。
+        category/subcategory を省略した場合はカテゴリフィルタ無し（none）で全行を対象とする。
+        """
+        t0 = time.perf_counter()
+        item = str(params.get("item") or "")
+        if not item.strip():
+            raise ValueError("item を指定してください")
+        cat = str(params.get("category") or "")
+        sub = str(params.get("subcategory") or "")
+        rule = str(params.get("cat_filter") or (self.cat_filter if cat or sub else "none"))
+        if rule not in CAT_FILTERS:
+            raise ValueError(f"cat_filter の値が不正です: {rule}（{', '.join(CAT_FILTERS)}）")
+        try:
+            top_k = int(params.get("top_k") or self.top_k)
+            threshold = int(params.get("threshold") if params.get("threshold") not in (None, "") else self.threshold)
+        except (TypeError, ValueError):
+            raise ValueError("top_k / threshold は整数で指定してください") from None
+        if not 1 <= top_k <= MAX_TOP_K:
+            raise ValueError(f"top_k は 1〜{MAX_TOP_K} で指定してください")
+        if not 0 <= threshold <= 100:
+            raise ValueError("threshold は 0〜100 で指定してください")
+
+        unit, records = self.current()
+        norm_item = normalize_text(item)
+        road_df = pd.DataFrame(
+            {
+                "カテゴリ名": [cat],
+                "サブカテゴリ名": [sub],
+                "アイテム名": [item],
+                "norm_カテゴリ名": [normalize_text(cat)],
+                "norm_サブカテゴリ名": [normalize_text(sub)],
+                "norm_アイテム名": [norm_item],
+            }
+        )
+        # 1件の照合ではスレッド起動の方が高くつくため workers=1
+        sm = ScoreMatrices(
+            np.zeros(1, dtype=int),
+            unit.shobetsu_codes,
+            unit.meishou_codes,
+            build_score_matrix([norm_item], unit.shobetsu_vocab, threshold, workers=1),
+            build_score_matrix([norm_item], unit.meishou_vocab, threshold, workers=1),
+        )
+        matches = collect_top_k(road_df, unit, rule, sm, threshold, top_k, _truthy(params.get("expand_rows")))
+        candidates = [
+            dict(records[pos], match_on=str(on), match_score=int(score))
+            for pos, score, on in zip(matches.unit_pos.tolist(), matches.score.tolist(), matches.match_on.tolist())
+        ]
+        return {
+            "item": item,
+            "cat_filter": rule,
+            "candidates": candidates,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 3),
+        }
+
+
+def _dump(obj: Dict[str, object]) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def make_handler(service: MatchService, quiet: bool = False):
+    class Handler(BaseHTTPRequestHandler):
+        """GET /match?item=...（または POST /match に JSON）と GET /health に答える。"""
+
+        def _send(self, code: int, obj: Dict[str, object]) -> None:
+            body = _dump(obj)
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _answer(self, path: str, params: Dict[str, object]) -> None:
+            try:
+                if path == "/health":
+                    self._send(200, service.status())
+                elif path == "/match":
+                    self._send(200, service.query(params))
+                else:
+                    self._send(404, {"error": f"not found: {path}"})
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:  # noqa: BLE001 - 接続を切らずに JSON で返す
+                traceback.print_exc(file=sys.stderr)
+                self._send(500, {"error": f"internal error: {e}"})
+
+        def do_GET(self) -> None:  # noqa: N802
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            self._answer(url.path, params)
+
+        def do_POST(self) -> None:  # noqa: N802
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                params = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError as e:
+                self._send(400, {"error": f"JSON を解釈できません: {e}"})
+                return
+            if not isinstance(params, dict):
+                self._send(400, {"error": "JSON オブジェクトで指定してください"})
+                return
+            self._answer(url.path, params)
+
+        def log_message(self, fmt: str, *args) -> None:
+            # アクセスログは stderr へ（quiet 指定時は出力しない）
+            if not quiet:
+                super().log_message(fmt, *args)
+
+    return Handler
+
+
+def serve_http(service: MatchService, host: str, port: int, quiet: bool = False) -> None:
+    server = ThreadingHTTPServer((host, port), make_handler(service, quiet))
+    print(f"Listening on http://{host}:{server.server_port}/match?item=...", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def serve_stdio(service: MatchService, stdin=sys.stdin, stdout=sys.stdout) -> None:
+    """
+    1行1問い合わせの JSON を読み、1行の JSON で答える（{"item": ...} 以外に {"cmd": "health"} も可）。
+    """
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            params = json.loads(line)
+            if not isinstance(params, dict):
+                raise ValueError("JSON オブジェクトで指定してください")
+            result = service.status() if params.get("cmd") == "health" else service.query(params)
+        except (ValueError, json.JSONDecodeError) as e:
+            result = {"error": str(e)}
+        except Exception as e:  # noqa: BLE001 - 1件の失敗でサーバを止めない
+            traceback.print_exc(file=sys.stderr)
+            result = {"error": f"internal error: {e}"}
+        stdout.write(_dump(result).decode("utf-8") + "\n")
+        stdout.flush()
+
+
+def main():
+    _, default_unit, _ = build_defaults_from_script()
+
+    parser = argparse.ArgumentParser(description="単価データを常駐して読み込み、アイテム名の照合候補を即時に返します。")
+    parser.add_argument("--unit", type=Path, default=default_unit, help="unit_price_normalized のパス（.csv / .parquet / .feather / .npz）")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けアドレス（既定はローカルのみ）")
+    parser.add_argument("--port", type=int, default=8765, help="待ち受けポート")
+    parser.add_argument("--stdio", action="store_true", help="HTTP の代わりに標準入出力の JSON Lines で問い合わせに答える")
+    parser.add_argument("--threshold", type=int, default=60, help="既定のしきい値（問い合わせの threshold で上書き可）")
+    parser.add_argument("--top-k", type=int, default=5, help="既定の候補表数（問い合わせの top_k で上書き可）")
+    parser.add_argument(
+        "--cat_filter",
+        choices=CAT_FILTERS,
+        default="both",
+        help="category/subcategory 指定時の既定のカテゴリフィルタ（問い合わせの cat_filter で上書き可）",
+    )
+    parser.add_argument("--quiet", action="store_true", help="HTTP のアクセスログを出力しない")
+    args = parser.parse_args()
+    if not 1 <= args.top_k <= MAX_TOP_K:
+        parser.error(f"--top-k は 1〜{MAX_TOP_K} で指定してください")
+    if not 0 <= args.threshold <= 100:
+        parser.error("--threshold は 0〜100 で指定してください")
+
+    service = MatchService(args.unit, args.threshold, args.top_k, args.cat_filter)
+    if args.stdio:
+        serve_stdio(service)
+    else:
+        serve_http(service, args.host, args.port, args.quiet)
+
+
+if __name__ == "__main__":
+    main()
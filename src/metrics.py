@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional
+
+# 計測の有効/無効（無効時は count/timer は何もしない）
+_enabled = False
+_counters: Counter = Counter()
+# 名前 → [合計秒, 呼び出し回数]
+_timers: Dict[str, List[float]] = {}
+_NULL = nullcontext()
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    _counters.clear()
+    _timers.clear()
+
+
+def count(name: str, n: int = 1) -> None:
+    """カウンタを n 増やす（無効時は何もしない）。"""
+    if _enabled:
+        _counters[name] += int(n)
+
+
+def add_time(name: str, seconds: float) -> None:
+    """計測済みの経過時間をタイマへ加算する（無効時は何もしない）。"""
+    if _enabled:
+        entry = _timers.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def _timed(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - t0)
+
+
+def timer(name: str):
+    """with 文で囲んだ区間の経過時間を加算する（無効時は何もしないコンテキスト）。"""
+    return _timed(name) if _enabled else _NULL
+
+
+def snapshot() -> dict:
+    """カウンタとタイマの現在値。"""
+    return {
+        "counters": dict(sorted(_counters.items())),
+        "timers": {name: {"seconds": round(sec, 6), "calls": calls} for name, (sec, calls) in sorted(_timers.items())},
+    }
+
+
+def merge(snap: dict) -> None:
+    """snapshot() の値（子プロセスの計測結果など）をカウンタとタイマへ加算する（無効時は何もしない）。"""
+    if not _enabled:
+        return
+    for name, n in snap.get("counters", {}).items():
+        _counters[name] += int(n)
+    for name, t in snap.get("timers", {}).items():
+        entry = _timers.setdefault(name, [0.0, 0])
+        entry[0] += t["seconds"]
+        entry[1] += t["calls"]
+
+
+def add_arguments(parser) -> None:
+    """各スクリプト共通の計測オプションを追加する。"""
+    parser.add_argument("--metrics-out", default=None, help="計測結果（タイマ/カウンタ）を書き出すJSONのパス")
+    parser.add_argument("--profile-out", default=None, help="cProfile の結果（pstats 形式）の出力先")
+
+
+@contextmanager
+def session(metrics_out: Optional[str] = None, profile_out: Optional[str] = None) -> Iterator[None]:
+    """
+    metrics_out を指定すると計測を有効にし、終了時に JSON へ書き出す。
+    profile_out を指定すると区間全体を cProfile で計測してダンプする。
+    どちらも未指定なら何もしない。
+    """
+    if metrics_out:
+        enable()
+    profiler = None
+    if profile_out:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(os.path.dirname(os.path.abspath(profile_out)), exist_ok=True)
+            profiler.dump_stats(profile_out)
+            print(f"Wrote profile: {profile_out}")
+        if metrics_out:
+            os.makedirs(os.path.dirname(os.path.abspath(metrics_out)), exist_ok=True)
+            with open(metrics_out, "w", encoding="utf-8") as f:
+                json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+            print(f"Wrote metrics: {metrics_out}")
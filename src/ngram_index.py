@@ -0,0 +1,75 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Sequence, Set
+
+import numpy as np
+
+
+# 索引に使う文字 n-gram の長さ（1文字も含める: WRatio は「杭」「砂」のような1文字の語にも部分一致で高得点を付ける）
+NGRAM_SIZES = (1, 2, 3)
+# 出現する語の割合がこれを超える n-gram は絞り込みに使わない（問い合わせに他の n-gram が無い場合を除く）
+MAX_DF_RATIO = 0.2
+
+
+def char_ngrams(text: str, sizes: Sequence[int] = NGRAM_SIZES) -> Set[str]:
+    """文字 n-gram の集合。"""
+    return {text[i:i + n] for n in sizes for i in range(len(text) - n + 1)}
+
+
+class NgramIndex:
+    """
+    重複排除済みの語彙に対する文字 n-gram（1〜3文字）の転置インデックス。
+
+    共有する n-gram の IDF 重みから WRatio に近い類似度（重み付き Dice 係数と、短い方が長い方に
+    含まれる度合いを長さの比で割り引いたものの大きい方）を求め、上位の語だけを候補として返す。
+    参照するのは問い合わせの n-gram の出現リストのみで、多くの語に現れる n-gram は使わないため、
+    語彙が増えても問い合わせの計算量はほぼ増えない。
+    """
+
+    def __init__(self, vocab: Sequence[str], max_df_ratio: float = MAX_DF_RATIO):
+        self.size = len(vocab)
+        vocab_grams = [char_ngrams(text) for text in vocab]
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for i, grams in enumerate(vocab_grams):
+            for gram in grams:
+                postings[gram].append(i)
+        self._postings = {gram: np.asarray(ids, dtype=np.int64) for gram, ids in postings.items()}
+        self._idf = {gram: math.log(1 + self.size / len(ids)) for gram, ids in postings.items()}
+        self._max_df = max(1, int(self.size * max_df_ratio))
+        # 語ごとの n-gram 重みの合計（絞り込みに使う n-gram のみ / 全 n-gram）
+        self._weight = np.array([sum(self._idf[g] for g in grams if self._selective(g)) for grams in vocab_grams])
+        self._weight_all = np.array([sum(self._idf[g] for g in grams) for grams in vocab_grams])
+        self._length = np.array([len(text) for text in vocab])
+
+    def _selective(self, gram: str) -> bool:
+        return len(self._postings[gram]) <= self._max_df
+
+    def shortlist(self, query: str, k: int) -> np.ndarray:
+        """query との類似度が上位 k 件の語彙番号を返す（昇順）。"""
+        query_grams = char_ngrams(query)
+        grams = [g for g in query_grams if g in self._postings]
+        selective = [g for g in grams if self._selective(g)]
+        weight = self._weight if selective else self._weight_all
+        grams = selective or grams
+        if not grams:
+            return np.zeros(0, dtype=np.int64)
+        ids = np.concatenate([self._postings[g] for g in grams])
+        weights = np.concatenate([np.full(len(self._postings[g]), self._idf[g]) for g in grams])
+        uniq, inv = np.unique(ids, return_inverse=True)
+        if len(uniq) <= k:
+            return uniq
+        shared = np.bincount(inv, weights=weights)
+        # 語彙に無い n-gram も問い合わせ側の重みには含める（最も稀な n-gram として扱う）。
+        # 多くの語に現れるため使わなかった n-gram は、語側の重み（_weight）と同じく含めない
+        missing = sum(1 for g in query_grams if g not in self._postings)
+        query_weight = sum(self._idf[g] for g in grams) + missing * math.log(1 + self.size)
+        target_weight = weight[uniq]
+        dice = 2 * shared / (query_weight + target_weight)
+        contained = np.minimum(shared / np.maximum(np.minimum(query_weight, target_weight), 1e-12), 1.0)
+        # WRatio と同じく、長さの比が 8 以上の部分一致は 0.6 倍、それ未満は 0.9 倍に割り引く
+        length = self._length[uniq]
+        ratio = np.maximum(length, len(query)) / np.maximum(np.minimum(length, len(query)), 1)
+        score = np.maximum(dice, np.where(ratio < 8, 0.9, 0.6) * contained)
+        # 同点は長さの近い方、さらに語彙番号の小さい方を優先
+        order = np.lexsort((uniq, np.abs(length - len(query)), -score))[:k]
+        return np.sort(uniq[order])
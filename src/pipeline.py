@@ -0,0 +1,210 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+import metrics
+import prepare_unit_price_from_raw
+import preprocess_unit_price
+from build_final_from_unit_price import load_category_dict, map_to_final_schema
+from classify_data_from_file import DEFAULT_INPUT_GLOB, classify_to_lists, expand_inputs
+from map_road_items_to_unit_prices import (
+    CAT_FILTERS,
+    UnitIndex,
+    match_and_write,
+    parse_list,
+    prepare_road_df,
+    prepare_unit_df,
+)
+from prepare_unit_price_from_raw import clean_rows, write_rows
+from preprocess_unit_price import (
+    normalize_rows_incremental,
+    normalize_unit_price_rows,
+    normalize_unit_price_rows_parallel,
+    unit_price_frame,
+)
+from row_store import RowStore, code_digest
+from table_io import empty_to_na
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.normpath(os.path.join(BASE_DIR, "..", "data"))
+
+
+def peak_rss_mb() -> Optional[float]:
+    """プロセスのピーク常駐メモリ（MB）。取得できない環境では None。"""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux は KB、macOS はバイト単位
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+class StageReport:
+    """
+    ステージごとの経過時間・入出力行数・ピークRSSを表示する。
+    with 文で囲み、終了前に rows_in / rows_out を設定する。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows_in = 0
+        self.rows_out = 0
+
+    def __enter__(self) -> "StageReport":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            return
+        elapsed = time.perf_counter() - self._t0
+        rss = peak_rss_mb()
+        rss_text = f"{rss:.1f} MB" if rss is not None else "n/a"
+        metrics.add_time(f"pipeline.{self.name}", elapsed)
+        metrics.count(f"pipeline.{self.name}.rows_in", self.rows_in)
+        metrics.count(f"pipeline.{self.name}.rows_out", self.rows_out)
+        print(f"[{self.name:<10}] {elapsed:8.3f}s  rows {self.rows_in} -> {self.rows_out}  peak RSS {rss_text}")
+
+
+def write_quoted(rows: List[List[str]], out_csv: str) -> None:
+    # classify_data_from_file と同じく全セルをダブルクォートで囲む
+    with open(out_csv, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f, delimiter=",", quotechar='"', quoting=csv.QUOTE_ALL).writerows(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="分類 → クリーニング → 正規化 → 照合 → 最終集計 を1プロセスで実行します（中間データはメモリ上で受け渡し）。"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[DEFAULT_INPUT_GLOB],
+        help="Gemini抽出CSV（ファイル/グロブ、既定: data/tmp/gemini_tables_chunk_*.csv）",
+    )
+    parser.add_argument("--road", type=Path, default=Path(DATA_DIR) / "道路工事.xlsx - Sheet1.csv", help="道路工事アイテムのCSV")
+    parser.add_argument("--dict", default=os.path.join(BASE_DIR, "keyword_map.csv"), help="keyword_map.csv のパス")
+    parser.add_argument("--data-dir", type=Path, default=Path(DATA_DIR), help="出力先の data ディレクトリ")
+    parser.add_argument("--threshold", type=str, default="85", help="ファジー一致のしきい値（カンマ区切りでスイープ）")
+    parser.add_argument("--cat_filter", type=str, default="both", help="カテゴリフィルタ（both/either/borkind、カンマ区切りでスイープ）")
+    parser.add_argument("--top-k", type=int, default=None, help="アイテムごとにスコア上位 k 件の単価表のみを出力")
+    parser.add_argument("--workers", type=int, default=-1, help="スコア行列計算の並列数（-1 で全コア）")
+    parser.add_argument("--cache-dir", type=Path, default=None, help="行単位のクリーニング/正規化結果の保存先。指定時は新規・変更行のみ処理")
+    parser.add_argument(
+        "--prep-workers",
+        type=int,
+        default=1,
+        help="クリーニング/正規化に使うプロセス数（-1 で CPU 数）。結果は1プロセスの場合と同じ",
+    )
+    parser.add_argument(
+        "--checkpoints",
+        action="store_true",
+        help="中間CSV（table_data_raw / unit_price_table_data_raw / _cleaned / unit_price_table_data / unit_price_normalized）も書き出す",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    thresholds = parse_list(args.threshold, int)
+    cat_filters = parse_list(args.cat_filter)
+    if not thresholds or not cat_filters or any(rule not in CAT_FILTERS for rule in cat_filters):
+        parser.error("--threshold / --cat_filter の指定が不正です")
+
+    paths = expand_inputs(args.inputs)
+    missing = [p for p in paths if not os.path.isfile(p)]
+    if not paths or missing:
+        print(f"❌ エラー: 入力ファイルが見つかりません: {', '.join(missing or args.inputs)}")
+        return 1
+
+    with metrics.session(args.metrics_out, args.profile_out):
+        run_pipeline(args, paths, thresholds, cat_filters)
+    return 0
+
+
+def run_pipeline(args: argparse.Namespace, paths: List[str], thresholds: List[int], cat_filters: List[str]) -> None:
+    data_dir: Path = args.data_dir
+    data_dir.mkdir(parents=True, exist_ok=True)
+    t_total = time.perf_counter()
+
+    # 1) 分類
+    with StageReport("classify") as st:
+        classified, counts = classify_to_lists(paths)
+        table_rows, unit_rows = classified["表"], classified["単価表"]
+        st.rows_in = sum(c["rows"] for _, c in counts)
+        st.rows_out = len(unit_rows)
+        if args.checkpoints:
+            write_quoted(table_rows, str(data_dir / "table_data_raw.csv"))
+            write_quoted(unit_rows, str(data_dir / "unit_price_table_data_raw.csv"))
+    del table_rows
+
+    # 2) クリーニング（7列揃え・見出し番号除去）
+    with StageReport("prepare") as st:
+        store = RowStore(args.cache_dir, "prepare", code_digest(prepare_unit_price_from_raw.ROW_CODE)) if args.cache_dir else None
+        cleaned = clean_rows(unit_rows, store, args.prep_workers)
+        if store is not None:
+            print(f"Row cache: reused={store.hits} normalized={store.misses} pruned={store.pruned}")
+            store.close()
+        st.rows_in, st.rows_out = len(unit_rows), len(cleaned)
+        if args.checkpoints:
+            write_rows(cleaned, str(data_dir / "unit_price_table_data_raw_cleaned.csv"))
+            write_rows(cleaned, str(data_dir / "unit_price_table_data.csv"))
+    del unit_rows
+
+    # 3) 正規化
+    with StageReport("preprocess") as st:
+        if args.cache_dir:
+            store = RowStore(args.cache_dir, "preprocess", code_digest(preprocess_unit_price.ROW_CODE))
+            norm_df = normalize_rows_incremental(cleaned, store, args.prep_workers)
+            print(f"Row cache: reused={store.hits} normalized={store.misses} pruned={store.pruned}")
+            store.close()
+        elif args.prep_workers != 1:
+            norm_df = normalize_unit_price_rows_parallel(cleaned, args.prep_workers)
+        else:
+            norm_df = normalize_unit_price_rows(unit_price_frame(cleaned)).reset_index(drop=True)
+        st.rows_in, st.rows_out = len(cleaned), len(norm_df)
+        if args.checkpoints:
+            out_dir = data_dir / "normalized"
+            out_dir.mkdir(parents=True, exist_ok=True)
+            norm_df.to_csv(out_dir / "unit_price_normalized.csv", index=False, encoding="utf-8")
+    del cleaned
+
+    # 4) 照合（候補/未一致CSVは常に出力）
+    with StageReport("map") as st:
+        road_df = prepare_road_df(pd.read_csv(args.road, encoding="utf-8"), str(args.road))
+        # CSV 経由で読んだ場合と同じく空欄は欠損値として扱う
+        unit = UnitIndex(prepare_unit_df(empty_to_na(norm_df)))
+        outdir = data_dir / "mappings"
+        outdir.mkdir(parents=True, exist_ok=True)
+        summary = match_and_write(road_df, unit, outdir, thresholds, cat_filters, top_k=args.top_k, workers=args.workers)
+        st.rows_in = len(road_df)
+        st.rows_out = int(summary["candidates"].sum())
+
+    # 5) 最終集計
+    with StageReport("build") as st:
+        final_df = map_to_final_schema(norm_df, load_category_dict(args.dict))
+        out_dir = data_dir / "output"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_csv = out_dir / "final_mapping.csv"
+        final_df.to_csv(out_csv, index=False, encoding="utf-8")
+        st.rows_in, st.rows_out = len(norm_df), len(final_df)
+        print(f"Wrote: {out_csv} (rows={len(final_df)})")
+
+    print(f"Total: {time.perf_counter() - t_total:.3f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
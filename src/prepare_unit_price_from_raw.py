@@ -1,13 +1,26 @@
+import argparse
 import csv
 import os
 import re
-from typing import List
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+import metrics
+import shard_pool
+import text_normalize
+from row_store import RowStore, code_digest
+from shard_pool import map_shards
+from stage_cache import Stage, run_stage
+from text_normalize import clean_preserve_spaces
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.normpath(os.path.join(BASE_DIR, "..", "data"))
 
 RAW_IN = os.path.join(DATA_DIR, "unit_price_table_data_raw.csv")
 OUT_CSV = os.path.join(DATA_DIR, "unit_price_table_data_raw_cleaned.csv")
+# 行単位の正規化結果を左右するコード（RowStore の無効化に使用）
+ROW_CODE = [os.path.abspath(__file__), text_normalize.__file__]
 
 # ①〜⑳
 CIRCLED = r"[\u2460-\u2473]"
@@ -15,19 +28,98 @@ CIRCLED = r"[\u2460-\u2473]"
 DASH = r"[‐‑–—ー-]"
 
 
-def clean_preserve_spaces(text: str) -> str:
+class Rule(NamedTuple):
+    """置換規則（名前・コンパイル済みパターン・置換文字列）。"""
+
+    name: str
+    pattern: Pattern[str]
+    repl: str
+
+
+class RuleSet:
     """
-    文字列の軽量クリーニング（内部の空白は潰さない）
-    - 改行/復帰を空白に置換
-    - 前後の空白と外側のクォートを除去
+    置換規則を順に適用する。until_stable=True なら文字列が変化しなくなるまで繰り返す。
+    規則ごとの置換回数を hits に記録する（デバッグ用）。
     """
-    if text is None:
-        return ""
-    if not isinstance(text, str):
-        text = str(text)
-    text = text.replace("\r", " ").replace("\n", " ")
-    text = text.strip().strip('\'"')
-    return text
+
+    def __init__(self, rules: List[Rule], until_stable: bool = True, strip: bool = True):
+        self.rules = rules
+        self.until_stable = until_stable
+        self.strip = strip
+        self.hits: Counter = Counter()
+
+    def apply(self, text: str) -> str:
+        t, prev = text, None
+        while t != prev:
+            prev = t
+            for rule in self.rules:
+                t, n = rule.pattern.subn(rule.repl, t)
+                if n:
+                    self.hits[rule.name] += n
+            if self.strip:
+                t = t.strip()
+            if not self.until_stable:
+                break
+        return t
+
+
+def _rule(name: str, pattern: str, repl: str = " ") -> Rule:
+    return Rule(name, re.compile(pattern), repl)
+
+
+# 厳密な空白境界（直前が行頭/空白、直後が空白/行末の場合に一致）
+_BP = r"(?<!\S)"
+_BS = r"(?!\S)"
+
+# 先頭の見出し番号: 章 / (2) / ① / ①-2 / 3-6 / 2. / 2)（同一位置では左から順に優先）
+LEADING_NUMBERING = RuleSet([
+    _rule(
+        "先頭見出し番号",
+        rf"^\s*(?:\d+\s*章|[（(]\s*\d+\s*[)）]|{CIRCLED}(?:\s*{DASH}\s*\d+)?|\d+\s*{DASH}\s*\d+|\d+\s*[.)．)])\s*",
+    ),
+    # 余分な空白整形
+    _rule("空白整形", r"\s+"),
+])
+
+# 行中の見出し番号トークン
+HEADING_TOKENS = RuleSet([
+    _rule(
+        "見出しトークン",
+        rf"{_BP}(?:[（(]\s*\d+\s*[)）]|{CIRCLED}(?:\s*{DASH}\s*\d+)?|\d+\s*{DASH}\s*\d+|{DASH}\s*\d+|\d+\s*[.)．)]){_BS}",
+    ),
+    _rule("章トークン", rf"{_BP}\d+\s*章{_BS}"),
+    # 語に隣接した丸数字/丸数字+枝番（⑤-2, ⑤）、括弧付き番号（(2) / （2））も空白に置換
+    # 括弧付き番号は丸数字の除去後に現れる場合（'(①2)'）があるため別規則で後に適用
+    _rule("語に隣接した丸数字", rf"{CIRCLED}(?:\s*{DASH}\s*\d+)?"),
+    _rule("語に隣接した括弧番号", r"[（(]\s*\d+\s*[)）]"),
+])
+
+# 文中の「工-数字」を削除（例: 仮囲い設置・撤去工-2 → 仮囲い設置・撤去工）→ 空白整形
+CATEGORY_TAIL = RuleSet([
+    _rule("工-数字", rf"(?<=工)\s*{DASH}\s*\d+\b"),
+    _rule("空白整形", r"\s+"),
+], until_stable=False)
+
+# raw_table 特有: 「単価表(1)」→「単価表」、先頭の重複「単価表 」を削除 → 空白整形
+TABLE_HEAD = RuleSet([
+    _rule("単価表(番号)", r"(単価表)\s*[（(]\s*\d+\s*[)）]", r"\1"),
+    # 例: 「単価表 防水工100m²当り単価表」→「防水工100m²当り単価表」
+    _rule("先頭の重複単価表", r"^\s*単価表\s+(?=.*単価表)"),
+    _rule("空白整形", r"\s+"),
+], until_stable=False)
+
+RULE_SETS = {
+    "leading": LEADING_NUMBERING,
+    "heading": HEADING_TOKENS,
+    "category_tail": CATEGORY_TAIL,
+    "table_head": TABLE_HEAD,
+}
+
+_TRAILING_DASH_NUMBER = re.compile(rf"{DASH}\s*\d+$")
+_PAREN_TAIL = re.compile(r"\s*[（(].*$")
+
+# 見出し列のクリーニング結果をメモ化する件数の上限
+CACHE_SIZE = 1 << 16
 
 
 def strip_leading_numbering(s: str) -> str:
@@ -37,17 +129,7 @@ def strip_leading_numbering(s: str) -> str:
     """
     if s is None:
         return ""
-    t, prev = s, None
-    while t != prev:
-        prev = t
-        t = re.sub(r"^\s*\d+\s*章\s*", " ", t)
-        t = re.sub(r"^\s*[（(]\s*\d+\s*[)）]\s*", " ", t)
-        t = re.sub(rf"^\s*{CIRCLED}(?:\s*{DASH}\s*\d+)?\s*", " ", t)
-        t = re.sub(rf"^\s*\d+\s*{DASH}\s*\d+\s*", " ", t)
-        t = re.sub(r"^\s*\d+\s*[.)．)]\s*", " ", t)
-        # 余分な空白整形
-        t = re.sub(r"\s+", " ", t).strip()
-    return t
+    return LEADING_NUMBERING.apply(s)
 
 
 def strip_heading_tokens_anywhere(s: str) -> str:
@@ -59,87 +141,108 @@ def strip_heading_tokens_anywhere(s: str) -> str:
     """
     if s is None:
         return ""
-    t, prev = s, None
-    # 厳密な空白境界（直前が行頭/空白、直後が空白/行末の場合に一致）
-    bp = r"(?<!\S)"
-    bs = r"(?!\S)"
-    pattern = rf"{bp}(?:[（(]\s*\d+\s*[)）]|{CIRCLED}(?:\s*{DASH}\s*\d+)?|\d+\s*{DASH}\s*\d+|{DASH}\s*\d+|\d+\s*[.)．)]){bs}"
-    while t != prev:
-        prev = t
-        t = re.sub(pattern, " ", t)
-        t = re.sub(rf"{bp}\d+\s*章{bs}", " ", t)
-        # 語に隣接した丸数字/丸数字+枝番、括弧付き番号も空白に置換
-        t = re.sub(rf"{CIRCLED}\s*{DASH}\s*\d+", " ", t)  # ⑤-2 など（語に隣接）
-        t = re.sub(rf"{CIRCLED}", " ", t)                 # ⑤ 単体（語に隣接）
-        t = re.sub(r"[（(]\s*\d+\s*[)）]", " ", t)        # (2) / （2） （語に隣接）
-        t = t.strip()
-    return t
+    return HEADING_TOKENS.apply(s)
+
+
+def dedupe_trailing_dash_number_when_repeated(text: str) -> str:
+    """
+    「-数字」の削除ルール（語の重複を伴う場合のみ削除）
+    - 直前または直後のトークンが同一語（括弧内注記は無視）なら、後者の語末「-数字」を削除
+    - 例: '道路維持修繕 道路維持修繕-1 道路除雪工'
+          → '道路維持修繕 道路維持修繕 道路除雪工'
+    - 単独の '排水材設置工-2' は維持（重複がないため）
+    """
+    if not text:
+        return text
+    toks = text.split()
+    out: List[str] = []
+
+    def norm_base(s: str) -> str:
+        # 末尾の -数字 を除去し、後続の括弧以降を比較用に除去
+        return _PAREN_TAIL.sub("", _TRAILING_DASH_NUMBER.sub("", s))
+
+    for i, tok in enumerate(toks):
+        if _TRAILING_DASH_NUMBER.search(tok):
+            base = _TRAILING_DASH_NUMBER.sub("", tok)
+            prev_same = i > 0 and norm_base(base) == norm_base(toks[i - 1])
+            next_same = i + 1 < len(toks) and norm_base(base) == norm_base(toks[i + 1])
+            if prev_same or next_same:
+                tok = base
+        out.append(tok)
+    return " ".join(out)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_category_text(raw: str) -> str:
+    """0列目（raw_category）: 見出し番号の除去 → 重複語の「-数字」削除 → 「工-数字」削除"""
+    c0 = strip_heading_tokens_anywhere(strip_leading_numbering(clean_preserve_spaces(raw)))
+    c0 = dedupe_trailing_dash_number_when_repeated(c0)
+    return CATEGORY_TAIL.apply(c0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_table_text(raw: str) -> str:
+    """1列目（raw_table）: 見出し番号の除去 → 「単価表(1)」等の統一 → 重複語の「-数字」削除 → 「工-数字」削除"""
+    c1 = strip_heading_tokens_anywhere(strip_leading_numbering(clean_preserve_spaces(raw)))
+    c1 = TABLE_HEAD.apply(c1)
+    c1 = dedupe_trailing_dash_number_when_repeated(c1)
+    # raw_table 内の「工-数字」も念のため除去
+    return CATEGORY_TAIL.apply(c1)
+
+
+# メモ化キャッシュの名前 → 関数
+CACHED_FUNCS = {"category_cache": clean_category_text, "table_cache": clean_table_text}
+# normalize_rows で数えたキャッシュの hits/misses/currsize（並列時は全プロセスの合計）
+CACHE_STATS: Dict[str, Counter] = {name: Counter() for name in CACHED_FUNCS}
+
+
+def _cache_counts() -> Dict[str, Counter]:
+    counts = {}
+    for name, func in CACHED_FUNCS.items():
+        info = func.cache_info()
+        counts[name] = Counter(hits=info.hits, misses=info.misses, currsize=info.currsize)
+    return counts
+
+
+def rule_stats() -> Dict[str, object]:
+    """
+    規則ごとの置換回数とメモ化キャッシュの状況を返す（デバッグ用）。
+    キャッシュはプロセスごとのため、並列時は各プロセスの hits/misses/currsize を合計した値になる。
+    """
+    stats: Dict[str, object] = {
+        "hits": {f"{group}.{name}": n for group, rs in RULE_SETS.items() for name, n in sorted(rs.hits.items())},
+    }
+    for name, func in CACHED_FUNCS.items():
+        counts = CACHE_STATS[name]
+        stats[name] = {
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "maxsize": func.cache_info().maxsize,
+            "currsize": counts["currsize"],
+        }
+    return stats
 
 
 def normalize_row(parts: List[str]) -> List[str]:
     """
     1行を7列に正規化する（不足はパディング、超過は末尾に結合）
-    0列目（raw_category）/1列目（raw_table）には見出し番号の除去等を適用
-    """
-    def dedupe_trailing_dash_number_when_repeated(text: str) -> str:
-        """
-        「-数字」の削除ルール（語の重複を伴う場合のみ削除）
-        - 直前または直後のトークンが同一語（括弧内注記は無視）なら、後者の語末「-数字」を削除
-        - 例: '道路維持修繕 道路維持修繕-1 道路除雪工'
-              → '道路維持修繕 道路維持修繕 道路除雪工'
-        - 単独の '排水材設置工-2' は維持（重複がないため）
-        """
-        if not text:
-            return text
-        toks = text.split()
-        out: List[str] = []
-
-        def norm_base(s: str) -> str:
-            # 末尾の -数字 を除去し、後続の括弧以降を比較用に除去
-            s1 = re.sub(rf"{DASH}\s*\d+$", "", s)
-            s1 = re.sub(r"\s*[（(].*$", "", s1)
-            return s1
-
-        for i, tok in enumerate(toks):
-            base = re.sub(rf"{DASH}\s*\d+$", "", tok)
-            if re.search(rf"{DASH}\s*\d+$", tok):
-                prev_same = False
-                next_same = False
-                if i > 0:
-                    prev_same = norm_base(base) == norm_base(toks[i - 1])
-                if i + 1 < len(toks):
-                    next_same = norm_base(base) == norm_base(toks[i + 1])
-                if prev_same or next_same:
-                    tok = base
-            out.append(tok)
-        return " ".join(out)
-
+    0列目（raw_category）/1列目（raw_table）には見出し番号の除去等を適用（異なり文字列ごとにメモ化）
+    """
     if not parts or not any((p or "").strip() for p in parts):
+        metrics.count("normalize_row.blank")
         return []
     # Fix to 7 fields: pad or join tail into last field
     if len(parts) < 7:
+        metrics.count("normalize_row.padded")
         parts = parts + [""] * (7 - len(parts))
     elif len(parts) > 7:
+        metrics.count("normalize_row.tail_joined")
         head, tail = parts[:6], parts[6:]
         parts = head + [",".join(tail)]
 
     # Column 0/1: heading/number tokens removal (leading + anywhere)
-    c0 = strip_heading_tokens_anywhere(strip_leading_numbering(clean_preserve_spaces(parts[0])))
-    c0 = dedupe_trailing_dash_number_when_repeated(c0)
-    # 文中の「工-数字」を削除（例: 仮囲い設置・撤去工-2 → 仮囲い設置・撤去工）
-    c0 = re.sub(rf"(?<=工)\s*{DASH}\s*\d+\b", " ", c0)
-    c0 = re.sub(r"\s+", " ", c0).strip()
-    c1 = strip_heading_tokens_anywhere(strip_leading_numbering(clean_preserve_spaces(parts[1])))
-    # raw_table 特有: 「単価表(1)」などの括弧付き番号を除去し「単価表」に統一
-    c1 = re.sub(r"(単価表)\s*[（(]\s*\d+\s*[)）]", r"\1", c1)
-    # raw_table 特有: 先頭に「単価表 」があり、その後方にも「単価表」がある場合は先頭側を削除
-    # 例: 「単価表 防水工100m²当り単価表」→「防水工100m²当り単価表」
-    c1 = re.sub(r"^\s*単価表\s+(?=.*単価表)", " ", c1)
-    c1 = re.sub(r"\s+", " ", c1).strip()
-    c1 = dedupe_trailing_dash_number_when_repeated(c1)
-    # raw_table 内の「工-数字」も念のため除去
-    c1 = re.sub(rf"(?<=工)\s*{DASH}\s*\d+\b", " ", c1)
-    c1 = re.sub(r"\s+", " ", c1).strip()
+    c0 = clean_category_text(parts[0] or "")
+    c1 = clean_table_text(parts[1] or "")
 
     # 他列は軽量クリーニングのみ（内部空白は保持）
     c2 = clean_preserve_spaces(parts[2])
@@ -150,21 +253,102 @@ def normalize_row(parts: List[str]) -> List[str]:
     return [c0, c1, c2, c3, c4, c5, c6]
 
 
-def main() -> None:
-    rows: List[List[str]] = []
-    with open(RAW_IN, "r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.reader(f, delimiter=",", quotechar='"')
-        for parts in reader:
-            row = normalize_row(parts)
-            if row:
-                rows.append(row)
-    os.makedirs(DATA_DIR, exist_ok=True)
-    with open(OUT_CSV, "w", encoding="utf-8", newline="") as f:
+def _normalize_shard(
+    rows: Sequence[List[str]],
+) -> Tuple[List[List[str]], Dict[str, Counter], Dict[str, Counter]]:
+    # 子プロセスで実行される区間の正規化（規則ごとの置換回数とキャッシュの状況はこの区間で増えた分を返す）
+    before = {group: Counter(rs.hits) for group, rs in RULE_SETS.items()}
+    cache_before = _cache_counts()
+    out = [normalize_row(parts) for parts in rows]
+    cache_after = _cache_counts()
+    cache = {name: cache_after[name] - cache_before[name] for name in CACHED_FUNCS}
+    return out, {group: rs.hits - before[group] for group, rs in RULE_SETS.items()}, cache
+
+
+def normalize_rows(rows: Sequence[List[str]], workers: int = 1) -> List[List[str]]:
+    """
+    全行に normalize_row を適用する（空行は [] のまま）。
+    workers > 1 なら行を連続した区間に分けてプロセスプールで並列に正規化し、入力順に連結する。
+    """
+    base = {group: Counter(rs.hits) for group, rs in RULE_SETS.items()}
+    parts = map_shards(_normalize_shard, rows, workers)
+    # 子プロセスで数えた置換回数を親の hits へ反映する（同一プロセスで実行した場合も同じ結果になる）。
+    # 見出し列のメモ化はプロセスごとのため、並列時は同じ文字列を複数のプロセスで数える分だけ回数が増える
+    for group, rs in RULE_SETS.items():
+        rs.hits = base[group] + sum((hits[group] for _, hits, _ in parts), Counter())
+    for _, _, cache in parts:
+        for name, counts in cache.items():
+            CACHE_STATS[name].update(counts)
+    return [row for out, _, _ in parts for row in out]
+
+
+def clean_rows(rows: Iterable[List[str]], store: Optional[RowStore] = None, workers: int = 1) -> List[List[str]]:
+    """
+    生の行を1行ずつ正規化し、空行を除いたリストを返す。
+    store を指定すると、保存済みの行は再利用し新規・変更行のみ正規化する。
+    workers > 1 なら正規化をプロセスプールで並列に行う（結果の並びは1プロセスの場合と同じ）。
+    """
+    rows = list(rows)
+    if store is not None:
+        results = store.map_rows(rows, lambda pending: normalize_rows(pending, workers))
+        return [row for row in results if row]
+    return [row for row in normalize_rows(rows, workers) if row]
+
+
+def write_rows(rows: List[List[str]], out_csv: str) -> None:
+    """正規化済みの行をCSVへ書き出す。"""
+    os.makedirs(os.path.dirname(out_csv) or ".", exist_ok=True)
+    with open(out_csv, "w", encoding="utf-8", newline="") as f:
         w = csv.writer(f, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
         w.writerows(rows)
-    print(f"Wrote: {OUT_CSV} (rows={len(rows)})")
 
 
+def clean_raw_file(raw_in: str, out_csv: str, store: Optional[RowStore] = None, workers: int = 1) -> int:
+    """生CSVを1行ずつ正規化して書き出し、出力行数を返す。"""
+    with open(raw_in, "r", encoding="utf-8-sig", newline="") as f, metrics.timer("prepare.clean_rows"):
+        rows = clean_rows(csv.reader(f, delimiter=",", quotechar='"'), store, workers)
+    metrics.count("prepare.rows_out", len(rows))
+    with metrics.timer("prepare.write"):
+        write_rows(rows, out_csv)
+    return len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="単価表の生CSVを7列に揃え、見出し番号等を除去します。")
+    parser.add_argument("--rule-stats", action="store_true", help="規則ごとの置換回数とキャッシュ状況を表示")
+    parser.add_argument("--cache-dir", default=None, help="行単位の正規化結果の保存先（SQLite）。指定時は新規・変更行のみ正規化")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="正規化に使うプロセス数（-1 で CPU 数）。行を区間に分けて並列に処理し、出力は1プロセスの場合と同じ",
+    )
+    parser.add_argument("--force", action="store_true", help="入力・コードに変更が無くても再実行する")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    def run() -> None:
+        store = RowStore(args.cache_dir, "prepare", code_digest(ROW_CODE)) if args.cache_dir else None
+        n_rows = clean_raw_file(RAW_IN, OUT_CSV, store, args.workers)
+        print(f"Wrote: {OUT_CSV} (rows={n_rows})")
+        if store is not None:
+            print(f"Row cache: reused={store.hits} normalized={store.misses} pruned={store.pruned} ({store.path})")
+            metrics.count("prepare.row_cache.reused", store.hits)
+            metrics.count("prepare.row_cache.normalized", store.misses)
+            store.close()
+        for name, n in rule_stats()["hits"].items():
+            metrics.count(f"prepare.rule.{name}", n)
+        if args.rule_stats:
+            stats = rule_stats()
+            for name, n in stats["hits"].items():
+                print(f"  {name}: {n}")
+            print(f"  category_cache: {stats['category_cache']}")
+            print(f"  table_cache: {stats['table_cache']}")
+
+    stage = Stage("prepare", [RAW_IN], [OUT_CSV], ROW_CODE + [shard_pool.__file__])
+    with metrics.session(args.metrics_out, args.profile_out):
+        run_stage(stage, run, force=args.force)
+
 if __name__ == "__main__":
     main()
 
@@ -1,54 +1,42 @@
+import argparse
+import csv
 import os
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
-
-def _to_halfwidth(text: str) -> str:
-    try:
-        import unicodedata
-    except Exception:
-        return text
-    result_chars: List[str] = []
-    for ch in text:
-        try:
-            name = unicodedata.name(ch)
-            if "FULLWIDTH" in name:
-                ascii_char = unicodedata.normalize("NFKC", ch)
-                result_chars.append(ascii_char)
-            else:
-                result_chars.append(ch)
-        except Exception:
-            result_chars.append(ch)
-    return "".join(result_chars)
-
-
-def clean_cell(text: Optional[str]) -> str:
-    if text is None:
-        return ""
-    if not isinstance(text, str):
-        text = str(text)
-    # 改行と空白を正規化
-    text = text.replace("\r", " ").replace("\n", " ").strip()
-    # 連続する空白を1つに圧縮
-    text = re.sub(r"\s+", " ", text)
-    # 外側のクォートを除去
-    text = text.strip('\'"')
-    # 全角形を半角相当へ正規化
-    text = _to_halfwidth(text)
-    return text
-
-
-def normalize_unit(unit: str) -> str:
-    unit = clean_cell(unit)
-    # m単位（m, m2, m³ 等）の直前にある先頭の「空」を除去
-    unit = re.sub(r"^\s*空\s*(?=(m²|m2|m³|m3)\b)", "", unit)
-    # よく使う工学単位表記を統一
-    unit = unit.replace("m2", "m²").replace("m^2", "m²")
-    unit = unit.replace("m3", "m³").replace("m^3", "m³")
-    unit = unit.replace("㎡", "m²").replace("㎥", "m³")
-    return unit
+import metrics
+import shard_pool
+import table_io
+import text_normalize
+import unit_tables
+from row_store import RowStore, code_digest
+from shard_pool import map_shards
+from stage_cache import Stage, run_stage
+from table_io import UNIT_FORMAT_EXTENSIONS, read_table, with_format, write_table
+from text_normalize import clean_cell, clean_preserve_spaces, normalize_series, normalize_unit
+
+# 行単位の正規化結果を左右するコード（RowStore の無効化に使用）
+ROW_CODE = [os.path.abspath(__file__), text_normalize.__file__]
+
+# unit_price_normalized の列順
+NORMALIZED_COLUMNS = [
+    "大分類名",
+    "工種名",
+    "細別名",
+    "基本歩掛名",
+    "所要日数作業単位_数量",
+    "所要日数作業単位_単位",
+    "歩掛作業単位_数量",
+    "歩掛作業単位_単位",
+    "名称",
+    "規格",
+    "単位",
+    "数量",
+    "摘要",
+]
 
 
 def split_category(cat_text: str) -> Tuple[str, str]:
@@ -118,6 +106,7 @@ def extract_table_meta(table_text: str) -> Tuple[str, str, str]:
         name = base
     unit_qty = ""
     unit_unit = ""
+    pattern = "none"
     # パターンA: 複合（例: '1基1回当り', '1台1回当り'）
     m_combo = re.search(r"([0-9０-９,〇○]+)\s*(台|基|本|枚|個|ケーブル|ブロック)\s*([0-9０-９,〇○]+)\s*(回)\s*(当り|当たり)", base)
     if m_combo:
@@ -125,6 +114,7 @@ def extract_table_meta(table_text: str) -> Tuple[str, str, str]:
         unitA = m_combo.group(2)
         num2 = clean_cell(m_combo.group(3)).replace(",", "")
         unit_unit = f"{unitA}{num2}回"
+        pattern = "A"
         # 一致部分を名称から切り出す
         span = m_combo.span()
         name = (base[:span[0]] + base[span[1]:]).strip()
@@ -141,6 +131,7 @@ def extract_table_meta(table_text: str) -> Tuple[str, str, str]:
             unit_core_val = m_simple.group(2)
             unit_annotation = m_simple.group(3) or ""
             unit_unit = normalize_unit(unit_core_val)
+            pattern = "B"
             # 一致部分を名称から切り出す
             span = m_simple.span()
             name = (base[:span[0]] + base[span[1]:]).strip()
@@ -153,6 +144,7 @@ def extract_table_meta(table_text: str) -> Tuple[str, str, str]:
             if m_fallback:
                 unit_qty = "1"
                 unit_unit = f"{m_fallback.group(1)}1回"
+                pattern = "C"
                 span = m_fallback.span()
                 name = (base[:span[0]] + base[span[1]:]).strip()
             else:
@@ -161,9 +153,11 @@ def extract_table_meta(table_text: str) -> Tuple[str, str, str]:
                 if m_only_times:
                     unit_qty = m_only_times.group(1)
                     unit_unit = "回"
+                    pattern = "D"
                     span = m_only_times.span()
                     name = (base[:span[0]] + base[span[1]:]).strip()
 
+    metrics.count(f"extract_table_meta.pattern_{pattern}")
     name = name.strip()
     if angle_note:
         name = f"{name}（{angle_note}）".strip()
@@ -172,50 +166,73 @@ def extract_table_meta(table_text: str) -> Tuple[str, str, str]:
     return name, unit_qty, unit_unit
 
 
-def read_unit_price_csv(csv_path: str) -> pd.DataFrame:
+def read_unit_price_rows(csv_path: str) -> List[List[str]]:
     """
-    ヘッダ無しの unit_price_table_data.csv を読み込む。
+    ヘッダ無しの unit_price_table_data.csv を行（文字列のリスト）として読み込む。
     想定カラム:
       0: 大分類/工種を含むテキスト
       1: 細別＋単価表テキスト
       2..: '名称','規格','単位','数量','摘要' 相当のデータ
     """
     # 引用符内のカンマを含む行が多いため、csv.reader で厳密に解析する
-    # それでも7列を超える場合は末尾フィールドへ結合して格納する
-    import csv
-
-    rows: List[List[str]] = []
     with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.reader(f, delimiter=",", quotechar='"')
-        for parts in reader:
-            if not parts or not any((p or "").strip() for p in parts):
-                continue
-            if len(parts) < 7:
-                parts = parts + [""] * (7 - len(parts))
-            elif len(parts) > 7:
-                head = parts[:6]
-                tail = ",".join(parts[6:])
-                parts = head + [tail]
-            rows.append(parts[:7])
+        return list(csv.reader(f, delimiter=",", quotechar='"'))
+
+
+def read_unit_price_csv(csv_path: str) -> pd.DataFrame:
+    """ヘッダ無しの unit_price_table_data.csv を読み込み、セルをクリーニングした DataFrame を返す。"""
+    return unit_price_frame(read_unit_price_rows(csv_path))
+
+
+def is_blank_row(parts: List[str]) -> bool:
+    return not parts or not any((p or "").strip() for p in parts)
 
-    df = pd.DataFrame(rows, columns=["raw_category", "raw_table", "c3", "c4", "c5", "c6", "c7"]).fillna("")
+
+def unit_price_frame(rows: Iterable[List[str]]) -> pd.DataFrame:
+    """
+    unit_price_table_data.csv 相当の行（文字列のリスト）から DataFrame を作り、セルをクリーニングする。
+    空行は除外し、7列を超える場合は末尾フィールドへ結合して格納する。
+    """
+    fixed: List[List[str]] = []
+    n_blank = 0
+    for parts in rows:
+        if is_blank_row(parts):
+            n_blank += 1
+            continue
+        if len(parts) < 7:
+            parts = parts + [""] * (7 - len(parts))
+        elif len(parts) > 7:
+            head = parts[:6]
+            tail = ",".join(parts[6:])
+            parts = head + [tail]
+        fixed.append(parts[:7])
+    metrics.count("unit_price_frame.rows", len(fixed))
+    metrics.count("unit_price_frame.blank_excluded", n_blank)
+
+    df = pd.DataFrame(fixed, columns=["raw_category", "raw_table", "c3", "c4", "c5", "c6", "c7"]).fillna("")
 
     # raw_category の連続空白は保持（\s{2,} 分割のため）
-    def clean_preserve_spaces(text: Optional[str]) -> str:
-        if text is None:
-            return ""
-        if not isinstance(text, str):
-            text = str(text)
-        text = text.replace("\r", " ").replace("\n", " ").strip()
-        text = text.strip('\'"')
-        return _to_halfwidth(text)
-
-    df["raw_category"] = df["raw_category"].apply(clean_preserve_spaces)
+    df["raw_category"] = normalize_series(df["raw_category"], lambda t: clean_preserve_spaces(t, halfwidth=True))
     for col in ["raw_table", "c3", "c4", "c5", "c6", "c7"]:
-        df[col] = df[col].apply(clean_cell)
+        df[col] = normalize_series(df[col], clean_cell)
     return df
 
 
+def map_distinct(values: pd.Series, func: Callable[[str], Tuple[str, ...]], width: int) -> List[np.ndarray]:
+    """
+    列の異なり値ごとに func を1回だけ評価し、戻り値（width 要素のタプル）の各要素を
+    factorize のコードで行へ展開した配列のリストを返す。
+    """
+    codes, uniques = pd.factorize(values)
+    results = [func(u) for u in uniques]
+    columns: List[np.ndarray] = []
+    for k in range(width):
+        col = np.empty(len(results), dtype=object)
+        col[:] = [r[k] for r in results]
+        columns.append(col[codes])
+    return columns
+
+
 def normalize_unit_price_rows(df: pd.DataFrame) -> pd.DataFrame:
     """
     ヘッダ行・計行・機械運転の表を除外し，正規化したカラムへマッピングする。
@@ -237,15 +254,24 @@ def normalize_unit_price_rows(df: pd.DataFrame) -> pd.DataFrame:
 
     data_mask = (~is_header) & (~is_total) & (~is_machine_block) & (df["c3"] != "")
     d = df.loc[data_mask].copy()
-
-    # 大分類名/工種名を抽出
-    d[["大分類名", "工種名"]] = d["raw_category"].apply(lambda s: pd.Series(split_category(s)))
-    # テーブル側メタ（細別名/作業単位）を抽出
-    tbl_meta = d["raw_table"].apply(lambda s: pd.Series(extract_table_meta(s)))
-    tbl_meta.columns = ["細別名", "_作業単位_数量", "_作業単位_単位"]
-    d = pd.concat([d, tbl_meta], axis=1)
-
-    d["_作業単位_単位"] = d["_作業単位_単位"].apply(normalize_unit)
+    if metrics.is_enabled():
+        # 除外理由ごとの行数（重複する場合は header → total → 機械運転 → 名称空欄 の順に数える）
+        n_header = int(is_header.sum())
+        n_total = int((is_total & ~is_header).sum())
+        n_machine = int((is_machine_block & ~is_header & ~is_total).sum())
+        metrics.count("normalize_unit_price_rows.rows_in", len(df))
+        metrics.count("normalize_unit_price_rows.excluded_header", n_header)
+        metrics.count("normalize_unit_price_rows.excluded_total", n_total)
+        metrics.count("normalize_unit_price_rows.excluded_機械運転", n_machine)
+        metrics.count("normalize_unit_price_rows.excluded_empty_name", len(df) - len(d) - n_header - n_total - n_machine)
+        metrics.count("normalize_unit_price_rows.rows_out", len(d))
+
+    # 大分類名/工種名を抽出（異なり値ごとに1回だけ分割）
+    d["大分類名"], d["工種名"] = map_distinct(d["raw_category"], split_category, 2)
+    # テーブル側メタ（細別名/作業単位）を抽出（異なり値ごとに1回だけ抽出）
+    d["細別名"], d["_作業単位_数量"], d["_作業単位_単位"] = map_distinct(d["raw_table"], extract_table_meta, 3)
+
+    d["_作業単位_単位"] = normalize_series(d["_作業単位_単位"], normalize_unit)
 
     # 主要カラム名へリネーム
     d = d.rename(columns={"c3": "名称", "c4": "規格", "c5": "単位", "c6": "数量", "c7": "摘要"})
@@ -260,22 +286,7 @@ def normalize_unit_price_rows(df: pd.DataFrame) -> pd.DataFrame:
     d["基本歩掛名"] = ""
 
     # カラム順の整列
-    cols = [
-        "大分類名",
-        "工種名",
-        "細別名",
-        "基本歩掛名",
-        "所要日数作業単位_数量",
-        "所要日数作業単位_単位",
-        "歩掛作業単位_数量",
-        "歩掛作業単位_単位",
-        "名称",
-        "規格",
-        "単位",
-        "数量",
-        "摘要",
-    ]
-    d = d[cols]
+    d = d[NORMALIZED_COLUMNS]
 
     # 文字列中の「単価表」を除去（前後数値の連結は避け、空白整形）
     text_cols = ["大分類名", "工種名", "細別名", "名称", "規格", "摘要"]
@@ -291,9 +302,54 @@ def normalize_unit_price_rows(df: pd.DataFrame) -> pd.DataFrame:
     return d
 
 
-def load_and_normalize_unit_price(csv_path: str) -> pd.DataFrame:
-    df_raw = read_unit_price_csv(csv_path)
-    return normalize_unit_price_rows(df_raw)
+def _normalize_pending(pending: Sequence[List[str]]) -> List[Optional[List[str]]]:
+    # 行ごとの正規化結果（除外された行は None）。子プロセスからも呼ぶためモジュールの関数にしておく
+    d = normalize_unit_price_rows(unit_price_frame(pending))
+    out: List[Optional[List[str]]] = [None] * len(pending)
+    # d の index は pending 内の位置（除外された行は含まれない）
+    for i, values in zip(d.index, d.itertuples(index=False, name=None)):
+        out[i] = list(values)
+    return out
+
+
+def normalize_rows_parallel(rows: Sequence[List[str]], workers: int = 1) -> List[Optional[List[str]]]:
+    """
+    _normalize_pending を行の連続した区間ごとにプロセスプールで並列に実行し、入力順に連結する。
+    大分類名/細別名等の抽出は行ごとに閉じているため、区間に分けても1プロセスの場合と同じ結果になる。
+    """
+    return [row for part in map_shards(_normalize_pending, rows, workers) for row in part]
+
+
+def normalize_unit_price_rows_parallel(rows: Iterable[List[str]], workers: int) -> pd.DataFrame:
+    """normalize_unit_price_rows(unit_price_frame(rows)) と同じ内容の DataFrame を、workers プロセスで並列に求める。"""
+    rows = [parts for parts in rows if not is_blank_row(parts)]
+    results = normalize_rows_parallel(rows, workers)
+    return pd.DataFrame([r for r in results if r is not None], columns=NORMALIZED_COLUMNS, dtype=object)
+
+
+def normalize_rows_incremental(rows: Iterable[List[str]], store: RowStore, workers: int = 1) -> pd.DataFrame:
+    """
+    normalize_unit_price_rows(unit_price_frame(rows)) と同じ結果を、行単位の保存結果を再利用して求める。
+    保存されていない行（新規・変更）だけをクリーニング・正規化する（除外行も除外として保存）。
+    """
+    rows = [parts for parts in rows if not is_blank_row(parts)]
+    results = store.map_rows(rows, lambda pending: normalize_rows_parallel(pending, workers))
+    return pd.DataFrame([r for r in results if r is not None], columns=NORMALIZED_COLUMNS, dtype=object)
+
+
+def load_and_normalize_unit_price(csv_path: str, store: Optional[RowStore] = None, workers: int = 1) -> pd.DataFrame:
+    if store is not None:
+        with metrics.timer("preprocess.normalize_incremental"):
+            return normalize_rows_incremental(read_unit_price_rows(csv_path), store, workers)
+    if workers != 1:
+        with metrics.timer("preprocess.read_unit_price_rows"):
+            rows = read_unit_price_rows(csv_path)
+        with metrics.timer("preprocess.normalize_parallel"):
+            return normalize_unit_price_rows_parallel(rows, workers)
+    with metrics.timer("preprocess.read_unit_price_csv"):
+        df_raw = read_unit_price_csv(csv_path)
+    with metrics.timer("preprocess.normalize_unit_price_rows"):
+        return normalize_unit_price_rows(df_raw)
 
 
 def normalize_table_data_for_aux(csv_path: str) -> pd.DataFrame:
@@ -311,18 +367,65 @@ def normalize_table_data_for_aux(csv_path: str) -> pd.DataFrame:
     return pd.DataFrame({"raw": lines})
 
 
-if __name__ == "__main__":
+def load_normalized_unit_price(path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    unit_price_normalized（手直し済みを含む。CSV / Parquet / Feather / 文字列プール形式 .npz）を読み込む。
+    空欄や数値も書き出し時の文字列のまま保持する（dtype=str, 欠損値変換なし）。
+    columns を指定するとその列のみ読み込む。
+    """
+    return read_table(path, columns, dtype=str, keep_default_na=False)
+
+
+def main() -> None:
     base_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.normpath(os.path.join(base_dir, "..", "data"))
     up_csv = os.path.join(data_dir, "unit_price_table_data.csv")
     td_csv = os.path.join(data_dir, "table_data.csv")
-
-    norm_df = load_and_normalize_unit_price(up_csv)
     out_dir = os.path.join(data_dir, "normalized")
-    os.makedirs(out_dir, exist_ok=True)
-    norm_df.to_csv(os.path.join(out_dir, "unit_price_normalized.csv"), index=False, encoding="utf-8")
-
-    td_df = normalize_table_data_for_aux(td_csv)
-    td_df.to_csv(os.path.join(out_dir, "table_data_aux.csv"), index=False, encoding="utf-8")
+    norm_path = os.path.join(out_dir, "unit_price_normalized.csv")
+    aux_csv = os.path.join(out_dir, "table_data_aux.csv")
+
+    parser = argparse.ArgumentParser(description="単価表CSVを照合用に正規化します。")
+    parser.add_argument(
+        "--format",
+        choices=list(UNIT_FORMAT_EXTENSIONS),
+        default="csv",
+        help="正規化結果の保存形式（parquet/feather は pyarrow が必要。繰り返しの多い列は辞書エンコード。"
+        "tables は文字列プール + 番号配列 + 表単位の索引の .npz で、同じ文字列を1つだけ保持し読み込みが速い）",
+    )
+    parser.add_argument("--cache-dir", default=None, help="行単位の正規化結果の保存先（SQLite）。指定時は新規・変更行のみ正規化")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="正規化に使うプロセス数（-1 で CPU 数）。行を区間に分けて並列に処理し、出力は1プロセスの場合と同じ",
+    )
+    parser.add_argument("--force", action="store_true", help="入力・コードに変更が無くても再実行する")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    norm_path = with_format(norm_path, args.format)
+
+    def run() -> None:
+        store = RowStore(args.cache_dir, "preprocess", code_digest(ROW_CODE)) if args.cache_dir else None
+        norm_df = load_and_normalize_unit_price(up_csv, store, args.workers)
+        if store is not None:
+            print(f"Row cache: reused={store.hits} normalized={store.misses} pruned={store.pruned} ({store.path})")
+            metrics.count("preprocess.row_cache.reused", store.hits)
+            metrics.count("preprocess.row_cache.normalized", store.misses)
+            store.close()
+        os.makedirs(out_dir, exist_ok=True)
+        with metrics.timer("preprocess.write"):
+            write_table(norm_df, norm_path)
+
+        td_df = normalize_table_data_for_aux(td_csv)
+        td_df.to_csv(aux_csv, index=False, encoding="utf-8")
+        print(f"Wrote: {norm_path} (rows={len(norm_df)})")
+        print(f"Wrote: {aux_csv} (rows={len(td_df)})")
+
+    stage = Stage("preprocess", [up_csv, td_csv], [norm_path, aux_csv], ROW_CODE + [table_io.__file__, unit_tables.__file__, shard_pool.__file__])
+    with metrics.session(args.metrics_out, args.profile_out):
+        run_stage(stage, run, force=args.force)
 
 
+if __name__ == "__main__":
+    main()
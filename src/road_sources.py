@@ -0,0 +1,126 @@
+import glob
+import os
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# ディレクトリ指定時に読み込む拡張子
+ROAD_SUFFIXES = (".xlsx", ".xlsm", ".csv")
+XLSX_SUFFIXES = (".xlsx", ".xlsm")
+# 照合対象のシートと判定する見出し
+ITEM_COLUMN = "アイテム名"
+# ファイル名に使えない文字
+_UNSAFE = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+class RoadSheet(NamedTuple):
+    """道路工事アイテム表の1シート（CSV は1ファイル1シート）。"""
+
+    label: str
+    path: str
+    sheet: Optional[str]
+    frame: pd.DataFrame
+
+
+def safe_label(text: str) -> str:
+    """ファイル名・ディレクトリ名に使えるラベルへ変換する。"""
+    return _UNSAFE.sub("_", text).strip("_") or "sheet"
+
+
+def sheet_label(path: str, sheet: Optional[str] = None) -> str:
+    """出力ファイル名に使うシートのラベル（<ファイル名>_<シート名>、CSV はファイル名のみ）。"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return safe_label(f"{stem}_{sheet}" if sheet is not None else stem)
+
+
+def expand_road_inputs(paths: Iterable[str]) -> List[str]:
+    """ファイル/ディレクトリを展開し、重複の無い入力ファイルのリストを返す（ディレクトリ内は名前順）。"""
+    files: List[str] = []
+    for path in paths:
+        path = str(path)
+        if os.path.isdir(path):
+            matched = sorted(
+                p for p in glob.glob(os.path.join(path, "*"))
+                if p.lower().endswith(ROAD_SUFFIXES) and not os.path.basename(p).startswith("~$")
+            )
+        else:
+            matched = [path]
+        for p in matched:
+            if p not in files:
+                files.append(p)
+    return files
+
+
+def _open_workbook(path: str):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ImportError(".xlsx の読み込みには openpyxl が必要です（python -m pip install openpyxl）") from e
+    return load_workbook(path, read_only=True, data_only=True)
+
+
+def _road_worksheets(wb, sheets: Optional[Sequence[str]]) -> Iterator[Tuple[object, tuple]]:
+    """
+    照合対象のワークシートと見出し行を返す。
+    sheets 指定時はその名前のシートのみ、見出し行に「アイテム名」が無いシート（空の Sheet2 等）は除く。
+    """
+    for ws in wb.worksheets:
+        if sheets and ws.title not in sheets:
+            continue
+        header = next(ws.iter_rows(max_row=1, values_only=True), None)
+        if header and ITEM_COLUMN in [str(h).strip() for h in header if h is not None]:
+            yield ws, header
+
+
+def road_sheet_labels(paths: Iterable[str], sheets: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    照合対象シートのラベルを iter_road_sheets と同じ順に返す。
+    .xlsx は見出し行のみを読むため、出力パスの決定（ステージキャッシュの判定）に使える。
+    """
+    labels: List[str] = []
+    for path in expand_road_inputs(paths):
+        if path.lower().endswith(XLSX_SUFFIXES):
+            wb = _open_workbook(path)
+            try:
+                labels.extend(sheet_label(path, ws.title) for ws, _ in _road_worksheets(wb, sheets))
+            finally:
+                wb.close()
+        else:
+            labels.append(sheet_label(path))
+    return labels
+
+
+def read_xlsx_sheets(path: str, sheets: Optional[Sequence[str]] = None) -> Iterator[RoadSheet]:
+    """
+    .xlsx を読み取り専用（行ストリーミング）で開き、シートごとに DataFrame を作る。
+    1行目を見出しとし、全セルが空の行と見出しの無い空列は除き、空欄は欠損値とする
+    （CSV を pd.read_csv で読んだ場合と揃える）。
+    """
+    wb = _open_workbook(path)
+    try:
+        for ws, header in _road_worksheets(wb, sheets):
+            # 見出しの無い列は pd.read_csv と同じく Unnamed: i とする
+            columns = [str(h).strip() if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+            width = len(columns)
+            rows = ws.iter_rows(min_row=2, values_only=True)
+            records = [
+                (list(r) + [None] * width)[:width]
+                for r in rows
+                if any(v is not None and v != "" for v in r)
+            ]
+            frame = pd.DataFrame(records, columns=columns, dtype=object)
+            frame = frame.loc[:, [not (c.startswith("Unnamed: ") and frame[c].isna().all()) for c in frame.columns]]
+            frame = frame.mask(frame.isna() | frame.eq(""), float("nan")).infer_objects()
+            yield RoadSheet(sheet_label(path, ws.title), path, ws.title, frame)
+    finally:
+        wb.close()
+
+
+def iter_road_sheets(paths: Iterable[str], sheets: Optional[Sequence[str]] = None) -> Iterator[RoadSheet]:
+    """CSV / .xlsx / ディレクトリの混在した入力から、照合対象のシートを1枚ずつ読み込む。"""
+    for path in expand_road_inputs(paths):
+        if path.lower().endswith(XLSX_SUFFIXES):
+            yield from read_xlsx_sheets(path, sheets)
+        else:
+            yield RoadSheet(sheet_label(path), path, None, pd.read_csv(path, encoding="utf-8"))
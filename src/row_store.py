@@ -0,0 +1,90 @@
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from stage_cache import file_digest
+
+
+def row_fingerprint(fields: Sequence[str]) -> str:
+    """行（文字列のリスト）の内容ハッシュ。"""
+    # 区切りは CSV のセルに現れない制御文字（US）
+    return hashlib.blake2b("\x1f".join(fields).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def code_digest(paths: Sequence[str]) -> str:
+    """変換コード（ファイル群）の内容ハッシュ。"""
+    return hashlib.sha256("\n".join(file_digest(p) for p in paths).encode("ascii")).hexdigest()
+
+
+class RowStore:
+    """
+    行単位の変換結果のディスクキャッシュ（SQLite）。
+
+    キーは入力行の内容ハッシュ、値は変換結果の行（除外された行は None）。
+    変換コードのハッシュ（code_digest）が前回と異なる場合は全件を破棄する。
+    map_rows の入力に現れなかった行は古い結果として削除する。
+    """
+
+    def __init__(self, cache_dir: Path, name: str, code_digest: str):
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.path = cache_dir / f"{name}_rows.sqlite3"
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS rows (fp TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'code'").fetchone()
+        if row is None or row[0] != code_digest:
+            self.conn.execute("DELETE FROM rows")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('code', ?)", (code_digest,))
+        self.conn.commit()
+
+    def map_rows(
+        self,
+        rows: Sequence[List[str]],
+        compute: Callable[[List[List[str]]], List[Optional[List[str]]]],
+    ) -> List[Optional[List[str]]]:
+        """
+        行ごとの変換結果を入力順に返す。
+        保存されていない行（新規・変更）だけを compute(未変換の行) でまとめて変換して保存する。
+        compute は入力と同じ長さのリスト（除外する行は None）を返すこと。
+        """
+        fps = [row_fingerprint(r) for r in rows]
+        live = set(fps)
+        # 保存済みの行を一括で読み、今回の入力に無い行は古い結果として削除対象にする
+        known = {}
+        stale: List[str] = []
+        for fp, value in self.conn.execute("SELECT fp, value FROM rows"):
+            if fp in live:
+                known[fp] = json.loads(value)
+            else:
+                stale.append(fp)
+
+        # 未変換の行（同じ内容の行は1回だけ）
+        pending = {}
+        for fp, r in zip(fps, rows):
+            if fp not in known and fp not in pending:
+                pending[fp] = r
+        self.misses = len(pending)
+        self.hits = len(live) - len(pending)
+        self.pruned = len(stale)
+        if pending:
+            fresh = compute(list(pending.values()))
+            known.update(zip(pending, fresh))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rows (fp, value) VALUES (?, ?)",
+                ((fp, json.dumps(known[fp], ensure_ascii=False)) for fp in pending),
+            )
+        self.conn.executemany("DELETE FROM rows WHERE fp = ?", ((fp,) for fp in stale))
+        self.conn.commit()
+        return [known[fp] for fp in fps]
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
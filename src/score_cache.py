@@ -0,0 +1,120 @@
+import sqlite3
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+
+# 既定の最大保持件数（超過分は最終使用が古いものから削除）
+DEFAULT_MAX_ENTRIES = 5_000_000
+# SQLite の1文あたりのパラメータ数上限に収まるよう分割
+_CHUNK = 500
+
+
+class ScoreCache:
+    """
+    ファジー照合スコアのディスクキャッシュ（SQLite）。
+
+    キーは (正規化済みアイテム名, 正規化済み照合対象名, スコアラID)。
+    実行ごとに世代番号を進め、参照したアイテム名の行へ世代を記録する（アイテム単位の LRU）。
+    件数が上限を超えた場合は世代の古い行から削除する。
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.path = cache_dir / "fuzzy_scores.sqlite3"
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " scorer TEXT NOT NULL, item TEXT NOT NULL, target TEXT NOT NULL,"
+            " score REAL NOT NULL, used INTEGER NOT NULL,"
+            " UNIQUE (scorer, item, target))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS scores_used ON scores (used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        self.generation = (row[0] if row else 0) + 1
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (self.generation,))
+        self.conn.commit()
+
+    def score_matrix(
+        self,
+        queries: Sequence[str],
+        choices: Sequence[str],
+        scorer_id: str,
+        compute: Callable[[List[str], List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """
+        queries × choices のスコア行列を返す。
+        キャッシュに無い組だけを compute(未計算のqueries, 未計算のchoices) で計算して保存する。
+        queries/choices はそれぞれ重複の無いことを前提とする。
+        """
+        queries = list(queries)
+        choices = list(choices)
+        mat = np.full((len(queries), len(choices)), np.nan, dtype=np.float64)
+        if mat.size == 0:
+            return np.zeros(mat.shape, dtype=np.float64)
+
+        row_of = {q: i for i, q in enumerate(queries)}
+        col_of = {c: j for j, c in enumerate(choices)}
+        for start in range(0, len(queries), _CHUNK):
+            chunk = queries[start:start + _CHUNK]
+            marks = ",".join("?" * len(chunk))
+            cur = self.conn.execute(
+                f"SELECT item, target, score FROM scores WHERE scorer = ? AND item IN ({marks})",
+                [scorer_id, *chunk],
+            )
+            for item, target, score in cur:
+                j = col_of.get(target)
+                if j is not None:
+                    mat[row_of[item], j] = score
+            self.conn.execute(
+                f"UPDATE scores SET used = ? WHERE scorer = ? AND item IN ({marks})",
+                [self.generation, scorer_id, *chunk],
+            )
+
+        missing = np.isnan(mat)
+        n_missing = int(missing.sum())
+        self.hits += mat.size - n_missing
+        self.misses += n_missing
+        if n_missing:
+            # 未計算の組を含む行・列の部分行列だけを計算する
+            rows = np.flatnonzero(missing.any(axis=1))
+            cols = np.flatnonzero(missing.any(axis=0))
+            block = mat[np.ix_(rows, cols)]
+            fresh = np.asarray(compute([queries[i] for i in rows], [choices[j] for j in cols]), dtype=np.float64)
+            fill = np.isnan(block)
+            block[fill] = fresh[fill]
+            mat[np.ix_(rows, cols)] = block
+
+            fi, fj = np.nonzero(fill)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scores (scorer, item, target, score, used) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (scorer_id, queries[rows[a]], choices[cols[b]], float(block[a, b]), self.generation)
+                    for a, b in zip(fi.tolist(), fj.tolist())
+                ),
+            )
+            self._evict()
+        self.conn.commit()
+        return mat
+
+    def _evict(self) -> None:
+        # 上限超過分を最終使用世代の古い順に削除
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM scores WHERE rowid IN (SELECT rowid FROM scores ORDER BY used LIMIT ?)",
+                (excess,),
+            )
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# これより少ない行数ではプロセスを起動しない（起動・受け渡しの方が高くつく）
+MIN_SHARD_ROWS = 2000
+
+
+def resolve_workers(workers: int) -> int:
+    """--workers の値をプロセス数にする（-1 は CPU 数、0 以下は 1）。"""
+    if workers == -1:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+
+def shard_bounds(n: int, shards: int) -> List[Tuple[int, int]]:
+    """0..n を shards 個の連続区間（大きさの差は高々1）に分ける。"""
+    shards = max(1, min(shards, n))
+    size, extra = divmod(n, shards)
+    bounds: List[Tuple[int, int]] = []
+    start = 0
+    for i in range(shards):
+        stop = start + size + (1 if i < extra else 0)
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def _run_shard(func: Callable[[Sequence[T]], R], shard: Sequence[T], collect: bool) -> Tuple[R, Optional[dict]]:
+    # 子プロセス側: 計測が有効なら子の分だけを集計して親へ返す（fork で引き継いだ値は捨てる）
+    if collect:
+        metrics.reset()
+        metrics.enable()
+    result = func(shard)
+    return result, metrics.snapshot() if collect else None
+
+
+def map_shards(
+    func: Callable[[Sequence[T]], R],
+    items: Sequence[T],
+    workers: int,
+    min_rows: int = MIN_SHARD_ROWS,
+) -> List[R]:
+    """
+    items を workers 個の連続した区間に分け、func(区間) をプロセスプールで並列に実行して結果を区間の順に返す。
+
+    区間は入力順に並ぶため、結果を順に連結すれば1プロセスで func(items) を実行した場合と同じ並びになる。
+    workers が 1 以下、または行数が少ない場合は現在のプロセスで func(items) を1回だけ実行する。
+    子プロセスで数えたカウンタ/タイマは親の metrics に加算する（タイマは各プロセスの合計）。
+    func は子プロセスから参照できるモジュールの関数であること（lambda 不可）。
+    """
+    workers = min(resolve_workers(workers), max(1, len(items) // max(1, min_rows)))
+    if workers <= 1:
+        return [func(items)]
+    collect = metrics.is_enabled()
+    shards = [items[a:b] for a, b in shard_bounds(len(items), workers)]
+    metrics.count("shard_pool.shards", len(shards))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        done = list(pool.map(_run_shard, [func] * len(shards), shards, [collect] * len(shards)))
+    for _, snap in done:
+        if snap is not None:
+            metrics.merge(snap)
+    return [result for result, _ in done]
@@ -1,4 +1,9 @@
+import argparse
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from PyPDF2 import PdfReader, PdfWriter
 
 def extract_pages_to_single_pdf(input_pdf_path, output_pdf_path, start_page=None, end_page=None):
@@ -28,23 +33,11 @@ def extract_pages_to_single_pdf(input_pdf_path, output_pdf_path, start_page=None
             print(f"エラー: 指定されたページ範囲 ({_start_page}-{_end_page}) は無効です。総ページ数: {num_pages}")
             return
 
-        writer = PdfWriter()
-
-        for i in range(_start_page - 1, _end_page):
-            writer.add_page(reader.pages[i])
-
-        with open(output_pdf_path, "wb") as output_file:
-            writer.write(output_file)
-        
+        _write_pages(reader, output_pdf_path, _start_page, _end_page)
         print(f"ページ {_start_page} から {_end_page} までを '{output_pdf_path}' に保存しました。")
 
     except PermissionError:
-        print(f"\nエラー: ファイル '{os.path.abspath(output_pdf_path)}' への書き込みが拒否されました (Permission denied)。")
-        print("考えられる原因:")
-        print("  - ファイルが他のプログラム (PDFビューア、OneDriveの同期プロセス等) で開かれている、またはロックされている。")
-        print("  - 出力先フォルダに対する書き込み権限がない。")
-        print("  - ファイルが読み取り専用に設定されている。")
-        print("ヒント: 問題のファイルを閉じる、OneDriveの同期が完了するのを待つ、または別のフォルダに出力してみてください。")
+        _print_permission_hint(output_pdf_path)
         raise
     except FileNotFoundError:
         raise
@@ -52,29 +45,137 @@ def extract_pages_to_single_pdf(input_pdf_path, output_pdf_path, start_page=None
         print(f"PDFの処理中に予期せぬエラーが発生しました: {e}")
         raise
 
-def split_pdf_in_chunks(input_pdf_path, output_directory, chunk_size=100):
+def _print_permission_hint(output_pdf_path):
+    print(f"\nエラー: ファイル '{os.path.abspath(output_pdf_path)}' への書き込みが拒否されました (Permission denied)。")
+    print("考えられる原因:")
+    print("  - ファイルが他のプログラム (PDFビューア、OneDriveの同期プロセス等) で開かれている、またはロックされている。")
+    print("  - 出力先フォルダに対する書き込み権限がない。")
+    print("  - ファイルが読み取り専用に設定されている。")
+    print("ヒント: 問題のファイルを閉じる、OneDriveの同期が完了するのを待つ、または別のフォルダに出力してみてください。")
+
+
+def _write_pages(reader, output_pdf_path, start_page, end_page):
+    """
+    読み込み済みの PdfReader から start_page〜end_page (1から) を新しいPDFとして書き出します。
+    """
+    writer = PdfWriter()
+    for i in range(start_page - 1, end_page):
+        writer.add_page(reader.pages[i])
+    with open(output_pdf_path, "wb") as output_file:
+        writer.write(output_file)
+
+
+def file_sha256(path):
+    """ファイル内容の SHA-256 を返します。"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ワーカープロセスごとに1度だけ解析した PdfReader
+_worker_reader = None
+
+
+def _init_worker(input_pdf_path):
+    global _worker_reader
+    _worker_reader = PdfReader(input_pdf_path)
+
+
+def _write_chunk_in_worker(output_pdf_path, start_page, end_page):
+    try:
+        _write_pages(_worker_reader, output_pdf_path, start_page, end_page)
+    except PermissionError:
+        _print_permission_hint(output_pdf_path)
+        raise
+    return output_pdf_path, start_page, end_page
+
+
+def _load_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def split_pdf_in_chunks(input_pdf_path, output_directory, chunk_size=100, workers=None, force=False):
     """
     PDFファイルを指定されたページ数ごとに分割します。
 
+    元PDFの解析は1度だけ（並列時はワーカーごとに1度だけ）行い、チャンクはプロセスプールで書き出します。
+    出力先の manifest（{base}_pages_manifest.json）に元PDFのハッシュとページ範囲を記録し、
+    一致する既存チャンクは書き出しを省略します。
+
     Args:
         input_pdf_path (str): 分割元のPDFファイルのパス。
         output_directory (str): 分割したPDFを保存するディレクトリ。
         chunk_size (int, optional): 1ファイルあたりのページ数。デフォルトは100。
+        workers (int, optional): 並列プロセス数。指定しない場合はCPU数。1なら逐次処理。
+        force (bool, optional): True なら既存チャンクも全て書き直す。
     """
     try:
         reader = PdfReader(input_pdf_path)
         num_pages = len(reader.pages)
         base_name = os.path.splitext(os.path.basename(input_pdf_path))[0]
+        source_hash = file_sha256(input_pdf_path)
+        os.makedirs(output_directory, exist_ok=True)
+        manifest_path = os.path.join(output_directory, f"{base_name}_pages_manifest.json")
+        manifest = {} if force else _load_manifest(manifest_path)
 
         print(f"'{input_pdf_path}' (総ページ数: {num_pages}) を {chunk_size} ページごとに分割します。")
 
+        pending = []
         for start_page in range(1, num_pages + 1, chunk_size):
             end_page = min(start_page + chunk_size - 1, num_pages)
-            
+
             output_filename = f"{base_name}_pages_{start_page}.pdf"
             output_filepath = os.path.join(output_directory, output_filename)
-            
-            extract_pages_to_single_pdf(input_pdf_path, output_filepath, start_page, end_page)
+
+            entry = manifest.get(output_filename)
+            up_to_date = (
+                os.path.exists(output_filepath)
+                and entry == {"source_sha256": source_hash, "start": start_page, "end": end_page}
+            )
+            if up_to_date:
+                print(f"スキップ: '{output_filepath}' は最新です。")
+            else:
+                pending.append((output_filepath, start_page, end_page))
+
+        def record(output_filepath, start_page, end_page):
+            manifest[os.path.basename(output_filepath)] = {
+                "source_sha256": source_hash,
+                "start": start_page,
+                "end": end_page,
+            }
+            _save_manifest(manifest_path, manifest)
+            print(f"ページ {start_page} から {end_page} までを '{output_filepath}' に保存しました。")
+
+        n_workers = min(workers or os.cpu_count() or 1, len(pending))
+        if n_workers <= 1:
+            # 逐次処理: 解析済みの reader をそのまま使う
+            for output_filepath, start_page, end_page in pending:
+                try:
+                    _write_pages(reader, output_filepath, start_page, end_page)
+                except PermissionError:
+                    _print_permission_hint(output_filepath)
+                    raise
+                record(output_filepath, start_page, end_page)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_workers, initializer=_init_worker, initargs=(input_pdf_path,)
+            ) as pool:
+                futures = [pool.submit(_write_chunk_in_worker, *job) for job in pending]
+                for future in as_completed(futures):
+                    record(*future.result())
 
         print("\nPDFの分割が完了しました。")
 
@@ -86,10 +187,16 @@ def split_pdf_in_chunks(input_pdf_path, output_directory, chunk_size=100):
 if __name__ == "__main__":
     # スクリプトの場所を基準にファイルパスを解決
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    input_file = os.path.join(script_dir, "..", "data", "第２編土木工事標準歩掛_OCR結合済み.pdf")
-
-    # 出力先フォルダを指定 (スクリプトの2階層上の 'pdf' フォルダ)
-    output_folder = os.path.join(script_dir, "..", "data", "50_pdf_doboku")
-    
-    # PDFを100ページごとに分割
-    split_pdf_in_chunks(input_file, output_folder, chunk_size=50)
\ No newline at end of file
+    default_input = os.path.join(script_dir, "..", "data", "第２編土木工事標準歩掛_OCR結合済み.pdf")
+    # 出力先フォルダ（data/50_pdf_doboku）
+    default_output = os.path.join(script_dir, "..", "data", "50_pdf_doboku")
+
+    parser = argparse.ArgumentParser(description="PDFを指定ページ数ごとに分割します。")
+    parser.add_argument("--input", default=default_input, help="分割元のPDF")
+    parser.add_argument("--outdir", default=default_output, help="分割したPDFの保存先")
+    parser.add_argument("--chunk-size", type=int, default=50, help="1ファイルあたりのページ数")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数（既定: CPU数）")
+    parser.add_argument("--force", action="store_true", help="最新のチャンクも含めて全て書き直す")
+    args = parser.parse_args()
+
+    split_pdf_in_chunks(args.input, args.outdir, chunk_size=args.chunk_size, workers=args.workers, force=args.force)
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+# ステージの実行記録（出力先ディレクトリごとに1ファイル）
+MANIFEST_NAME = ".stage_cache.json"
+
+# ファイル内容のハッシュを (絶対パス, サイズ, 更新時刻) ごとにメモ化
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+
+
+class Stage(NamedTuple):
+    """
+    パイプラインの1段階の宣言。
+    inputs/code の内容ハッシュと params（None は {} と同じ）が前回実行時と同じで、outputs が全て存在すればスキップできる。
+    """
+
+    name: str
+    inputs: Sequence[str]
+    outputs: Sequence[str]
+    code: Sequence[str]
+    params: Optional[Dict[str, object]] = None
+
+
+def file_digest(path: str) -> str:
+    """ファイル内容の SHA-256 を返す。"""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    memo_key = (path, st.st_size, st.st_mtime_ns)
+    digest = _digest_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+def stage_key(stage: Stage) -> str:
+    """入力・コード・パラメータから決まるステージのキーを返す（パスはファイル名のみを使用）。"""
+    h = hashlib.sha256()
+    h.update(json.dumps({"name": stage.name, "params": stage.params or {}}, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    for label, paths in (("input", stage.inputs), ("code", stage.code)):
+        for i, path in enumerate(paths):
+            h.update(f"{label}:{i}:{os.path.basename(path)}:{file_digest(path)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _manifest_path(stage: Stage) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(stage.outputs[0])), MANIFEST_NAME)
+
+
+def _entry_name(stage: Stage) -> str:
+    return stage.name + ":" + ",".join(os.path.basename(p) for p in stage.outputs)
+
+
+def _load_manifest(path: str) -> Dict[str, dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def is_up_to_date(stage: Stage, key: str) -> bool:
+    """前回実行時のキーと一致し、出力が全て存在すれば True。"""
+    entry = _load_manifest(_manifest_path(stage)).get(_entry_name(stage))
+    return bool(entry) and entry.get("key") == key and all(os.path.exists(p) for p in stage.outputs)
+
+
+def record(stage: Stage, key: str) -> None:
+    """ステージの実行完了を記録する。"""
+    path = _manifest_path(stage)
+    manifest = _load_manifest(path)
+    manifest[_entry_name(stage)] = {"key": key}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def run_stage(stage: Stage, fn: Callable[[], object], force: bool = False) -> bool:
+    """
+    ステージが最新でなければ（または force=True なら）fn を実行して記録する。
+    実行した場合 True、スキップした場合 False を返す。
+    """
+    key = stage_key(stage)
+    if not force and is_up_to_date(stage, key):
+        print(f"Skip {stage.name}: 入力・コード・パラメータに変更がありません（--force で再実行）")
+        return False
+    fn()
+    record(stage, key)
+    return True
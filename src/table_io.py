@@ -0,0 +1,207 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from unit_tables import UnitTables
+
+# 拡張子 → 保存形式（それ以外は CSV）
+FORMAT_SUFFIXES: Dict[str, str] = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".npz": "tables",
+}
+# --format で選べる形式と書き出し時の拡張子
+FORMAT_EXTENSIONS: Dict[str, str] = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+# unit_price_normalized のみで選べる形式（tables: 文字列プール + 番号配列 + 表単位の索引の .npz。unit_tables.py）
+UNIT_FORMAT_EXTENSIONS: Dict[str, str] = {**FORMAT_EXTENSIONS, "tables": ".npz"}
+
+# 行ごとに同じ値が繰り返される列（列指向形式では辞書エンコード＝category 型で保存）
+CATEGORICAL_COLUMNS = [
+    # unit_price_normalized
+    "大分類名", "工種名", "細別名", "基本歩掛名",
+    "所要日数作業単位_数量", "所要日数作業単位_単位",
+    "歩掛作業単位_数量", "歩掛作業単位_単位", "単位",
+    # final_mapping / 照合候補
+    "カテゴリ名", "サブカテゴリ名", "アイテム名",
+    "基本所要日数名", "基本所要日数", "歩掛カテゴリ", "歩掛単位", "match_on",
+]
+
+
+def table_format(path) -> str:
+    """パスの拡張子から保存形式（csv/parquet/feather）を判定する。"""
+    return FORMAT_SUFFIXES.get(os.path.splitext(str(path))[1].lower(), "csv")
+
+
+def with_format(path: str, fmt: str) -> str:
+    """パスの拡張子を指定形式のものに置き換える。"""
+    return os.path.splitext(path)[0] + UNIT_FORMAT_EXTENSIONS[fmt]
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Parquet/Feather の入出力には pyarrow が必要です（python -m pip install pyarrow）") from e
+
+
+def _columnar_names(path, fmt: str) -> List[str]:
+    # データ本体を読まずにスキーマから列名のみ取得
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(path).names)
+    import pyarrow.ipc as ipc
+
+    with ipc.open_file(path) as reader:
+        return list(reader.schema.names)
+
+
+def read_table(path, columns: Optional[Sequence[str]] = None, **csv_kwargs) -> pd.DataFrame:
+    """
+    CSV / Parquet / Feather / 文字列プール形式（.npz）を拡張子で判別して読み込む。
+    columns を指定すると、そのうちファイルに存在する列のみを読む（列の射影）。
+    csv_kwargs は CSV の場合のみ pd.read_csv へ渡す。列指向形式では書き出し時の値（category 型を含む）をそのまま返す。
+    """
+    fmt = table_format(path)
+    if fmt == "csv":
+        if columns is not None:
+            wanted = set(columns)
+            csv_kwargs["usecols"] = lambda c: c in wanted
+        return pd.read_csv(path, encoding="utf-8", **csv_kwargs)
+    if fmt == "tables":
+        return UnitTables.load(path).to_frame(columns)
+
+    _require_pyarrow()
+    if columns is not None:
+        present = set(_columnar_names(path, fmt))
+        columns = [c for c in columns if c in present]
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+
+def write_table(df: pd.DataFrame, path) -> None:
+    """
+    拡張子に応じて CSV / Parquet / Feather / 文字列プール形式（.npz、unit_price_normalized のみ）で書き出す。
+    列指向形式では CATEGORICAL_COLUMNS を category 型（辞書エンコード）に変換して保存する。
+    """
+    fmt = table_format(path)
+    if fmt == "csv":
+        df.to_csv(path, index=False, encoding="utf-8")
+        return
+    if fmt == "tables":
+        UnitTables.from_frame(df).save(path)
+        return
+
+    _require_pyarrow()
+    out = df.reset_index(drop=True)
+    categorical = {c: "category" for c in CATEGORICAL_COLUMNS if c in out.columns and out[c].dtype != "category"}
+    if categorical:
+        out = out.astype(categorical)
+    if fmt == "parquet":
+        out.to_parquet(path, index=False)
+    else:
+        out.to_feather(path)
+
+
+class TableWriter:
+    """
+    表を分割して順に追記する書き出し（形式の判定と category 型の扱いは write_table と同じ）。
+
+    CSV はヘッダを最初の1回だけ書いて追記、Parquet は行グループ、Feather は IPC のレコードバッチとして追記する。
+    列指向形式の列型は最初の書き込みで決め（文字列列は string、CATEGORICAL_COLUMNS は辞書）、
+    辞書は書き込みのたびに語を末尾へ追加するだけにして差分として書く。
+    一度も書き込まずに閉じた場合は columns のみの空表を書き出す。
+    """
+
+    def __init__(self, path, columns: Sequence[str]):
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = table_format(path)
+        if self.fmt == "tables":
+            raise ValueError(f"文字列プール形式（.npz）は追記書き出しに対応していません: {path}")
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._categories: Dict[str, List[object]] = {}
+        if self.fmt != "csv":
+            _require_pyarrow()
+
+    def write(self, df: pd.DataFrame) -> None:
+        """df（列は columns の順）を追記する。"""
+        if df.empty:
+            return
+        df = df[self.columns].reset_index(drop=True)
+        if self.fmt == "csv":
+            df.to_csv(self.path, index=False, encoding="utf-8", mode="a" if self.rows else "w", header=not self.rows)
+        else:
+            self._write_columnar(df)
+        self.rows += len(df)
+
+    def _write_columnar(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                # 既出の語の順序を保ったまま新しい語を追加する（辞書の差分書き込みの条件）
+                known = self._categories.setdefault(col, [])
+                seen = set(known)
+                for value in pd.unique(df[col].dropna()):
+                    if value not in seen:
+                        known.append(value)
+                        seen.add(value)
+                df[col] = pd.Categorical(df[col], categories=known)
+        if self._schema is None:
+            fields = []
+            for col in df.columns:
+                if isinstance(df[col].dtype, pd.CategoricalDtype):
+                    fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+                elif df[col].dtype == object or pd.api.types.is_string_dtype(df[col].dtype):
+                    fields.append(pa.field(col, pa.string()))
+                else:
+                    fields.append(pa.field(col, pa.Array.from_pandas(df[col]).type))
+            self._schema = pa.schema(fields)
+            self._writer = self._open_writer()
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def _open_writer(self):
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetWriter(self.path, self._schema)
+        import pyarrow.ipc as ipc
+
+        return ipc.new_file(self.path, self._schema, options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def close(self) -> None:
+        if self.rows == 0 and self._writer is None:
+            write_table(pd.DataFrame(columns=self.columns), self.path)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def empty_to_na(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    空文字を欠損値に置き換える（CSV を pd.read_csv の既定で読んだ場合と揃える）。
+    category 型の列はカテゴリから空文字を除くことで置き換える。
+    """
+    df = df.copy()
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            if "" in s.cat.categories:
+                df[col] = s.cat.remove_categories([""])
+        elif s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+            df[col] = s.where(s != "")
+    return df
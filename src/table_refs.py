@@ -0,0 +1,193 @@
+import argparse
+import csv
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from text_normalize import clean_cell, normalize_text
+
+
+# 表番号（表3.2 / 表 4.10 / 表3-1。全角は normalize_text で半角にしてから照合）
+_TABLE_NUMBER = re.compile(r"表\s*(\d+(?:[.\-]\d+)*)")
+# 摘要中の表参照。「表4.1~表4.2」「表4.1～4.3」は範囲として展開する
+_TABLE_REF = re.compile(r"表\s*(\d+(?:\.\d+)*)(?:\s*[~〜～]\s*(?:表\s*)?(\d+(?:\.\d+)*))?")
+# 章見出しの先頭の「N章」
+_CHAPTER_PREFIX = re.compile(r"^\s*\d+\s*章\s*")
+# 範囲参照を展開する上限（「表4.1~表4.99」のような誤記で行が膨らまないように）
+MAX_RANGE = 20
+# 出力列
+REF_COLUMNS = ["参照表", "参照表_内容", "参照表_未解決"]
+
+
+class RefTable(NamedTuple):
+    """table_data.csv の表1つ分（章見出し・表番号・表題・データ行）。"""
+
+    chapter: str
+    number: str
+    title: str
+    rows: List[List[str]]
+
+
+def chapter_key(text: str) -> str:
+    """章見出し/大分類名+工種名を突き合わせるためのキー（「N章」と空白を除いた正規化文字列）。"""
+    return normalize_text(_CHAPTER_PREFIX.sub("", normalize_text(text))).replace(" ", "")
+
+
+def table_number(title: str) -> str:
+    m = _TABLE_NUMBER.search(normalize_text(title))
+    return m.group(1) if m else ""
+
+
+def parse_table_refs(text: str) -> List[str]:
+    """摘要に含まれる表番号を出現順に返す（範囲は展開、重複は除く）。"""
+    numbers: List[str] = []
+    for m in _TABLE_REF.finditer(normalize_text(text)):
+        first, last = m.group(1), m.group(2)
+        expanded = [first]
+        if last:
+            head, _, lo = first.rpartition(".")
+            head2, _, hi = last.rpartition(".")
+            if head == head2 and lo.isdigit() and hi.isdigit() and 0 < int(hi) - int(lo) <= MAX_RANGE:
+                prefix = f"{head}." if head else ""
+                expanded = [f"{prefix}{i}" for i in range(int(lo), int(hi) + 1)]
+            else:
+                expanded = [first, last]
+        for number in expanded:
+            if number not in numbers:
+                numbers.append(number)
+    return numbers
+
+
+class TableDataIndex:
+    """
+    table_data.csv を表単位に構造化し、(章キー, 表番号) → 表 のハッシュ索引を持つ。
+
+    1列目が章見出し、2列目が表題、3列目以降がセル（行ごとに列数が異なる）。
+    表番号は章ごとに振り直されるため、章を決めてから番号で引く。
+    単価側の大分類名+工種名が章見出しと一致しない場合は、工種名を含む章（無ければ大分類名を含む章）を候補とし、
+    候補の中で番号の表が1つに決まる場合のみ解決する。
+    """
+
+    def __init__(self, tables: Sequence[RefTable]):
+        self.tables = list(tables)
+        self._by_key: Dict[Tuple[str, str], int] = {}
+        self._chapters: Dict[str, List[int]] = {}
+        for i, t in enumerate(self.tables):
+            key = chapter_key(t.chapter)
+            self._chapters.setdefault(key, []).append(i)
+            if t.number:
+                self._by_key.setdefault((key, t.number), i)
+        self._chapter_memo: Dict[Tuple[str, str], List[str]] = {}
+
+    @classmethod
+    def from_csv(cls, path: str) -> "TableDataIndex":
+        tables: List[RefTable] = []
+        position: Dict[Tuple[str, str], int] = {}
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for parts in csv.reader(f):
+                if len(parts) < 2:
+                    continue
+                chapter = clean_cell(parts[0])
+                # 表題は「 "表3.4 ..."」のように引用符ごと入っている行がある
+                title = clean_cell(parts[1]).strip('"').strip()
+                cells = [clean_cell(c) for c in parts[2:]]
+                while cells and not cells[-1]:
+                    cells.pop()
+                key = (chapter, title)
+                if key not in position:
+                    position[key] = len(tables)
+                    tables.append(RefTable(chapter, table_number(title), title, []))
+                if cells:
+                    tables[position[key]].rows.append(cells)
+        return cls(tables)
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def chapters_for(self, major: str, kind: str) -> List[str]:
+        """大分類名/工種名に対応する章キーの候補。"""
+        memo_key = (major, kind)
+        keys = self._chapter_memo.get(memo_key)
+        if keys is None:
+            exact = chapter_key(f"{major}{kind}")
+            if exact in self._chapters:
+                keys = [exact]
+            else:
+                keys = []
+                for part in (chapter_key(kind), chapter_key(major)):
+                    if part:
+                        keys = [k for k in self._chapters if part in k]
+                    if keys:
+                        break
+            self._chapter_memo[memo_key] = keys
+        return keys
+
+    def find(self, major: str, kind: str, number: str) -> List[RefTable]:
+        """候補の章にある表番号 number の表（大分類名/工種名が共に空なら全章から探す）。"""
+        chapters = self.chapters_for(major, kind) if major or kind else list(self._chapters)
+        found = dict.fromkeys(self._by_key[(k, number)] for k in chapters if (k, number) in self._by_key)
+        return [self.tables[i] for i in found]
+
+    def lookup(self, major: str, kind: str, number: str) -> Optional[RefTable]:
+        """大分類名/工種名の章で表番号を引く（候補の章で1つに決まらなければ None）。"""
+        found = self.find(major, kind, number)
+        return found[0] if len(found) == 1 else None
+
+
+def format_table(table: RefTable) -> str:
+    """表を1セルに収まる文字列にする（行は「 / 」、セルは「,」区切り）。"""
+    return f"[{table.title}] " + " / ".join(",".join(row) for row in table.rows)
+
+
+def resolve_table_refs(df: pd.DataFrame, index: TableDataIndex) -> pd.DataFrame:
+    """
+    df（大分類名/工種名/摘要の列を持つ）の摘要中の表参照を解決し、REF_COLUMNS の DataFrame を返す（index は df と同じ）。
+    (大分類名, 工種名, 摘要) の異なり組ごとに1回だけ解決し、行へは番号で配る。
+    """
+    keys = pd.MultiIndex.from_arrays([df["大分類名"].fillna(""), df["工種名"].fillna(""), df["摘要"].fillna("")])
+    codes, uniques = pd.factorize(keys)
+    resolved: List[Tuple[str, str, str]] = []
+    for major, kind, note in uniques:
+        titles: List[str] = []
+        contents: List[str] = []
+        unresolved: List[str] = []
+        for number in parse_table_refs(note):
+            table = index.lookup(major, kind, number)
+            if table is None:
+                unresolved.append(f"表{number}")
+            else:
+                titles.append(table.title)
+                contents.append(format_table(table))
+        resolved.append(("; ".join(titles), " || ".join(contents), "; ".join(unresolved)))
+    values = np.empty((len(resolved), len(REF_COLUMNS)), dtype=object)
+    values[:] = resolved if resolved else np.empty((0, len(REF_COLUMNS)))
+    return pd.DataFrame(values[codes], columns=REF_COLUMNS, index=df.index)
+
+
+def main():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.normpath(os.path.join(base_dir, "..", "data"))
+
+    parser = argparse.ArgumentParser(description="table_data.csv から章と表番号で表を引いて表示します。")
+    parser.add_argument("number", help="表番号（例: 3.2 / 表3.2）")
+    parser.add_argument("--major", default="", help="大分類名（例: 共通工）")
+    parser.add_argument("--kind", default="", help="工種名（大分類名と合わせて章を決める）")
+    parser.add_argument("--table-data", default=os.path.join(data_dir, "table_data.csv"), help="table_data.csv のパス")
+    args = parser.parse_args()
+
+    index = TableDataIndex.from_csv(args.table_data)
+    number = table_number(args.number) or args.number
+    tables = index.find(args.major, args.kind, number)
+    if not tables:
+        parser.exit(1, f"表{number} が見つかりません\n")
+    for table in tables:
+        print(f"{table.chapter} / {table.title}")
+        for row in table.rows:
+            print("  " + ",".join(row))
+
+
+if __name__ == "__main__":
+    main()
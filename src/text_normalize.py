@@ -0,0 +1,107 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Optional
+
+# 正規化結果をメモ化する件数の上限（異なり文字列ごと）
+CACHE_SIZE = 1 << 17
+
+
+def _build_fullwidth_table() -> dict:
+    # 全角形（Unicode 名に FULLWIDTH を含む文字）→ NFKC の半角相当。該当文字は U+FF00〜U+FFEF に収まる
+    table = {}
+    for code in range(0xFF00, 0xFFF0):
+        ch = chr(code)
+        if "FULLWIDTH" in unicodedata.name(ch, ""):
+            table[code] = unicodedata.normalize("NFKC", ch)
+    return table
+
+
+FULLWIDTH_TABLE = _build_fullwidth_table()
+
+# 改行/復帰 → 空白
+_NEWLINE_TABLE = str.maketrans({"\r": " ", "\n": " "})
+_SPACES = re.compile(r"\s+")
+# m単位（m, m2, m³ 等）の直前にある先頭の「空」
+_LEADING_KARA = re.compile(r"^\s*空\s*(?=(m²|m2|m³|m3)\b)")
+# よく使う工学単位表記の統一（m2/m^2/㎡ → m², m3/m^3/㎥ → m³）
+_UNIT_GLYPHS = {"m2": "m²", "m^2": "m²", "m3": "m³", "m^3": "m³", "㎡": "m²", "㎥": "m³"}
+_UNIT_PATTERN = re.compile(r"m\^?[23]|[㎡㎥]")
+
+
+def to_halfwidth(text: str) -> str:
+    """全角形の文字のみを半角相当へ変換する（その他の文字は変更しない）。"""
+    return text.translate(FULLWIDTH_TABLE)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_cell(text: Optional[str]) -> str:
+    """
+    セル文字列の標準クリーニング
+    - 改行を空白に置換し、連続する空白を1つに圧縮
+    - 外側のクォートを除去し、全角形を半角相当へ正規化
+    """
+    if text is None:
+        return ""
+    if not isinstance(text, str):
+        text = str(text)
+    # 改行と空白を正規化
+    text = text.translate(_NEWLINE_TABLE).strip()
+    # 連続する空白を1つに圧縮
+    text = _SPACES.sub(" ", text)
+    # 外側のクォートを除去
+    text = text.strip('\'"')
+    # 全角形を半角相当へ正規化
+    return to_halfwidth(text)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_preserve_spaces(text: Optional[str], halfwidth: bool = False) -> str:
+    """
+    文字列の軽量クリーニング（内部の空白は潰さない）
+    - 改行/復帰を空白に置換
+    - 前後の空白と外側のクォートを除去
+    - halfwidth=True なら全角形を半角相当へ正規化
+    """
+    if text is None:
+        return ""
+    if not isinstance(text, str):
+        text = str(text)
+    text = text.translate(_NEWLINE_TABLE).strip().strip('\'"')
+    return to_halfwidth(text) if halfwidth else text
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_unit(unit: str) -> str:
+    """単位表記をクリーニングし、m²/m³ 表記へ統一する。"""
+    unit = clean_cell(unit)
+    unit = _LEADING_KARA.sub("", unit)
+    return _UNIT_PATTERN.sub(lambda m: _UNIT_GLYPHS[m.group(0)], unit)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_text(value: object) -> str:
+    """文字列を比較用に正規化（NFKC化 → 前後空白除去 → 連続空白の圧縮）"""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value)).strip()
+    # 空白類を単一スペースに統一
+    return _SPACES.sub(" ", text)
+
+
+def normalize_series(series, func: Callable[[object], str]):
+    """
+    pandas Series へ正規化関数を適用する（異なり値ごとに1回だけ評価して配列参照で展開）。
+    欠損値は func(欠損値) の結果になる（Series.map(func) と同じ）。
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    values = [func(u) for u in uniques]
+    if (codes < 0).any():
+        # 欠損値のコード -1 は末尾要素を参照する
+        values.append(func(series[codes < 0].iloc[0]))
+    lookup = np.empty(len(values), dtype=object)
+    lookup[:] = values
+    return pd.Series(lookup[codes], index=series.index, dtype=object)
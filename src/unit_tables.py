@@ -0,0 +1,173 @@
+import sys
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from text_normalize import normalize_text
+
+
+# 単価表を識別する列（照合と同じく normalize_text 後の値の組が同じ行を1つの表にまとめる）
+TABLE_KEY = ["大分類名", "工種名", "細別名"]
+# 保存形式の版（配列の構成を変えたら上げる）
+FORMAT_VERSION = 3
+
+
+def _pack_strings(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # 文字列を UTF-8 の連結バイト列と終端位置に詰める（pickle を使わずに保存するため）
+    encoded = [s.encode("utf-8") for s in strings]
+    ends = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), ends
+
+
+def _unpack_strings(blob: np.ndarray, ends: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    starts = np.concatenate([[0], ends[:-1]]).tolist()
+    return [sys.intern(data[a:b].decode("utf-8")) for a, b in zip(starts, ends.tolist())]
+
+
+def table_key_text(value: str) -> str:
+    """表キーの1列分の値（空欄は照合側で欠損値として読まれるため、normalize_text(欠損値) と同じ値にする）。"""
+    return normalize_text(value if value else np.nan)
+
+
+class UnitTables:
+    """
+    unit_price_normalized の表単位のモデル（列ごとの番号配列 + 文字列プール）。
+
+    セルの値は全列共通の重複の無い文字列プール（インターン済み）への番号として int32 の2次元配列に持つ。
+    行は TABLE_KEY を正規化した値の組ごとに表へまとめ（表の番号は初出順、表内は元の行順）、
+    各行の表番号（照合の UnitIndex.table_codes と同じ値）と表ごとの行の範囲を持ち、表キー → 表番号の辞書で O(1) に引ける。
+    np.savez（pickle 不使用）で保存し、読み込みは配列の復元のみ。
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        strings: List[str],
+        codes: np.ndarray,
+        key_strings: List[str],
+        table_keys: np.ndarray,
+        table_codes: np.ndarray,
+        table_offsets: np.ndarray,
+        table_rows: np.ndarray,
+    ):
+        self.columns = list(columns)
+        self.column_index = {c: i for i, c in enumerate(self.columns)}
+        self.strings = strings
+        self.codes = codes
+        self.key_strings = key_strings
+        self.table_keys = table_keys
+        self.table_codes = table_codes
+        self.table_offsets = table_offsets
+        self.table_rows = table_rows
+        self._lookup: Optional[Dict[Tuple[str, ...], int]] = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "UnitTables":
+        """DataFrame（値は文字列。欠損は空欄として扱う）から作る。TABLE_KEY の列は必須。"""
+        missing = [c for c in TABLE_KEY if c not in df.columns]
+        if missing:
+            raise ValueError(f"表キーの列が見つかりません: {', '.join(missing)}")
+        pool: Dict[str, int] = {"": 0}
+        codes = np.empty((len(df), len(df.columns)), dtype=np.int32)
+        for j, col in enumerate(df.columns):
+            values, uniques = pd.factorize(df[col], use_na_sentinel=True)
+            mapping = np.array([pool.setdefault(str(u), len(pool)) for u in uniques] + [0], dtype=np.int32)
+            # 欠損（-1）は末尾の空文字を参照する
+            codes[:, j] = mapping[values]
+        strings = [sys.intern(s) for s in pool]
+
+        # 表キーの列はプールの文字列ごとに1回だけ正規化し、正規化後の文字列の番号に置き換える
+        key_pool: Dict[str, int] = {}
+        keys = np.empty((len(df), len(TABLE_KEY)), dtype=np.int32)
+        for t, col in enumerate(TABLE_KEY):
+            column = codes[:, list(df.columns).index(col)]
+            mapping = np.zeros(len(strings), dtype=np.int32)
+            for c in np.unique(column).tolist():
+                mapping[c] = key_pool.setdefault(table_key_text(strings[c]), len(key_pool))
+            keys[:, t] = mapping[column]
+        table_codes, _ = pd.factorize(pd.MultiIndex.from_arrays(list(keys.T)))
+        table_codes = table_codes.astype(np.int32)
+        table_rows = np.argsort(table_codes, kind="stable").astype(np.int32)
+        counts = np.bincount(table_codes, minlength=table_codes.max(initial=-1) + 1)
+        table_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+        table_keys = keys[table_rows[table_offsets[:-1]]]
+        return cls(df.columns, strings, codes, list(key_pool), table_keys, table_codes, table_offsets, table_rows)
+
+    def save(self, path) -> None:
+        strings_blob, strings_ends = _pack_strings(self.strings)
+        columns_blob, columns_ends = _pack_strings(self.columns)
+        keys_blob, keys_ends = _pack_strings(self.key_strings)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                version=np.array(FORMAT_VERSION),
+                strings_blob=strings_blob,
+                strings_ends=strings_ends,
+                columns_blob=columns_blob,
+                columns_ends=columns_ends,
+                codes=self.codes,
+                keys_blob=keys_blob,
+                keys_ends=keys_ends,
+                table_keys=self.table_keys,
+                table_codes=self.table_codes,
+                table_offsets=self.table_offsets,
+                table_rows=self.table_rows,
+            )
+
+    @classmethod
+    def load(cls, path) -> "UnitTables":
+        with np.load(path, allow_pickle=False) as z:
+            if int(z["version"]) != FORMAT_VERSION:
+                raise ValueError(f"表モデルの版が異なります（{int(z['version'])} != {FORMAT_VERSION}）。preprocess で作り直してください: {path}")
+            return cls(
+                _unpack_strings(z["columns_blob"], z["columns_ends"]),
+                _unpack_strings(z["strings_blob"], z["strings_ends"]),
+                z["codes"],
+                _unpack_strings(z["keys_blob"], z["keys_ends"]),
+                z["table_keys"],
+                z["table_codes"],
+                z["table_offsets"],
+                z["table_rows"],
+            )
+
+    def __len__(self) -> int:
+        """行数。"""
+        return len(self.codes)
+
+    @property
+    def n_tables(self) -> int:
+        return len(self.table_offsets) - 1
+
+    def table_key(self, index: int) -> Tuple[str, ...]:
+        """表番号 index の表キー（TABLE_KEY の列順、正規化後の値）。"""
+        return tuple(self.key_strings[c] for c in self.table_keys[index].tolist())
+
+    def table_rows_of(self, index: int) -> np.ndarray:
+        """表番号 index の表に属する行の位置（元の行順）。"""
+        return self.table_rows[self.table_offsets[index]:self.table_offsets[index + 1]]
+
+    def table(self, key: Sequence[str]) -> Optional[np.ndarray]:
+        """表キー（TABLE_KEY の列順の値。照合と同じく正規化して引く）の表に属する行の位置。無ければ None。"""
+        if self._lookup is None:
+            self._lookup = {self.table_key(i): i for i in range(self.n_tables)}
+        i = self._lookup.get(tuple(table_key_text(v) for v in key))
+        return None if i is None else self.table_rows_of(i)
+
+    def map_column(self, column: str, func: Callable[[str], object]) -> np.ndarray:
+        """列の値へ func を適用した配列（func は列に現れる文字列ごとに1回だけ評価する）。"""
+        used, inverse = np.unique(self.codes[:, self.column_index[column]], return_inverse=True)
+        values = np.empty(len(used), dtype=object)
+        values[:] = [func(self.strings[c]) for c in used.tolist()]
+        return values[inverse]
+
+    def to_frame(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        行単位の DataFrame に戻す（値は文字列、空欄は空文字。CSV を dtype=str, keep_default_na=False で読んだ場合と同じ）。
+        columns を指定するとそのうち存在する列のみを返す。
+        """
+        names = [c for c in (columns if columns is not None else self.columns) if c in self.column_index]
+        pool = np.empty(len(self.strings), dtype=object)
+        pool[:] = self.strings
+        return pd.DataFrame({c: pool[self.codes[:, self.column_index[c]]] for c in names})